@@ -0,0 +1,36 @@
+"""Add composite indexes for keyset pagination of pizzerias
+
+Revision ID: 007
+Revises: 006
+Create Date: 2025-02-07
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+revision: str = "007"
+down_revision: Union[str, None] = "006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Every sort key of GET /pizzerias is paired with the primary key tie-breaker,
+# so both the rating/visited_at range filters and the keyset seek are a
+# single index range scan.
+INDEXES = {
+    "ix_pizzeria_name_id": ["name", "id"],
+    "ix_pizzeria_rating_id": ["rating", "id"],
+    "ix_pizzeria_visited_at_id": ["visited_at", "id"],
+    "ix_pizzeria_created_at_id": ["created_at", "id"],
+}
+
+
+def upgrade() -> None:
+    for name, columns in INDEXES.items():
+        op.create_index(name, "pizzeria", columns)
+
+
+def downgrade() -> None:
+    for name in INDEXES:
+        op.drop_index(name, table_name="pizzeria")
@@ -0,0 +1,57 @@
+"""Add indexed geo_cell field to pizzeria
+
+Revision ID: 008
+Revises: 007
+Create Date: 2025-02-07
+
+"""
+
+import math
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "008"
+down_revision: Union[str, None] = "007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+
+# The grid as of this revision (app.geo); frozen here so later changes to the
+# app do not change what this migration writes.
+CELL_DEGREES = 0.01
+CELL_ROWS = round(180 / CELL_DEGREES)
+CELL_COLUMNS = round(360 / CELL_DEGREES)
+
+
+def grid_cell(lat: float, lng: float) -> int:
+    row = min(int(math.floor((lat + 90) / CELL_DEGREES)), CELL_ROWS - 1)
+    column = min(int(math.floor((lng + 180) / CELL_DEGREES)), CELL_COLUMNS - 1)
+    return row * CELL_COLUMNS + column
+
+
+def upgrade() -> None:
+    op.add_column("pizzeria", sa.Column("geo_cell", sa.Integer(), nullable=True))
+    op.create_index(op.f("ix_pizzeria_geo_cell"), "pizzeria", ["geo_cell"])
+
+    # Backfill located rows.
+    connection = op.get_bind()
+    rows = connection.execute(
+        sa.text("SELECT id, lat, lng FROM pizzeria WHERE lat IS NOT NULL AND lng IS NOT NULL")
+    ).all()
+    update = sa.text("UPDATE pizzeria SET geo_cell = :geo_cell WHERE id = :id")
+    for start in range(0, len(rows), BATCH_SIZE):
+        connection.execute(
+            update,
+            [
+                {"id": row.id, "geo_cell": grid_cell(row.lat, row.lng)}
+                for row in rows[start : start + BATCH_SIZE]
+            ],
+        )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_pizzeria_geo_cell"), table_name="pizzeria")
+    op.drop_column("pizzeria", "geo_cell")
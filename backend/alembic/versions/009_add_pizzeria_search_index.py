@@ -0,0 +1,87 @@
+"""Add full-text search index over pizzeria name, address and review
+
+Revision ID: 009
+Revises: 008
+Create Date: 2025-02-10
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+revision: str = "009"
+down_revision: Union[str, None] = "008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# The DDL of app.search as of this revision, frozen here.
+SQLITE_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS pizzeria_fts USING fts5(
+        name, address, review,
+        content='pizzeria', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS pizzeria_fts_ai AFTER INSERT ON pizzeria BEGIN
+        INSERT INTO pizzeria_fts(rowid, name, address, review)
+        VALUES (new.id, new.name, new.address, new.review);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS pizzeria_fts_ad AFTER DELETE ON pizzeria BEGIN
+        INSERT INTO pizzeria_fts(pizzeria_fts, rowid, name, address, review)
+        VALUES ('delete', old.id, old.name, old.address, old.review);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS pizzeria_fts_au AFTER UPDATE OF name, address, review
+    ON pizzeria BEGIN
+        INSERT INTO pizzeria_fts(pizzeria_fts, rowid, name, address, review)
+        VALUES ('delete', old.id, old.name, old.address, old.review);
+        INSERT INTO pizzeria_fts(rowid, name, address, review)
+        VALUES (new.id, new.name, new.address, new.review);
+    END
+    """,
+]
+SQLITE_REBUILD = "INSERT INTO pizzeria_fts(pizzeria_fts) VALUES ('rebuild')"
+SQLITE_DROP = "DROP TABLE IF EXISTS pizzeria_fts"
+
+POSTGRES_DDL = [
+    """
+    ALTER TABLE pizzeria ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(address, '')), 'B') ||
+        setweight(to_tsvector('simple', coalesce(review, '')), 'C')
+    ) STORED
+    """,
+    "CREATE INDEX ix_pizzeria_search_vector ON pizzeria USING GIN (search_vector)",
+]
+POSTGRES_DROP = [
+    "DROP INDEX IF EXISTS ix_pizzeria_search_vector",
+    "ALTER TABLE pizzeria DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == "postgresql":
+        for statement in POSTGRES_DDL:
+            op.execute(statement)
+    elif dialect == "sqlite":
+        for statement in SQLITE_DDL:
+            op.execute(statement)
+        op.execute(SQLITE_REBUILD)
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == "postgresql":
+        for statement in POSTGRES_DROP:
+            op.execute(statement)
+    elif dialect == "sqlite":
+        for trigger in ("pizzeria_fts_ai", "pizzeria_fts_ad", "pizzeria_fts_au"):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute(SQLITE_DROP)
@@ -0,0 +1,72 @@
+"""Add pizzeria_stat summary table
+
+Revision ID: 010
+Revises: 009
+Create Date: 2025-02-12
+
+"""
+
+import math
+from collections import defaultdict
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "010"
+down_revision: Union[str, None] = "009"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 5000
+
+pizzeria = sa.table(
+    "pizzeria", sa.column("rating", sa.Float), sa.column("visited_at", sa.DateTime)
+)
+
+
+def backfill_stats(connection, stat_table) -> None:
+    """Fill the summary table the way app.stats.rebuild_stats did at this revision."""
+    totals = defaultdict(lambda: [0, 0.0])
+
+    def add(key, rating_sum=0.0):
+        totals[key][0] += 1
+        totals[key][1] += rating_sum
+
+    result = connection.execute(
+        sa.select(pizzeria.c.rating, pizzeria.c.visited_at).execution_options(
+            yield_per=BATCH_SIZE
+        )
+    )
+    for row in result:
+        add(("total", ""))
+        if row.rating is not None:
+            add(("rated", ""), row.rating)
+            add(("rating_bucket", f"{math.floor(row.rating * 2) / 2:.1f}"))
+        if row.visited_at is not None:
+            add(("visited", ""))
+            add(("visited_month", row.visited_at.strftime("%Y-%m")))
+    if totals:
+        op.bulk_insert(
+            stat_table,
+            [
+                {"kind": kind, "bucket": bucket, "count": count, "rating_sum": rating_sum}
+                for (kind, bucket), (count, rating_sum) in totals.items()
+            ],
+        )
+
+
+def upgrade() -> None:
+    stat_table = op.create_table(
+        "pizzeria_stat",
+        sa.Column("kind", sa.String(), nullable=False),
+        sa.Column("bucket", sa.String(), nullable=False),
+        sa.Column("count", sa.Integer(), nullable=False),
+        sa.Column("rating_sum", sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint("kind", "bucket"),
+    )
+    backfill_stats(op.get_bind(), stat_table)
+
+
+def downgrade() -> None:
+    op.drop_table("pizzeria_stat")
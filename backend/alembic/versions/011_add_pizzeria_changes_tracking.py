@@ -0,0 +1,88 @@
+"""Index pizzeria.updated_at and record deleted pizzerias as tombstones
+
+Revision ID: 011
+Revises: 010
+Create Date: 2025-02-14
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "011"
+down_revision: Union[str, None] = "010"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# The trigger DDL of app.changes as of this revision, frozen here.
+SQLITE_DDL = [
+    """
+    CREATE TRIGGER IF NOT EXISTS pizzeria_tombstone_ad AFTER DELETE ON pizzeria BEGIN
+        INSERT OR REPLACE INTO pizzeria_tombstone(id, deleted_at)
+        VALUES (old.id, strftime('%Y-%m-%d %H:%M:%f000', 'now'));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS pizzeria_tombstone_ai AFTER INSERT ON pizzeria BEGIN
+        DELETE FROM pizzeria_tombstone WHERE id = new.id;
+    END
+    """,
+]
+
+POSTGRES_DDL = [
+    """
+    CREATE OR REPLACE FUNCTION pizzeria_record_tombstone() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO pizzeria_tombstone (id, deleted_at)
+        VALUES (OLD.id, now() AT TIME ZONE 'utc')
+        ON CONFLICT (id) DO UPDATE SET deleted_at = EXCLUDED.deleted_at;
+        RETURN OLD;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER pizzeria_tombstone_ad AFTER DELETE ON pizzeria
+    FOR EACH ROW EXECUTE FUNCTION pizzeria_record_tombstone()
+    """,
+]
+POSTGRES_DROP = [
+    "DROP TRIGGER IF EXISTS pizzeria_tombstone_ad ON pizzeria",
+    "DROP FUNCTION IF EXISTS pizzeria_record_tombstone()",
+]
+
+
+def upgrade() -> None:
+    op.create_index("ix_pizzeria_updated_at_id", "pizzeria", ["updated_at", "id"])
+    op.create_table(
+        "pizzeria_tombstone",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("deleted_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        op.f("ix_pizzeria_tombstone_deleted_at"), "pizzeria_tombstone", ["deleted_at"]
+    )
+
+    dialect = op.get_bind().dialect.name
+    if dialect == "postgresql":
+        for statement in POSTGRES_DDL:
+            op.execute(statement)
+    elif dialect == "sqlite":
+        for statement in SQLITE_DDL:
+            op.execute(statement)
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == "postgresql":
+        for statement in POSTGRES_DROP:
+            op.execute(statement)
+    elif dialect == "sqlite":
+        for trigger in ("pizzeria_tombstone_ad", "pizzeria_tombstone_ai"):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+
+    op.drop_index(op.f("ix_pizzeria_tombstone_deleted_at"), table_name="pizzeria_tombstone")
+    op.drop_table("pizzeria_tombstone")
+    op.drop_index("ix_pizzeria_updated_at_id", table_name="pizzeria")
@@ -0,0 +1,71 @@
+"""Renumber geo_cell as Z-order quadtree cells
+
+Revision ID: 014
+Revises: 013
+Create Date: 2025-02-24
+
+"""
+
+import math
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "014"
+down_revision: Union[str, None] = "013"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+
+# Both numberings as of this revision (app.geo); frozen here so later changes
+# to the app do not change what this migration writes.
+CELL_BITS = 15
+CELL_COUNT = 1 << CELL_BITS
+OLD_CELL_DEGREES = 0.01
+OLD_CELL_ROWS = round(180 / OLD_CELL_DEGREES)
+OLD_CELL_COLUMNS = round(360 / OLD_CELL_DEGREES)
+
+
+def _spread_bits(value: int) -> int:
+    value = (value | (value << 8)) & 0x00FF00FF
+    value = (value | (value << 4)) & 0x0F0F0F0F
+    value = (value | (value << 2)) & 0x33333333
+    return (value | (value << 1)) & 0x55555555
+
+
+def quadtree_cell(lat: float, lng: float) -> int:
+    row = min(int(math.floor((lat + 90) / 180 * CELL_COUNT)), CELL_COUNT - 1)
+    column = min(int(math.floor((lng + 180) / 360 * CELL_COUNT)), CELL_COUNT - 1)
+    return _spread_bits(row) << 1 | _spread_bits(column)
+
+
+def row_major_cell(lat: float, lng: float) -> int:
+    row = min(int(math.floor((lat + 90) / OLD_CELL_DEGREES)), OLD_CELL_ROWS - 1)
+    column = min(int(math.floor((lng + 180) / OLD_CELL_DEGREES)), OLD_CELL_COLUMNS - 1)
+    return row * OLD_CELL_COLUMNS + column
+
+
+def renumber(cell) -> None:
+    connection = op.get_bind()
+    rows = connection.execute(
+        sa.text("SELECT id, lat, lng FROM pizzeria WHERE lat IS NOT NULL AND lng IS NOT NULL")
+    ).all()
+    update = sa.text("UPDATE pizzeria SET geo_cell = :geo_cell WHERE id = :id")
+    for start in range(0, len(rows), BATCH_SIZE):
+        connection.execute(
+            update,
+            [
+                {"id": row.id, "geo_cell": cell(row.lat, row.lng)}
+                for row in rows[start : start + BATCH_SIZE]
+            ],
+        )
+
+
+def upgrade() -> None:
+    renumber(quadtree_cell)
+
+
+def downgrade() -> None:
+    renumber(row_major_cell)
@@ -0,0 +1,67 @@
+"""Bump pizzeria.updated_at in a trigger on updates that leave it unchanged
+
+Revision ID: 015
+Revises: 014
+Create Date: 2025-02-26
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+revision: str = "015"
+down_revision: Union[str, None] = "014"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# The trigger DDL of app.changes as of this revision, frozen here.
+SQLITE_DDL = [
+    """
+    CREATE TRIGGER IF NOT EXISTS pizzeria_updated_at_au AFTER UPDATE ON pizzeria
+    WHEN new.updated_at IS old.updated_at BEGIN
+        UPDATE pizzeria SET updated_at = strftime('%Y-%m-%d %H:%M:%f000', 'now')
+        WHERE id = new.id;
+    END
+    """,
+]
+
+POSTGRES_DDL = [
+    """
+    CREATE OR REPLACE FUNCTION pizzeria_touch_updated_at() RETURNS trigger AS $$
+    BEGIN
+        IF NEW.updated_at IS NOT DISTINCT FROM OLD.updated_at THEN
+            NEW.updated_at := clock_timestamp() AT TIME ZONE 'utc';
+        END IF;
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER pizzeria_updated_at_bu BEFORE UPDATE ON pizzeria
+    FOR EACH ROW EXECUTE FUNCTION pizzeria_touch_updated_at()
+    """,
+]
+POSTGRES_DROP = [
+    "DROP TRIGGER IF EXISTS pizzeria_updated_at_bu ON pizzeria",
+    "DROP FUNCTION IF EXISTS pizzeria_touch_updated_at()",
+]
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == "postgresql":
+        for statement in POSTGRES_DDL:
+            op.execute(statement)
+    elif dialect == "sqlite":
+        for statement in SQLITE_DDL:
+            op.execute(statement)
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == "postgresql":
+        for statement in POSTGRES_DROP:
+            op.execute(statement)
+    elif dialect == "sqlite":
+        op.execute("DROP TRIGGER IF EXISTS pizzeria_updated_at_au")
@@ -0,0 +1,4 @@
+import time
+
+# Taken before any other app module is imported; see app.startup.
+IMPORT_STARTED = time.perf_counter()
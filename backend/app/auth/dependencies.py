@@ -1,18 +1,52 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import event, inspect
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
 from sqlmodel import select
 
 from app.auth.models import User
 from app.auth.security import decode_token
-from app.database import get_session
+from app.cache import LRUCache
+from app.config import settings
+from app.database import get_read_session
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
+# Active users by token subject, as immutable snapshots of their column
+# values; every request gets its own User built from one. Entries are dropped
+# whenever the ORM flushes a change to the user; the TTL caps staleness for
+# changes made elsewhere (other workers, raw SQL).
+user_cache = LRUCache(
+    max_entries=settings.user_cache_max_entries,
+    ttl_seconds=settings.user_cache_ttl_seconds,
+)
+
+USER_COLUMNS = tuple(User.__table__.columns.keys())
+
+
+def _snapshot(user: User) -> tuple:
+    return tuple(getattr(user, column) for column in USER_COLUMNS)
+
+
+def _from_snapshot(snapshot: tuple) -> User:
+    """A detached User of the request's own, safe to mutate or merge into a session."""
+    user = User(**dict(zip(USER_COLUMNS, snapshot)))
+    make_transient_to_detached(user)
+    return user
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_cached_user(mapper, connection, target: User) -> None:
+    user_cache.pop(target.email)
+    for old_email in inspect(target).attrs.email.history.deleted:
+        user_cache.pop(old_email)
+
 
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
-    session: AsyncSession = Depends(get_session),
+    session: AsyncSession = Depends(get_read_session),
 ) -> User:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -32,6 +66,10 @@ async def get_current_user(
     if email is None:
         raise credentials_exception
 
+    snapshot = user_cache.get(email)
+    if snapshot is not None:
+        return _from_snapshot(snapshot)
+
     result = await session.execute(select(User).where(User.email == email))
     user = result.scalar_one_or_none()
 
@@ -44,4 +82,5 @@ async def get_current_user(
             detail="Inactive user",
         )
 
+    user_cache.put(email, _snapshot(user))
     return user
@@ -0,0 +1,66 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.auth.security import get_password_hash, verify_password
+from app.config import settings
+from app.metrics import PASSWORD_HASH_LATENCY
+
+
+def _timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
+class PasswordHasherBusyError(Exception):
+    """Raised when too many hashing jobs are already queued."""
+
+
+class PasswordHasher:
+    """Runs bcrypt in a bounded thread pool instead of on the event loop.
+
+    bcrypt releases the GIL while hashing, so threads give real parallelism.
+    Once ``max_pending`` jobs are running or queued, new ones are rejected
+    immediately rather than letting latency pile up behind them.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self._executor: ThreadPoolExecutor | None = None
+
+    async def _run(self, operation: str, func, *args):
+        if self.pending >= self.max_pending:
+            raise PasswordHasherBusyError
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="bcrypt"
+            )
+        self.pending += 1
+        try:
+            result, elapsed = await asyncio.get_running_loop().run_in_executor(
+                self._executor, _timed, func, *args
+            )
+        finally:
+            self.pending -= 1
+        PASSWORD_HASH_LATENCY.observe(elapsed, operation)
+        return result
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run("verify", verify_password, plain_password, hashed_password)
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", get_password_hash, password)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(
+    max_workers=settings.password_hash_workers,
+    max_pending=settings.password_hash_max_pending,
+)
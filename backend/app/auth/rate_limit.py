@@ -0,0 +1,145 @@
+import time
+from collections import OrderedDict
+from typing import Protocol
+
+from app.config import settings
+from app.metrics import AUTH_RATE_LIMITED
+
+
+class RateLimitBackend(Protocol):
+    """Token-bucket storage. Async so a shared store can stand in for memory."""
+
+    async def take(self, key: str, capacity: float, refill_per_second: float) -> float:
+        """Take one token from ``key``'s bucket.
+
+        Returns 0 when a token was taken, otherwise the seconds until one is
+        available (nothing is taken then).
+        """
+        ...
+
+    async def peek(self, key: str, capacity: float, refill_per_second: float) -> float:
+        """Like ``take``, but never takes a token."""
+        ...
+
+
+def client_ip(peer: str | None, forwarded_for: str | None) -> str | None:
+    """The client address, trusting ``settings.trusted_proxy_hops`` proxies.
+
+    Each trusted proxy appends the address it got the request from to
+    ``X-Forwarded-For``, so the client is that many entries from the right;
+    anything further left was sent by the client and can be forged.
+    """
+    hops = settings.trusted_proxy_hops
+    if hops <= 0 or not forwarded_for:
+        return peer
+    entries = [entry.strip() for entry in forwarded_for.split(",") if entry.strip()]
+    if not entries:
+        return peer
+    # Fewer entries than hops: all of them were added by trusted proxies.
+    return entries[max(len(entries) - hops, 0)]
+
+
+class MemoryRateLimitBackend:
+    """Per-process token buckets with O(1) amortized ``take``.
+
+    A bucket that has refilled completely is the same as no bucket, so
+    buckets are dropped once full; ``max_buckets`` bounds memory under a
+    flood of distinct keys by dropping the least recently used ones.
+    """
+
+    def __init__(self, max_buckets: int = 100_000, clock=time.monotonic):
+        self.max_buckets = max_buckets
+        self.clock = clock
+        # key -> [tokens, updated_at, full_at], least recently used first.
+        self._buckets: OrderedDict[str, list] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def clear(self) -> None:
+        self._buckets.clear()
+
+    async def take(self, key: str, capacity: float, refill_per_second: float) -> float:
+        now = self.clock()
+        self._expire(now)
+
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            tokens = capacity
+        else:
+            tokens = min(capacity, bucket[0] + (now - bucket[1]) * refill_per_second)
+
+        if tokens >= 1:
+            tokens -= 1
+            retry_after = 0.0
+        else:
+            retry_after = (1 - tokens) / refill_per_second
+
+        full_at = now + (capacity - tokens) / refill_per_second
+        self._buckets[key] = [tokens, now, full_at]
+        self._buckets.move_to_end(key)
+        if len(self._buckets) > self.max_buckets:
+            self._buckets.popitem(last=False)
+        return retry_after
+
+    async def peek(self, key: str, capacity: float, refill_per_second: float) -> float:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return 0.0
+        tokens = min(capacity, bucket[0] + (self.clock() - bucket[1]) * refill_per_second)
+        return 0.0 if tokens >= 1 else (1 - tokens) / refill_per_second
+
+    def _expire(self, now: float) -> None:
+        while self._buckets:
+            bucket = next(iter(self._buckets.values()))
+            if bucket[2] > now:
+                return
+            self._buckets.popitem(last=False)
+
+
+class AuthRateLimiter:
+    """Limits for the bcrypt-backed auth routes.
+
+    Every attempt takes a token from its client IP's bucket. Failed attempts
+    also take one from the bucket of that email *and* IP, and an attempt is
+    refused while that bucket is empty: guessing one account's password is
+    throttled without letting anyone lock the account out for everybody.
+    """
+
+    def __init__(self, backend: RateLimitBackend):
+        self.backend = backend
+
+    @staticmethod
+    def _failure_key(client_ip: str | None, email: str) -> str:
+        return f"auth:email:{email.strip().lower()}:{client_ip}"
+
+    async def check(self, client_ip: str | None, email: str) -> float:
+        """Return 0 if the attempt may proceed, else seconds to wait."""
+        if client_ip is not None:
+            retry_after = await self.backend.take(
+                f"auth:ip:{client_ip}",
+                settings.auth_rate_limit_ip_burst,
+                settings.auth_rate_limit_ip_per_minute / 60,
+            )
+            if retry_after:
+                AUTH_RATE_LIMITED.inc("ip")
+                return retry_after
+        retry_after = await self.backend.peek(
+            self._failure_key(client_ip, email),
+            settings.auth_rate_limit_email_burst,
+            settings.auth_rate_limit_email_per_minute / 60,
+        )
+        if retry_after:
+            AUTH_RATE_LIMITED.inc("email")
+        return retry_after
+
+    async def record_failure(self, client_ip: str | None, email: str) -> None:
+        """Count a failed attempt against this email from this client."""
+        await self.backend.take(
+            self._failure_key(client_ip, email),
+            settings.auth_rate_limit_email_burst,
+            settings.auth_rate_limit_email_per_minute / 60,
+        )
+
+
+auth_rate_limiter = AuthRateLimiter(MemoryRateLimitBackend())
@@ -1,41 +1,73 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import math
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlmodel import select
 
 from app.auth.dependencies import get_current_user
+from app.auth.hashing import PasswordHasherBusyError, password_hasher
 from app.auth.models import User, UserCreate, UserRead
+from app.auth.rate_limit import auth_rate_limiter, client_ip
 from app.auth.schemas import LoginRequest, RefreshRequest, Token
 from app.auth.security import (
     create_access_token,
     create_refresh_token,
     decode_token,
-    get_password_hash,
-    verify_password,
+    password_needs_rehash,
 )
-from app.database import get_session
+from app.database import get_read_session, get_session
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 
+def _hasher_busy_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Server busy, please retry",
+        headers={"Retry-After": "1"},
+    )
+
+
+def _client_ip(request: Request) -> str | None:
+    forwarded_for = ",".join(request.headers.getlist("x-forwarded-for"))
+    return client_ip(request.client.host if request.client else None, forwarded_for)
+
+
+async def _enforce_rate_limit(request: Request, email: str) -> None:
+    retry_after = await auth_rate_limiter.check(_client_ip(request), email)
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many attempts, please retry later",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+
+
 @router.post("/register", response_model=UserRead, status_code=status.HTTP_201_CREATED)
 async def register(
     user_data: UserCreate,
+    request: Request,
     session: AsyncSession = Depends(get_session),
 ):
     """Register a new user."""
+    await _enforce_rate_limit(request, user_data.email)
+
     result = await session.execute(select(User).where(User.email == user_data.email))
     existing_user = result.scalar_one_or_none()
 
     if existing_user:
+        await auth_rate_limiter.record_failure(_client_ip(request), user_data.email)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered",
         )
 
-    user = User(
-        email=user_data.email,
-        hashed_password=get_password_hash(user_data.password),
-    )
+    try:
+        hashed_password = await password_hasher.hash(user_data.password)
+    except PasswordHasherBusyError:
+        raise _hasher_busy_exception()
+
+    user = User(email=user_data.email, hashed_password=hashed_password)
     session.add(user)
     await session.commit()
     await session.refresh(user)
@@ -45,13 +77,24 @@ async def register(
 @router.post("/login", response_model=Token)
 async def login(
     login_data: LoginRequest,
+    request: Request,
     session: AsyncSession = Depends(get_session),
 ):
     """Authenticate user and return tokens."""
+    await _enforce_rate_limit(request, login_data.email)
+
     result = await session.execute(select(User).where(User.email == login_data.email))
     user = result.scalar_one_or_none()
 
-    if not user or not verify_password(login_data.password, user.hashed_password):
+    try:
+        valid = user is not None and await password_hasher.verify(
+            login_data.password, user.hashed_password
+        )
+    except PasswordHasherBusyError:
+        raise _hasher_busy_exception()
+
+    if not valid:
+        await auth_rate_limiter.record_failure(_client_ip(request), login_data.email)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -64,6 +107,15 @@ async def login(
             detail="Inactive user",
         )
 
+    # Upgrade hashes made with an old bcrypt cost while we have the password.
+    if password_needs_rehash(user.hashed_password):
+        try:
+            user.hashed_password = await password_hasher.hash(login_data.password)
+        except PasswordHasherBusyError:
+            pass  # Rehash on a later login rather than failing this one.
+        else:
+            await session.commit()
+
     return Token(
         access_token=create_access_token(user.email),
         refresh_token=create_refresh_token(user.email),
@@ -73,7 +125,7 @@ async def login(
 @router.post("/refresh", response_model=Token)
 async def refresh_token(
     refresh_data: RefreshRequest,
-    session: AsyncSession = Depends(get_session),
+    session: AsyncSession = Depends(get_read_session),
 ):
     """Get new access token using refresh token."""
     payload = decode_token(refresh_data.refresh_token)
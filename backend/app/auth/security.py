@@ -1,36 +1,86 @@
-from datetime import datetime, timedelta
+"""Password hashing and JWT helpers.
+
+``bcrypt`` and ``jose`` (which pulls in ``cryptography``) are imported on
+first use rather than at module import, to keep worker start-up fast.
+"""
 
-import bcrypt
-from jose import jwt
+import hashlib
+import time
+from datetime import datetime, timedelta
 
+from app.cache import LRUCache
 from app.config import settings
+from app.metrics import TOKEN_DECODE_LATENCY
+
+# Payloads of tokens whose signature was already verified, keyed by a hash of
+# the token so raw tokens are never held. Wall-clock time matches ``exp``.
+token_cache = LRUCache(max_entries=settings.token_cache_max_entries, clock=time.time)
+_token_cache_keys = (settings.secret_key, settings.algorithm)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
+    import bcrypt
+
     return bcrypt.checkpw(
         plain_password.encode("utf-8"), hashed_password.encode("utf-8")
     )
 
 
 def get_password_hash(password: str) -> str:
-    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+    import bcrypt
+
+    salt = bcrypt.gensalt(rounds=settings.bcrypt_rounds)
+    return bcrypt.hashpw(password.encode("utf-8"), salt).decode("utf-8")
+
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """Whether a stored hash uses a different bcrypt cost than configured."""
+    try:
+        rounds = int(hashed_password.split("$")[2])
+    except (IndexError, ValueError):
+        return True
+    return rounds != settings.bcrypt_rounds
 
 
 def create_access_token(subject: str) -> str:
+    from jose import jwt
+
     expire = datetime.utcnow() + timedelta(minutes=settings.access_token_expire_minutes)
     to_encode = {"exp": expire, "sub": subject, "type": "access"}
     return jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
 
 
 def create_refresh_token(subject: str) -> str:
+    from jose import jwt
+
     expire = datetime.utcnow() + timedelta(days=settings.refresh_token_expire_days)
     to_encode = {"exp": expire, "sub": subject, "type": "refresh"}
     return jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
 
 
 def decode_token(token: str) -> dict | None:
+    global _token_cache_keys
+    started = time.perf_counter()
+
+    if _token_cache_keys != (settings.secret_key, settings.algorithm):
+        # Tokens verified under the old key must be checked again.
+        token_cache.clear()
+        _token_cache_keys = (settings.secret_key, settings.algorithm)
+
+    key = hashlib.sha256(token.encode("utf-8")).digest()
+    payload = token_cache.get(key)
+    if payload is not None:
+        TOKEN_DECODE_LATENCY.observe(time.perf_counter() - started, "hit")
+        return payload
+
+    from jose import jwt
+
     try:
         payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
-        return payload
     except jwt.JWTError:
-        return None
+        payload = None
+    else:
+        if isinstance(payload.get("exp"), (int, float)):
+            token_cache.put(key, payload, expires_at=payload["exp"])
+    TOKEN_DECODE_LATENCY.observe(time.perf_counter() - started, "miss")
+    return payload
@@ -0,0 +1,119 @@
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from app.compression import compress, encoded_etag
+from app.config import settings
+
+
+class LRUCache:
+    """Bounded in-process cache with LRU eviction and an optional TTL.
+
+    ``put`` may pass an absolute ``expires_at`` (in ``clock`` time) instead of
+    relying on the TTL. ``clear()`` starts a new generation; ``put`` calls carrying the
+    generation observed before a slow read are dropped if a write cleared the
+    cache in between, so a stale result can never be stored after the
+    invalidation that should have removed it.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float | None = None, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries: OrderedDict = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and (entry[1] is None or entry[1] > self.clock()):
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+        if entry is not None:
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(
+        self,
+        key,
+        value,
+        generation: int | None = None,
+        expires_at: float | None = None,
+    ) -> None:
+        if generation is not None and generation != self.generation:
+            return
+        if expires_at is None and self.ttl_seconds is not None:
+            expires_at = self.clock() + self.ttl_seconds
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key) -> None:
+        if self._entries.pop(key, None) is not None:
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.generation += 1
+        self.invalidations += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    body: bytes
+    etag: str
+    headers: dict[str, str] = field(default_factory=dict)
+    # Compressed bodies by content coding, filled on first request for each.
+    encoded: dict[str, bytes] = field(default_factory=dict, compare=False)
+
+    def representation(self, encoding: str | None) -> tuple[bytes, str]:
+        """Body and ETag to send with ``encoding`` (None for identity)."""
+        if encoding is None:
+            return self.body, self.etag
+        body = self.encoded.get(encoding)
+        if body is None:
+            body = self.encoded[encoding] = compress(self.body, encoding)
+        return body, encoded_etag(self.etag, encoding)
+
+
+def strong_etag(body: bytes) -> str:
+    return '"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Whether an ``If-None-Match`` header matches ``etag`` (weak comparison)."""
+    if not if_none_match:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(",")]
+    return "*" in candidates or etag in (value.removeprefix("W/") for value in candidates)
+
+
+# Serialized GET /pizzerias responses, cleared on every pizzeria write. The
+# TTL bounds how long other worker processes can serve a stale page.
+pizzeria_list_cache = LRUCache(
+    max_entries=settings.list_cache_max_entries,
+    ttl_seconds=settings.list_cache_ttl_seconds,
+)
@@ -0,0 +1,352 @@
+"""Delta sync for GET /pizzerias/changes.
+
+Inserted and updated rows are found through the ``(updated_at, id)`` index.
+SQLAlchemy sets ``updated_at`` on ORM and Core updates, and a database
+trigger bumps it for any update that leaves it unchanged; deleted ids are
+recorded in ``pizzeria_tombstone`` by another trigger. So updates and deletes
+from any path (raw SQL, ``seed.py --force``) are seen. The same DDL is used by
+migrations 011 and 015 and, through the table events below, by ``create_all``.
+
+Timestamps are taken when a transaction writes, not when it commits, so a
+slow transaction can commit rows older than a cursor already handed out. The
+cursor returned on a final page therefore never moves past ``now`` minus
+``settings.changes_settle_seconds``; rows in that window are sent again on
+the next poll, which clients apply idempotently. The feed is always read
+from the primary: a replica lagging by more than the settle window would
+make a cursor skip rows for good.
+
+Tombstones are kept for ``settings.changes_tombstone_retention_days`` and
+then pruned by a periodic job (see ``schedule_tombstone_pruning``); cursors
+older than that can no longer see every delete and are rejected as expired.
+"""
+
+import asyncio
+import base64
+import binascii
+import json
+import math
+import time
+import weakref
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from sqlalchemy import DDL, delete, event, select, tuple_
+
+from app.config import settings
+from app.jobs import enqueue
+from app.models import Pizzeria, PizzeriaTombstone
+from app.pagination import InvalidCursorError, is_int
+from app.serializers import PIZZERIA_READ_COLUMNS
+
+TOMBSTONE_PRUNE_SECONDS = 3600
+
+SQLITE_DDL = [
+    # strftime only has millisecond precision; pad to the microseconds
+    # SQLAlchemy writes so stored values compare and parse consistently.
+    """
+    CREATE TRIGGER IF NOT EXISTS pizzeria_tombstone_ad AFTER DELETE ON pizzeria BEGIN
+        INSERT OR REPLACE INTO pizzeria_tombstone(id, deleted_at)
+        VALUES (old.id, strftime('%Y-%m-%d %H:%M:%f000', 'now'));
+    END
+    """,
+    # SQLite may hand a deleted id out again; the new row supersedes the tombstone.
+    """
+    CREATE TRIGGER IF NOT EXISTS pizzeria_tombstone_ai AFTER INSERT ON pizzeria BEGIN
+        DELETE FROM pizzeria_tombstone WHERE id = new.id;
+    END
+    """,
+    # Its own UPDATE does not fire it again: recursive triggers are off.
+    """
+    CREATE TRIGGER IF NOT EXISTS pizzeria_updated_at_au AFTER UPDATE ON pizzeria
+    WHEN new.updated_at IS old.updated_at BEGIN
+        UPDATE pizzeria SET updated_at = strftime('%Y-%m-%d %H:%M:%f000', 'now')
+        WHERE id = new.id;
+    END
+    """,
+]
+
+POSTGRES_DDL = [
+    """
+    CREATE OR REPLACE FUNCTION pizzeria_record_tombstone() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO pizzeria_tombstone (id, deleted_at)
+        VALUES (OLD.id, now() AT TIME ZONE 'utc')
+        ON CONFLICT (id) DO UPDATE SET deleted_at = EXCLUDED.deleted_at;
+        RETURN OLD;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER pizzeria_tombstone_ad AFTER DELETE ON pizzeria
+    FOR EACH ROW EXECUTE FUNCTION pizzeria_record_tombstone()
+    """,
+    # clock_timestamp(), not now(): the write time, not the transaction start.
+    """
+    CREATE OR REPLACE FUNCTION pizzeria_touch_updated_at() RETURNS trigger AS $$
+    BEGIN
+        IF NEW.updated_at IS NOT DISTINCT FROM OLD.updated_at THEN
+            NEW.updated_at := clock_timestamp() AT TIME ZONE 'utc';
+        END IF;
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER pizzeria_updated_at_bu BEFORE UPDATE ON pizzeria
+    FOR EACH ROW EXECUTE FUNCTION pizzeria_touch_updated_at()
+    """,
+]
+POSTGRES_DROP = [
+    "DROP TRIGGER IF EXISTS pizzeria_tombstone_ad ON pizzeria",
+    "DROP FUNCTION IF EXISTS pizzeria_record_tombstone()",
+    "DROP TRIGGER IF EXISTS pizzeria_updated_at_bu ON pizzeria",
+    "DROP FUNCTION IF EXISTS pizzeria_touch_updated_at()",
+]
+
+# TRUNCATE skips row triggers; callers record tombstones for every row first.
+POSTGRES_TOMBSTONE_ALL = """
+    INSERT INTO pizzeria_tombstone (id, deleted_at)
+    SELECT id, now() AT TIME ZONE 'utc' FROM pizzeria
+    ON CONFLICT (id) DO UPDATE SET deleted_at = EXCLUDED.deleted_at
+"""
+
+for statement in SQLITE_DDL:
+    # DDL() applies %-formatting; the strftime pattern must survive it.
+    ddl = DDL(statement.replace("%", "%%"))
+    event.listen(Pizzeria.__table__, "after_create", ddl.execute_if(dialect="sqlite"))
+for statement in POSTGRES_DDL:
+    event.listen(
+        Pizzeria.__table__, "after_create", DDL(statement).execute_if(dialect="postgresql")
+    )
+# The triggers go with the table; the functions do not.
+for statement in (POSTGRES_DROP[1], POSTGRES_DROP[3]):
+    event.listen(
+        Pizzeria.__table__, "after_drop", DDL(statement).execute_if(dialect="postgresql")
+    )
+
+
+def encode_changes_cursor(rows_after: tuple | None, tombstones_after: tuple | None) -> str:
+    """Build the opaque cursor holding both stream positions."""
+    payload = ["changes"]
+    for position in (rows_after, tombstones_after):
+        payload.extend((position[0].isoformat(), position[1]) if position else (None, None))
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def decode_changes_cursor(cursor: str) -> tuple[tuple | None, tuple | None]:
+    """Return the ``(updated_at, id)`` and ``(deleted_at, id)`` positions."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        kind, *values = json.loads(raw)
+        if kind != "changes" or len(values) != 4:
+            raise InvalidCursorError(cursor)
+        positions = []
+        for timestamp, last_id in (values[:2], values[2:]):
+            if timestamp is None:
+                positions.append(None)
+            elif is_int(last_id):
+                positions.append((datetime.fromisoformat(timestamp), last_id))
+            else:
+                raise InvalidCursorError(cursor)
+        return positions[0], positions[1]
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError) as exc:
+        raise InvalidCursorError(cursor) from exc
+
+
+def changed_rows_statement(after: tuple | None, limit: int, columns=PIZZERIA_READ_COLUMNS):
+    """Rows written after ``after``, oldest first, plus one extra.
+
+    ``columns`` must include ``id`` and ``updated_at``.
+    """
+    keyset = tuple_(Pizzeria.updated_at, Pizzeria.id)
+    statement = select(*columns)
+    if after is not None:
+        statement = statement.where(keyset > after)
+    return statement.order_by(Pizzeria.updated_at, Pizzeria.id).limit(limit + 1)
+
+
+def tombstones_statement(after: tuple | None, limit: int):
+    """Tombstones recorded after ``after``, oldest first, plus one extra."""
+    statement = select(PizzeriaTombstone.id, PizzeriaTombstone.deleted_at)
+    if after is not None:
+        statement = statement.where(
+            tuple_(PizzeriaTombstone.deleted_at, PizzeriaTombstone.id) > after
+        )
+    return statement.order_by(PizzeriaTombstone.deleted_at, PizzeriaTombstone.id).limit(
+        limit + 1
+    )
+
+
+def settled_position(now: datetime) -> tuple:
+    return (now - timedelta(seconds=settings.changes_settle_seconds), 0)
+
+
+def tombstone_cutoff(now: datetime) -> datetime:
+    """Tombstones older than this may have been pruned."""
+    return now - timedelta(days=settings.changes_tombstone_retention_days)
+
+
+def cursor_expired(tombstones_after: tuple | None, now: datetime) -> bool:
+    """Whether deletes after this position may already have been pruned."""
+    return tombstones_after is not None and tombstones_after[0] < tombstone_cutoff(now)
+
+
+async def prune_tombstones(session, now: datetime) -> int:
+    """Delete tombstones past the retention window; return how many."""
+    result = await session.execute(
+        delete(PizzeriaTombstone).where(PizzeriaTombstone.deleted_at < tombstone_cutoff(now))
+    )
+    return result.rowcount
+
+
+async def schedule_tombstone_pruning(session) -> None:
+    """Queue the next ``prune_tombstones`` job in ``session``'s transaction.
+
+    The dedupe key names the ``TOMBSTONE_PRUNE_SECONDS`` slot the job runs
+    in, so every worker may call this and the slot still gets one job.
+    """
+    now = time.time()
+    slot = math.floor(now / TOMBSTONE_PRUNE_SECONDS) + 1
+    await enqueue(
+        session,
+        "prune_tombstones",
+        {},
+        dedupe_key=f"prune_tombstones:{slot}",
+        delay=slot * TOMBSTONE_PRUNE_SECONDS - now,
+    )
+
+
+def tombstone_pruner(session_maker):
+    """``app.jobs`` handler for ``prune_tombstones`` jobs; each queues the next."""
+
+    async def handle(payload: dict) -> None:
+        async with session_maker() as session:
+            await prune_tombstones(session, datetime.utcnow())
+            await schedule_tombstone_pruning(session)
+            await session.commit()
+
+    return handle
+
+
+@dataclass
+class ChangesPage:
+    rows: list
+    tombstones: list
+    rows_after: tuple | None
+    tombstones_after: tuple | None
+    has_more: bool
+
+
+async def fetch_changes(
+    session,
+    rows_after: tuple | None,
+    tombstones_after: tuple | None,
+    limit: int,
+    columns=PIZZERIA_READ_COLUMNS,
+) -> ChangesPage:
+    """Read one page of both streams and the positions to continue from."""
+    now = datetime.utcnow()
+    statement = changed_rows_statement(rows_after, limit, columns)
+    rows = (await session.execute(statement)).all()
+    tombstones = (await session.execute(tombstones_statement(tombstones_after, limit))).all()
+
+    has_more = len(rows) > limit or len(tombstones) > limit
+    rows, tombstones = rows[:limit], tombstones[:limit]
+    if rows:
+        rows_after = (rows[-1].updated_at, rows[-1].id)
+    if tombstones:
+        tombstones_after = (tombstones[-1].deleted_at, tombstones[-1].id)
+    if not has_more:
+        settled = settled_position(now)
+        rows_after = rows_after and min(rows_after, settled)
+        tombstones_after = tombstones_after and min(tombstones_after, settled)
+    return ChangesPage(rows, tombstones, rows_after, tombstones_after, has_more)
+
+
+# Every index in this process, so writes can be applied to the ones loaded
+# (see ``app.main.pizzerias_changed``) without importing each index module.
+followers: "weakref.WeakSet[ChangesFollower]" = weakref.WeakSet()
+
+
+class ChangesFollower(ABC):
+    """Base for in-process indexes kept current from the changes feed.
+
+    Subclasses implement ``add_row(row)`` for rows of ``sync_columns`` and
+    ``remove(id)``, say how stale they may get through ``sync_seconds``, and
+    call ``reset_sync()`` from ``reset()`` when they are emptied. The first
+    ``sync`` loads every row, unless the subclass restored
+    ``_rows_after``/``_tombstones_after`` from a snapshot; an index whose
+    position has expired (see ``cursor_expired``) is reset and reloaded.
+    """
+
+    sync_page_size = 10_000
+    sync_columns = (Pizzeria.id, Pizzeria.lat, Pizzeria.lng, Pizzeria.updated_at)
+
+    def __new__(cls, *args, **kwargs):
+        follower = super().__new__(cls)
+        followers.add(follower)
+        return follower
+
+    @property
+    @abstractmethod
+    def sync_seconds(self) -> float: ...
+
+    @abstractmethod
+    def add_row(self, row) -> None: ...
+
+    @abstractmethod
+    def remove(self, pizzeria_id: int) -> None: ...
+
+    @abstractmethod
+    def reset(self) -> None: ...
+
+    def reset_sync(self) -> None:
+        self._rows_after = None
+        self._tombstones_after = None
+        self._synced_at: float | None = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._synced_at is not None
+
+    def _fresh(self) -> bool:
+        return self.loaded and time.monotonic() - self._synced_at < self.sync_seconds
+
+    async def sync(self, session) -> None:
+        """Load the index on first use, then apply changes made elsewhere.
+
+        ``session`` must be on the primary, never a replica (see above).
+        """
+        if self._fresh():
+            return
+        async with self._lock:
+            if self._fresh():
+                return
+            started = time.monotonic()
+            now = datetime.utcnow()
+            if cursor_expired(self._tombstones_after, now):
+                # Deletes since then may be pruned: start over, under this same lock.
+                lock = self._lock
+                self.reset()
+                self._lock = lock
+            if self._tombstones_after is None:
+                self._tombstones_after = settled_position(now)
+            has_more = True
+            while has_more:
+                page = await fetch_changes(
+                    session,
+                    self._rows_after,
+                    self._tombstones_after,
+                    self.sync_page_size,
+                    self.sync_columns,
+                )
+                for tombstone in page.tombstones:
+                    self.remove(tombstone.id)
+                for row in page.rows:
+                    self.add_row(row)
+                self._rows_after, self._tombstones_after = page.rows_after, page.tombstones_after
+                has_more = page.has_more
+            self._synced_at = started
@@ -0,0 +1,149 @@
+"""Zoom-level clusters of located pizzerias for the map.
+
+As in supercluster, points are grouped per zoom level in Web Mercator space,
+so a cluster covers about ``CELL_PX`` screen pixels at every zoom. Unlike
+supercluster's greedy radius pass, clusters are fixed grid cells: adding or
+removing a point touches exactly one cell per level, so the index is kept
+current incrementally and never rebuilt.
+
+The index lives in each worker process. Its own writes are applied as they
+happen (``app.main.pizzerias_changed``); writes from other workers or other
+tools are picked up from the changes feed (``app.changes``) at most every
+``settings.cluster_sync_seconds``.
+"""
+
+import math
+
+from app.changes import ChangesFollower
+from app.config import settings
+from app.geo import BoundingBox
+
+MAX_ZOOM = 16
+TILE_PX = 256
+CELL_PX = 64
+MAX_MERCATOR_LAT = 85.05112878
+
+
+def project(lat: float, lng: float) -> tuple[float, float]:
+    """Web Mercator position of a point, both coordinates in ``[0, 1]``."""
+    sin_lat = math.sin(math.radians(max(min(lat, MAX_MERCATOR_LAT), -MAX_MERCATOR_LAT)))
+    y = 0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)
+    return (lng + 180) / 360, min(max(y, 0.0), 1.0)
+
+
+def unproject(x: float, y: float) -> tuple[float, float]:
+    lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y))))
+    return lat, x * 360 - 180
+
+
+class ClusterIndex(ChangesFollower):
+    def __init__(self, max_zoom: int = MAX_ZOOM, cell_px: int = CELL_PX):
+        self.max_zoom = max_zoom
+        self.cell_px = cell_px
+        self.reset()
+
+    def reset(self) -> None:
+        # Per zoom level: (column, row) -> [count, sum of x, sum of y, xor of ids].
+        # With one member left, the xor of ids is that member's id.
+        self._levels: list[dict] = [{} for _ in range(self.max_zoom + 1)]
+        self._points: dict[int, tuple[float, float]] = {}
+        self.reset_sync()
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    @property
+    def sync_seconds(self) -> float:
+        return settings.cluster_sync_seconds
+
+    def _cells(self, zoom: int) -> int:
+        """Cells per side at ``zoom``."""
+        return (TILE_PX << zoom) // self.cell_px
+
+    def add(self, pizzeria_id: int, lat: float | None, lng: float | None) -> None:
+        """Insert or move a point; a point without a location is removed."""
+        self.remove(pizzeria_id)
+        if lat is None or lng is None:
+            return
+        x, y = project(lat, lng)
+        self._points[pizzeria_id] = (x, y)
+        for zoom, level in enumerate(self._levels):
+            cells = self._cells(zoom)
+            key = (min(int(x * cells), cells - 1), min(int(y * cells), cells - 1))
+            cell = level.get(key)
+            if cell is None:
+                level[key] = [1, x, y, pizzeria_id]
+            else:
+                cell[0] += 1
+                cell[1] += x
+                cell[2] += y
+                cell[3] ^= pizzeria_id
+
+    def add_row(self, row) -> None:
+        self.add(row.id, row.lat, row.lng)
+
+    def remove(self, pizzeria_id: int) -> None:
+        point = self._points.pop(pizzeria_id, None)
+        if point is None:
+            return
+        x, y = point
+        for zoom, level in enumerate(self._levels):
+            cells = self._cells(zoom)
+            key = (min(int(x * cells), cells - 1), min(int(y * cells), cells - 1))
+            cell = level[key]
+            if cell[0] == 1:
+                del level[key]
+            else:
+                cell[0] -= 1
+                cell[1] -= x
+                cell[2] -= y
+                cell[3] ^= pizzeria_id
+
+    def clusters(self, bbox: BoundingBox, zoom: int) -> list[dict]:
+        """Clusters whose cell overlaps ``bbox`` at ``zoom`` (capped at ``max_zoom``)."""
+        zoom = min(max(zoom, 0), self.max_zoom)
+        level = self._levels[zoom]
+        cells = self._cells(zoom)
+
+        def column(lng: float) -> int:
+            return min(int((lng + 180) / 360 * cells), cells - 1)
+
+        west, east = column(bbox.min_lng), column(bbox.max_lng)
+        if bbox.crosses_antimeridian:
+            column_ranges = [(west, cells - 1), (0, east)]
+        else:
+            column_ranges = [(west, east)]
+        top = min(int(project(bbox.max_lat, 0)[1] * cells), cells - 1)
+        bottom = min(int(project(bbox.min_lat, 0)[1] * cells), cells - 1)
+
+        span = sum(last - first + 1 for first, last in column_ranges) * (bottom - top + 1)
+        if span <= len(level):
+            keys = (
+                (col, row)
+                for first, last in column_ranges
+                for col in range(first, last + 1)
+                for row in range(top, bottom + 1)
+            )
+            found = (level.get(key) for key in keys)
+        else:
+            # Wide viewport at a high zoom: scanning the level is cheaper.
+            found = (
+                cell
+                for key, cell in level.items()
+                if top <= key[1] <= bottom
+                and any(first <= key[0] <= last for first, last in column_ranges)
+            )
+
+        result = []
+        for cell in found:
+            if cell is None:
+                continue
+            count, sum_x, sum_y, ids = cell
+            lat, lng = unproject(sum_x / count, sum_y / count)
+            result.append(
+                {"lat": lat, "lng": lng, "count": count, "id": ids if count == 1 else None}
+            )
+        return result
+
+
+cluster_index = ClusterIndex()
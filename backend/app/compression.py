@@ -0,0 +1,160 @@
+"""Negotiated gzip/deflate response compression.
+
+``CompressionMiddleware`` compresses JSON, NDJSON and text responses when the
+client accepts it: whole bodies of at least ``settings.compression_min_size``
+bytes, and streamed bodies (exports) chunk by chunk. A response that already
+has a ``Content-Encoding`` is passed through, which is how routes serve
+bytes compressed ahead of time (see ``app.cache.CachedResponse``).
+
+Every response of a compressible type carries ``Vary: Accept-Encoding``,
+compressed or not, so shared caches never serve one client's representation
+to another that asked for a different encoding.
+"""
+
+import gzip
+import zlib
+
+from app.config import settings
+
+ENCODINGS = ("gzip", "deflate")
+COMPRESSIBLE_TYPES = (b"application/json", b"application/x-ndjson", b"text/")
+
+
+def negotiate_encoding(accept_encoding: str | None) -> str | None:
+    """The supported encoding the client prefers, gzip winning ties."""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        weights[name.strip().lower()] = quality
+    wildcard = weights.get("*", 0.0)
+    best, best_quality = None, 0.0
+    for encoding in ENCODINGS:
+        quality = weights.get(encoding, wildcard)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(body: bytes, encoding: str, level: int | None = None) -> bytes:
+    level = settings.compression_level if level is None else level
+    if encoding == "gzip":
+        # A fixed mtime keeps the output, and so its ETag, stable.
+        return gzip.compress(body, compresslevel=level, mtime=0)
+    # HTTP "deflate" is the zlib format, not raw deflate.
+    return zlib.compress(body, level)
+
+
+def compressor(encoding: str, level: int | None = None):
+    level = settings.compression_level if level is None else level
+    wbits = 31 if encoding == "gzip" else 15
+    return zlib.compressobj(level, zlib.DEFLATED, wbits)
+
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """The ETag of the ``encoding`` representation of a response tagged ``etag``."""
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def _header(headers, name: bytes) -> bytes | None:
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+def vary_headers(headers) -> list:
+    """``headers`` with ``Accept-Encoding`` added to their ``Vary``."""
+    vary = _header(headers, b"vary")
+    if vary is not None and b"accept-encoding" in vary.lower():
+        return list(headers)
+    return [*headers, (b"vary", b"Accept-Encoding")]
+
+
+def encoded_headers(headers, encoding: str) -> list:
+    """``headers`` of a response about to be sent with ``encoding``, minus its length."""
+    result = []
+    for key, value in headers:
+        key = key.lower()
+        if key == b"content-length":
+            continue
+        if key == b"etag":
+            value = encoded_etag(value.decode("latin-1"), encoding).encode("latin-1")
+        result.append((key, value))
+    result.append((b"content-encoding", encoding.encode()))
+    return vary_headers(result)
+
+
+class CompressionMiddleware:
+    """Pure ASGI middleware compressing responses the client can decode."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept = _header(scope["headers"], b"accept-encoding")
+        encoding = negotiate_encoding(accept.decode("latin-1") if accept else None)
+
+        # The start message is held back until the first body chunk shows
+        # whether the body is streamed and, if not, how large it is.
+        held = None
+        stream = None
+
+        async def send_wrapper(message):
+            nonlocal held, stream
+            if message["type"] == "http.response.start":
+                headers = message.get("headers", [])
+                content_type = _header(headers, b"content-type") or b""
+                if _header(headers, b"content-encoding") is not None or not content_type.startswith(
+                    COMPRESSIBLE_TYPES
+                ):
+                    await send(message)
+                elif encoding is None:
+                    await send({**message, "headers": vary_headers(headers)})
+                else:
+                    held = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if held is not None:
+                start, held = held, None
+                if not more_body and len(body) < settings.compression_min_size:
+                    await send({**start, "headers": vary_headers(start.get("headers", []))})
+                    await send(message)
+                    return
+                headers = encoded_headers(start.get("headers", []), encoding)
+                if not more_body:
+                    body = compress(body, encoding)
+                    headers.append((b"content-length", str(len(body)).encode()))
+                    await send({**start, "headers": headers})
+                    await send({**message, "body": body})
+                    return
+                stream = compressor(encoding)
+                await send({**start, "headers": headers})
+            if stream is None:
+                await send(message)
+                return
+            if more_body and not body:
+                return
+            # A sync flush ends every chunk on a byte boundary, so the client
+            # can decode each one as it arrives instead of when zlib's buffer fills.
+            chunk = stream.compress(body)
+            chunk += stream.flush(zlib.Z_SYNC_FLUSH if more_body else zlib.Z_FINISH)
+            await send({**message, "body": chunk})
+
+        await self.app(scope, receive, send_wrapper)
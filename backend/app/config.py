@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -9,13 +11,112 @@ class Settings(BaseSettings):
     )
 
     database_url: str
+    # Optional read replica for read-only endpoints; writes always use database_url
+    database_replica_url: str | None = None
+    # After a client commits a write, its reads stay on the primary this long
+    read_your_writes_seconds: float = 5.0
     google_maps_api_key: str | None = None
 
+    # Background geocoding of pizzerias without a location: "google" needs
+    # google_maps_api_key, "fake" resolves offline to made-up Berlin points;
+    # a pass over all of them starts every geocode_idle_seconds
+    geocoder: Literal["off", "google", "fake"] = "off"
+    geocode_batch_size: int = 100
+    geocode_concurrency: int = 5
+    geocode_requests_per_second: float = 10.0
+    geocode_idle_seconds: float = 60.0
+
+    # Durable background jobs (app.jobs): concurrent jobs per worker process,
+    # attempts before a job is marked failed, exponential retry backoff, how
+    # often other processes' jobs are polled for, when a running job counts
+    # as abandoned, and how long shutdown waits for running jobs
+    jobs_concurrency: int = 4
+    jobs_max_attempts: int = 5
+    jobs_backoff_seconds: float = 1.0
+    jobs_backoff_max_seconds: float = 300.0
+    jobs_poll_seconds: float = 5.0
+    jobs_lease_seconds: float = 300.0
+    jobs_drain_seconds: float = 10.0
+
+    # gzip/deflate responses: bodies below the minimum size are sent as is
+    compression_enabled: bool = True
+    compression_min_size: int = 1024
+    compression_level: int = 6
+
+    # Database engine and connection pool
+    db_echo: bool = False
+    db_pool_size: int = 10
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 10.0
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
+    db_statement_cache_size: int = 500
+    # "create_all" creates missing tables on start-up (development, tests);
+    # "verify" only checks the database is at the Alembic head revision.
+    db_startup_mode: Literal["create_all", "verify"] = "create_all"
+
     # JWT settings
     secret_key: str
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
     refresh_token_expire_days: int = 7
 
+    # Prometheus metrics at /metrics; off means no middleware or SQL hooks at all
+    metrics_enabled: bool = False
+
+    # GET /internal/* cache, pool, job and geocoder reports; only enable where
+    # the reverse proxy keeps /internal from being reached from outside
+    internal_endpoints_enabled: bool = False
+
+    # Password hashing
+    bcrypt_rounds: int = 12
+    password_hash_workers: int = 4
+    password_hash_max_pending: int = 32
+
+    # Token buckets for /auth/login and /auth/register, checked before any
+    # bcrypt work: burst size and sustained rate per minute of attempts per
+    # client IP, and of failed attempts per email and client IP
+    auth_rate_limit_ip_burst: int = 20
+    auth_rate_limit_ip_per_minute: float = 10.0
+    auth_rate_limit_email_burst: int = 5
+    auth_rate_limit_email_per_minute: float = 2.0
+    # Reverse proxies in front of the app that append to X-Forwarded-For; the
+    # client IP is read that many entries from its right. 0 uses the peer address
+    trusted_proxy_hops: int = 0
+
+    # Authenticated user cache used by get_current_user (per worker process)
+    user_cache_max_entries: int = 1024
+    user_cache_ttl_seconds: float = 30.0
+
+    # Verified JWT payloads by token hash, each kept until its exp (per worker process)
+    token_cache_max_entries: int = 4096
+
+    # GET /pizzerias/changes: how far behind "now" a final-page cursor stays,
+    # and how long deletes are remembered (older cursors get a 410)
+    changes_settle_seconds: float = 5.0
+    changes_tombstone_retention_days: float = 30.0
+
+    # GET /pizzerias/clusters: how often the in-process index picks up writes
+    # made by other workers from the changes feed
+    cluster_sync_seconds: float = 5.0
+
+    # GET /pizzerias/nearest: the same for the nearest-neighbour index
+    nearest_sync_seconds: float = 5.0
+
+    # GET /pizzerias/{id}/similar: hashed text features per pizzeria (4 bytes
+    # each), how often other workers' writes are picked up, and where to keep
+    # the snapshot new workers load (re-saved every similar_snapshot_rows changes)
+    similar_dimensions: int = 512
+    similar_sync_seconds: float = 5.0
+    similar_index_dir: str | None = None
+    similar_snapshot_rows: int = 1000
+
+    # POST /pizzerias/bulk
+    bulk_insert_max_items: int = 5000
+
+    # GET /pizzerias response cache (per worker process)
+    list_cache_max_entries: int = 256
+    list_cache_ttl_seconds: float = 60.0
+
 
 settings = Settings()
@@ -1,15 +1,107 @@
+import math
+import re
+import time
 from collections.abc import AsyncGenerator
+from contextvars import ContextVar
+from pathlib import Path
 
+from fastapi import Depends, Request
+from sqlalchemy import event, exc, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlmodel import SQLModel
 
 from app.config import settings
 
+
+class PoolMetrics:
+    """Connection acquisition counters for one pool."""
+
+    def __init__(self):
+        self.acquisitions = 0
+        self.timeouts = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def record(self, seconds: float) -> None:
+        self.acquisitions += 1
+        self.total_wait_seconds += seconds
+        self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+
+    def snapshot(self) -> dict:
+        return {
+            "acquisitions": self.acquisitions,
+            "timeouts": self.timeouts,
+            "avg_wait_ms": (
+                self.total_wait_seconds / self.acquisitions * 1000 if self.acquisitions else 0.0
+            ),
+            "max_wait_ms": self.max_wait_seconds * 1000,
+        }
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that times how long callers wait to get a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.metrics.timeouts += 1
+            raise
+        self.metrics.record(time.perf_counter() - started)
+        return connection
+
+
+def engine_options(database_url: str) -> dict:
+    """Keyword arguments for ``create_async_engine`` built from Settings."""
+    options = {"echo": settings.db_echo, "pool_pre_ping": settings.db_pool_pre_ping}
+    url = make_url(database_url)
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        # In-memory SQLite lives on a single shared connection; nothing to size.
+        return options
+
+    options.update(
+        poolclass=InstrumentedQueuePool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+    )
+    if url.get_driver_name() == "asyncpg":
+        options["connect_args"] = {
+            "prepared_statement_cache_size": settings.db_statement_cache_size
+        }
+    return options
+
+
+def pool_status(engine) -> dict:
+    pool = engine.sync_engine.pool
+    status = {"pool": type(pool).__name__}
+    if isinstance(pool, InstrumentedQueuePool):
+        status.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+            max_overflow=settings.db_max_overflow,
+            **pool.metrics.snapshot(),
+        )
+    else:
+        status["status"] = pool.status()
+    return status
+
+
 async_engine = create_async_engine(
     settings.database_url,
-    echo=True,
     future=True,
+    **engine_options(settings.database_url),
 )
 
 async_session_maker = sessionmaker(
@@ -18,12 +110,158 @@ async_session_maker = sessionmaker(
     expire_on_commit=False,
 )
 
+# Optional read replica. Read-only dependencies use it unless the client
+# wrote within the last ``read_your_writes_seconds`` (see below).
+replica_engine = (
+    create_async_engine(
+        settings.database_replica_url,
+        future=True,
+        **engine_options(settings.database_replica_url),
+    )
+    if settings.database_replica_url
+    else None
+)
+replica_session_maker = (
+    sessionmaker(
+        replica_engine,
+        class_=AsyncSession,
+        expire_on_commit=False,
+        info={"replica": True},
+    )
+    if replica_engine is not None
+    else None
+)
+
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / "alembic"
+_REVISION = re.compile(r'^revision(?:: str)? = "([^"]+)"', re.MULTILINE)
+_DOWN_REVISION = re.compile(r'^down_revision(?:: [^=]+)? = "([^"]+)"', re.MULTILINE)
+
+
+class SchemaRevisionError(RuntimeError):
+    pass
+
 
 async def create_db_and_tables():
     async with async_engine.begin() as conn:
         await conn.run_sync(SQLModel.metadata.create_all)
 
 
+def expected_schema_revision() -> str:
+    """The Alembic head, read from the migration files without importing them.
+
+    Loading alembic's ScriptDirectory imports every migration (and alembic
+    itself), which costs more than the rest of the start-up check.
+    """
+    revisions, parents = set(), set()
+    for path in (MIGRATIONS_DIR / "versions").glob("*.py"):
+        source = path.read_text(encoding="utf-8")
+        if match := _REVISION.search(source):
+            revisions.add(match.group(1))
+        if match := _DOWN_REVISION.search(source):
+            parents.add(match.group(1))
+    heads = revisions - parents
+    if len(heads) != 1:
+        raise SchemaRevisionError(f"Expected one Alembic head, found {sorted(heads)}")
+    return heads.pop()
+
+
+async def verify_schema_revision(engine=async_engine) -> str:
+    """Fail unless the database has been migrated to the Alembic head revision."""
+    expected = expected_schema_revision()
+    async with engine.connect() as conn:
+        try:
+            current = (
+                await conn.execute(text("SELECT version_num FROM alembic_version"))
+            ).scalar_one_or_none()
+        except exc.DBAPIError:
+            current = None
+    if current != expected:
+        raise SchemaRevisionError(
+            f"Database is at revision {current}, expected {expected}; "
+            "run `alembic upgrade head`"
+        )
+    return current
+
+
 async def get_session() -> AsyncGenerator[AsyncSession, None]:
     async with async_session_maker() as session:
         yield session
+
+
+def get_session_maker() -> sessionmaker:
+    """Session factory for work that outlives the request, such as streaming."""
+    return async_session_maker
+
+
+READ_PRIMARY_COOKIE = "read_primary_until"
+
+# Per-request flag set when a session commits, read by ReadYourWritesMiddleware.
+_request_wrote: ContextVar[list | None] = ContextVar("request_wrote", default=None)
+
+
+@event.listens_for(Session, "after_commit")
+def _mark_request_wrote(session) -> None:
+    wrote = _request_wrote.get()
+    if wrote is not None:
+        wrote[0] = True
+
+
+def _reads_own_writes(request: Request) -> bool:
+    try:
+        return float(request.cookies.get(READ_PRIMARY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def get_read_session_maker(
+    request: Request,
+    primary: sessionmaker = Depends(get_session_maker),
+) -> sessionmaker:
+    """Session factory for read-only work: the replica, when configured.
+
+    Clients that committed a write within ``read_your_writes_seconds`` carry
+    a cookie that keeps their reads on the primary, so they see their own
+    writes despite replication lag.
+    """
+    if replica_session_maker is None or _reads_own_writes(request):
+        return primary
+    return replica_session_maker
+
+
+async def get_read_session(
+    session_maker: sessionmaker = Depends(get_read_session_maker),
+) -> AsyncGenerator[AsyncSession, None]:
+    async with session_maker() as session:
+        yield session
+
+
+class ReadYourWritesMiddleware:
+    """Pure ASGI middleware setting the read-your-writes cookie after a commit."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or replica_session_maker is None:
+            await self.app(scope, receive, send)
+            return
+
+        wrote = [False]
+        token = _request_wrote.set(wrote)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and wrote[0]:
+                window = settings.read_your_writes_seconds
+                cookie = (
+                    f"{READ_PRIMARY_COOKIE}={time.time() + window:.3f}; "
+                    f"Max-Age={math.ceil(window)}; Path=/; HttpOnly; SameSite=Lax"
+                )
+                headers = [*message.get("headers", []), (b"set-cookie", cookie.encode())]
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_wrote.reset(token)
@@ -0,0 +1,75 @@
+import csv
+import io
+from collections.abc import AsyncIterator
+from datetime import datetime
+from enum import Enum
+
+from sqlalchemy.orm import sessionmaker
+
+from app.models import Pizzeria
+from app.serializers import PIZZERIA_READ_COLUMNS, dump_pizzeria_lines, select_pizzeria_rows
+
+EXPORT_BATCH_SIZE = 1000
+# The first batch is small so the first rows go out before a full batch has
+# been read; each batch after it is EXPORT_BATCH_GROWTH times larger, up to
+# EXPORT_BATCH_SIZE.
+EXPORT_FIRST_BATCH_SIZE = 16
+EXPORT_BATCH_GROWTH = 4
+
+
+class ExportFormat(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
+    @property
+    def media_type(self) -> str:
+        if self is ExportFormat.csv:
+            return "text/csv; charset=utf-8"
+        return "application/x-ndjson"
+
+
+def export_statement():
+    return select_pizzeria_rows().order_by(Pizzeria.id)
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _encode_csv(rows) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(_csv_value(value) for value in row)
+    return buffer.getvalue().encode("utf-8")
+
+
+async def stream_export(
+    session_maker: sessionmaker, statement, export_format: ExportFormat
+) -> AsyncIterator[bytes]:
+    """Yield the export in growing batches read through a server-side cursor.
+
+    Only one batch of rows is held in memory at a time.
+    """
+    if export_format is ExportFormat.csv:
+        # Send the header before the query runs so the first byte goes out at once.
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(column.key for column in PIZZERIA_READ_COLUMNS)
+        yield buffer.getvalue().encode("utf-8")
+        encode = _encode_csv
+    else:
+        encode = dump_pizzeria_lines
+
+    async with session_maker() as session:
+        # The driver's row buffer also starts small and grows up to the limit.
+        result = await session.stream(
+            statement.execution_options(stream_results=True, max_row_buffer=EXPORT_BATCH_SIZE)
+        )
+        size = EXPORT_FIRST_BATCH_SIZE
+        while rows := await result.fetchmany(size):
+            yield encode(rows)
+            size = min(size * EXPORT_BATCH_GROWTH, EXPORT_BATCH_SIZE)
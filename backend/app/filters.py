@@ -0,0 +1,75 @@
+from datetime import datetime, timezone
+
+from fastapi import Query
+from sqlalchemy import and_, or_
+
+from app.geo import BoundingBox, cell_ranges
+from app.models import Pizzeria
+
+
+def _naive_utc(value: datetime | None) -> datetime | None:
+    # Timestamps are stored as naive UTC, so aware query values are normalized.
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+class PizzeriaFilter:
+    """Query-string filters shared by the pizzeria listing endpoints."""
+
+    def __init__(
+        self,
+        min_rating: float | None = Query(None, description="Minimum rating (inclusive)"),
+        max_rating: float | None = Query(None, description="Maximum rating (inclusive)"),
+        visited: bool | None = Query(None, description="Only visited / not visited pizzerias"),
+        visited_after: datetime | None = Query(None, description="Visited at or after"),
+        visited_before: datetime | None = Query(None, description="Visited strictly before"),
+    ):
+        self.min_rating = min_rating
+        self.max_rating = max_rating
+        self.visited = visited
+        self.visited_after = _naive_utc(visited_after)
+        self.visited_before = _naive_utc(visited_before)
+
+    def cache_key(self) -> tuple:
+        return (
+            self.min_rating,
+            self.max_rating,
+            self.visited,
+            self.visited_after,
+            self.visited_before,
+        )
+
+    def apply(self, statement):
+        if self.min_rating is not None:
+            statement = statement.where(Pizzeria.rating >= self.min_rating)
+        if self.max_rating is not None:
+            statement = statement.where(Pizzeria.rating <= self.max_rating)
+        if self.visited is True:
+            statement = statement.where(Pizzeria.visited_at.is_not(None))
+        elif self.visited is False:
+            statement = statement.where(Pizzeria.visited_at.is_(None))
+        if self.visited_after is not None:
+            statement = statement.where(Pizzeria.visited_at >= self.visited_after)
+        if self.visited_before is not None:
+            statement = statement.where(Pizzeria.visited_at < self.visited_before)
+        return statement
+
+
+def within_bbox(bbox: BoundingBox):
+    """Where-clause matching pizzerias located inside ``bbox``.
+
+    The few quadtree cell ranges covering the box narrow the scan through the
+    ``geo_cell`` index; the lat/lng comparisons then make the match exact.
+    """
+    if bbox.crosses_antimeridian:
+        lng_clause = or_(Pizzeria.lng >= bbox.min_lng, Pizzeria.lng <= bbox.max_lng)
+    else:
+        lng_clause = Pizzeria.lng.between(bbox.min_lng, bbox.max_lng)
+    clause = and_(Pizzeria.lat.between(bbox.min_lat, bbox.max_lat), lng_clause)
+
+    ranges = cell_ranges(bbox)
+    if ranges is None:
+        return clause
+    cells = or_(*(Pizzeria.geo_cell.between(first, last) for first, last in ranges))
+    return and_(cells, clause)
@@ -0,0 +1,170 @@
+import math
+from dataclasses import dataclass
+
+EARTH_RADIUS_M = 6_371_008.8
+
+# Quadtree grid used as a portable spatial index: every located pizzeria
+# stores the Z-order (Morton) number of its cell, 2**CELL_BITS cells per axis
+# (about 1.2 x 0.6 km), which a plain B-tree index can range-scan on both
+# SQLite and Postgres. A cell of any coarser level is one contiguous range
+# of these numbers, so any viewport is covered by a few range seeks.
+CELL_BITS = 15
+CELL_COUNT = 1 << CELL_BITS
+
+# Viewports are covered by at most MAX_COVER_CELLS cells of the finest level
+# whose ranges, joined across small gaps, number at most MAX_CELL_RANGES: the
+# query planner (SQLite's in particular) stops choosing the index for an OR
+# of several ranges and scans the table instead.
+MAX_COVER_CELLS = 4
+MAX_CELL_RANGES = 2
+# Boxes needing cells coarser than this level (about 5.6 x 2.8 degrees) are
+# country-sized and hold much of the table; an id-ordered scan finds a page
+# of them faster than the index, so callers use the plain lat/lng filter.
+MIN_COVER_LEVEL = 6
+
+
+@dataclass(frozen=True)
+class BoundingBox:
+    """Lat/lng rectangle; ``min_lng > max_lng`` means it crosses the antimeridian."""
+
+    min_lng: float
+    min_lat: float
+    max_lng: float
+    max_lat: float
+
+    @property
+    def crosses_antimeridian(self) -> bool:
+        return self.min_lng > self.max_lng
+
+    def contains(self, lat: float, lng: float) -> bool:
+        if not self.min_lat <= lat <= self.max_lat:
+            return False
+        if self.crosses_antimeridian:
+            return lng >= self.min_lng or lng <= self.max_lng
+        return self.min_lng <= lng <= self.max_lng
+
+
+def parse_bbox(value: str) -> BoundingBox:
+    """Parse a ``min_lng,min_lat,max_lng,max_lat`` string."""
+    parts = value.split(",")
+    if len(parts) != 4:
+        raise ValueError("bbox must have four comma-separated values")
+    min_lng, min_lat, max_lng, max_lat = (float(part) for part in parts)
+    if not all(math.isfinite(v) for v in (min_lng, min_lat, max_lng, max_lat)):
+        raise ValueError("bbox values must be finite")
+    if not (-90 <= min_lat <= max_lat <= 90):
+        raise ValueError("bbox latitudes out of range")
+    if not (-180 <= min_lng <= 180 and -180 <= max_lng <= 180):
+        raise ValueError("bbox longitudes out of range")
+    return BoundingBox(min_lng, min_lat, max_lng, max_lat)
+
+
+def bbox_around(lat: float, lng: float, radius_m: float) -> BoundingBox:
+    """Smallest bounding box containing the circle of ``radius_m`` around a point."""
+    delta_lat = math.degrees(radius_m / EARTH_RADIUS_M)
+    min_lat = max(lat - delta_lat, -90.0)
+    max_lat = min(lat + delta_lat, 90.0)
+
+    cos_lat = math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+    if min_lat == -90.0 or max_lat == 90.0 or cos_lat <= 0:
+        return BoundingBox(-180.0, min_lat, 180.0, max_lat)
+    delta_lng = delta_lat / cos_lat
+    if delta_lng >= 180:
+        return BoundingBox(-180.0, min_lat, 180.0, max_lat)
+
+    min_lng = lng - delta_lng
+    max_lng = lng + delta_lng
+    if min_lng < -180:
+        min_lng += 360
+    if max_lng > 180:
+        max_lng -= 360
+    return BoundingBox(min_lng, min_lat, max_lng, max_lat)
+
+
+def _cell_row(lat: float) -> int:
+    return min(int(math.floor((lat + 90) / 180 * CELL_COUNT)), CELL_COUNT - 1)
+
+
+def _cell_column(lng: float) -> int:
+    return min(int(math.floor((lng + 180) / 360 * CELL_COUNT)), CELL_COUNT - 1)
+
+
+def _spread_bits(value: int) -> int:
+    """Move bit ``i`` of a 15-bit value to bit ``2 * i``."""
+    value = (value | (value << 8)) & 0x00FF00FF
+    value = (value | (value << 4)) & 0x0F0F0F0F
+    value = (value | (value << 2)) & 0x33333333
+    return (value | (value << 1)) & 0x55555555
+
+
+def _morton(row: int, column: int) -> int:
+    return _spread_bits(row) << 1 | _spread_bits(column)
+
+
+def grid_cell(lat: float | None, lng: float | None) -> int | None:
+    """Grid cell number of a point, or None for pizzerias without a location."""
+    if lat is None or lng is None:
+        return None
+    return _morton(_cell_row(lat), _cell_column(lng))
+
+
+def _level_ranges(rows: tuple[int, int], spans: list, shift: int) -> list[tuple[int, int]]:
+    """Cell number ranges of the cells ``shift`` levels up covering ``rows`` x ``spans``.
+
+    Ranges are joined across gaps no wider than one of those cells.
+    """
+    columns = {
+        column for first, last in spans for column in range(first >> shift, (last >> shift) + 1)
+    }
+    size = 1 << (2 * shift)
+    starts = sorted(
+        _morton(row, column) * size
+        for row in range(rows[0] >> shift, (rows[1] >> shift) + 1)
+        for column in columns
+    )
+    ranges: list[tuple[int, int]] = []
+    for start in starts:
+        if ranges and start - ranges[-1][1] <= size + 1:
+            ranges[-1] = (ranges[-1][0], start + size - 1)
+        else:
+            ranges.append((start, start + size - 1))
+    return ranges
+
+
+def cell_ranges(bbox: BoundingBox) -> list[tuple[int, int]] | None:
+    """Inclusive ``(first, last)`` cell number ranges covering ``bbox``.
+
+    Walks up the quadtree from the finest level to the first one where the
+    box spans at most ``MAX_COVER_CELLS`` cells that join into at most
+    ``MAX_CELL_RANGES`` ranges (per side of the antimeridian), or else the
+    finest one within ``MAX_COVER_CELLS``. Returns None for boxes too wide
+    to be worth it (see ``MIN_COVER_LEVEL``).
+    """
+    rows = (_cell_row(bbox.min_lat), _cell_row(bbox.max_lat))
+    if bbox.crosses_antimeridian:
+        spans = [(_cell_column(bbox.min_lng), CELL_COUNT - 1), (0, _cell_column(bbox.max_lng))]
+    else:
+        spans = [(_cell_column(bbox.min_lng), _cell_column(bbox.max_lng))]
+
+    fallback = None
+    for shift in range(CELL_BITS - MIN_COVER_LEVEL + 1):
+        height = (rows[1] >> shift) - (rows[0] >> shift) + 1
+        width = sum((last >> shift) - (first >> shift) + 1 for first, last in spans)
+        if height * width > MAX_COVER_CELLS:
+            continue
+        ranges = _level_ranges(rows, spans, shift)
+        if len(ranges) <= MAX_CELL_RANGES * len(spans):
+            return ranges
+        # A box on the equator or a meridian split at every level keeps its
+        # quadrants far apart on the curve; keep the tightest cover then.
+        fallback = fallback or ranges
+    return fallback
+
+
+def haversine_m(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance in meters."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
@@ -0,0 +1,335 @@
+"""Background geocoding of pizzerias that have no location.
+
+The worker walks pizzerias with NULL lat/lng in id order and resolves every
+distinct normalized address once: from the ``geocode_cache`` table if it has
+been seen before, otherwise from the configured geocoder. Lookups run
+concurrently up to ``geocode_concurrency`` and are paced by a token bucket at
+``geocode_requests_per_second``. "Not found" answers are cached too; failed
+lookups (quota, network) are not, and are retried on a later pass.
+
+In the app, all of this runs as ``app.jobs`` jobs, so one process does each
+piece of work however many workers there are: a ``geocode`` job per new
+pizzeria, and a chain of ``geocode_scan`` jobs, one batch each, walking the
+table every ``geocode_idle_seconds`` for rows written any other way.
+"""
+
+import asyncio
+import hashlib
+import logging
+import math
+import re
+import time
+import unicodedata
+from collections.abc import Callable
+from datetime import datetime
+from typing import NamedTuple, Protocol
+
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.auth.rate_limit import MemoryRateLimitBackend
+from app.config import settings
+from app.geo import grid_cell
+from app.jobs import enqueue, job_table
+from app.models import GeocodeCache, Pizzeria
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_GEOCODE_URL = "https://maps.googleapis.com/maps/api/geocode/json"
+
+cache_table = GeocodeCache.__table__
+pizzeria_table = Pizzeria.__table__
+
+
+class LocatedPizzeria(NamedTuple):
+    id: int
+    lat: float
+    lng: float
+
+
+class GeocodingError(Exception):
+    """A lookup failed for a reason worth retrying later."""
+
+
+class Geocoder(Protocol):
+    async def geocode(self, address: str) -> tuple[float, float] | None:
+        """Coordinates of ``address``, or None if it cannot be found."""
+        ...
+
+    async def close(self) -> None: ...
+
+
+def normalize_address(address: str) -> str:
+    """Cache key for an address: Unicode form, case, spacing and commas folded."""
+    address = unicodedata.normalize("NFKC", address).casefold()
+    return re.sub(r"[\s,]+", " ", address).strip()
+
+
+class GoogleGeocoder:
+    def __init__(self, api_key: str, client=None):
+        import httpx
+
+        self.api_key = api_key
+        self.client = client or httpx.AsyncClient(timeout=10.0)
+
+    async def geocode(self, address: str) -> tuple[float, float] | None:
+        import httpx
+
+        try:
+            response = await self.client.get(
+                GOOGLE_GEOCODE_URL, params={"address": address, "key": self.api_key}
+            )
+            response.raise_for_status()
+            data = response.json()
+        except (httpx.HTTPError, ValueError) as exc:
+            raise GeocodingError(str(exc)) from exc
+
+        if data.get("status") == "ZERO_RESULTS":
+            return None
+        if data.get("status") != "OK":
+            raise GeocodingError(data.get("status", "unknown status"))
+        location = data["results"][0]["geometry"]["location"]
+        return location["lat"], location["lng"]
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+class FakeGeocoder:
+    """Offline geocoder placing each address at a stable made-up point in Berlin.
+
+    Addresses listed in ``unknown`` resolve to None; every lookup is recorded
+    in ``calls``.
+    """
+
+    def __init__(self, unknown: set[str] = frozenset()):
+        self.unknown = {normalize_address(address) for address in unknown}
+        self.calls: list[str] = []
+
+    async def geocode(self, address: str) -> tuple[float, float] | None:
+        self.calls.append(address)
+        if normalize_address(address) in self.unknown:
+            return None
+        digest = hashlib.blake2b(normalize_address(address).encode(), digest_size=8).digest()
+        return (
+            52.40 + digest[0] / 255 * 0.25,
+            13.20 + digest[1] / 255 * 0.45,
+        )
+
+    async def close(self) -> None:
+        pass
+
+
+def make_geocoder(name: str) -> Geocoder | None:
+    if name == "google":
+        if not settings.google_maps_api_key:
+            raise ValueError("GEOCODER=google needs GOOGLE_MAPS_API_KEY")
+        return GoogleGeocoder(settings.google_maps_api_key)
+    if name == "fake":
+        return FakeGeocoder()
+    return None
+
+
+class GeocodingWorker:
+    def __init__(
+        self,
+        geocoder: Geocoder,
+        session_maker,
+        on_located: Callable[[list[LocatedPizzeria]], None] | None = None,
+    ):
+        self.geocoder = geocoder
+        self.session_maker = session_maker
+        self.on_located = on_located
+        self.after_id = 0
+        self.lookups = 0
+        self.cache_hits = 0
+        self.located = 0
+        self.failures = 0
+        self._limiter = MemoryRateLimitBackend(max_buckets=1)
+
+    async def run_once(self) -> int:
+        """Process the next batch of unlocated pizzerias; return its size.
+
+        Returns 0 once the end of the table is reached, after which the next
+        pass starts from the beginning again.
+        """
+        rows = await self._locate_after(self.after_id)
+        self.after_id = rows[-1].id if rows else 0
+        return len(rows)
+
+    async def _locate_after(self, after_id: int) -> list:
+        """Locate the next batch of unlocated pizzerias after ``after_id``; return it."""
+        async with self.session_maker() as session:
+            result = await session.execute(
+                select(Pizzeria.id, Pizzeria.address)
+                .where(Pizzeria.lat.is_(None), Pizzeria.id > after_id)
+                .order_by(Pizzeria.id)
+                .limit(settings.geocode_batch_size)
+            )
+            rows = result.all()
+            if rows:
+                await self._locate(session, rows)
+        return rows
+
+    async def locate(self, pizzeria_ids: list[int]) -> None:
+        """Geocode these pizzerias if they still have no location.
+
+        Raises ``GeocodingError`` if a lookup failed, so a job can retry it.
+        """
+        async with self.session_maker() as session:
+            result = await session.execute(
+                select(Pizzeria.id, Pizzeria.address).where(
+                    Pizzeria.lat.is_(None), Pizzeria.id.in_(pizzeria_ids)
+                )
+            )
+            rows = result.all()
+            if rows and await self._locate(session, rows):
+                raise GeocodingError(f"could not geocode pizzerias {pizzeria_ids}")
+
+    async def _locate(self, session, rows) -> int:
+        """Locate and commit ``rows`` (id, address); return the failed lookups."""
+        by_address: dict[str, list] = {}
+        for row in rows:
+            by_address.setdefault(normalize_address(row.address), []).append(row)
+
+        cached = await session.execute(
+            select(GeocodeCache.address, GeocodeCache.lat, GeocodeCache.lng).where(
+                GeocodeCache.address.in_(list(by_address))
+            )
+        )
+        coordinates = {entry.address: (entry.lat, entry.lng) for entry in cached}
+        self.cache_hits += len(coordinates)
+
+        misses = [key for key in by_address if key not in coordinates]
+        resolved = await self._lookup_all({key: by_address[key][0].address for key in misses})
+        if resolved:
+            await session.execute(
+                _insert_ignore(session.bind.dialect.name),
+                [
+                    {
+                        "address": key,
+                        "lat": point[0] if point else None,
+                        "lng": point[1] if point else None,
+                        "resolved_at": datetime.utcnow(),
+                    }
+                    for key, point in resolved.items()
+                ],
+            )
+            coordinates.update(
+                (key, point if point else (None, None)) for key, point in resolved.items()
+            )
+
+        located = [
+            {"_id": row.id, "lat": lat, "lng": lng, "geo_cell": grid_cell(lat, lng)}
+            for key, (lat, lng) in coordinates.items()
+            if lat is not None
+            for row in by_address[key]
+        ]
+        if located:
+            # Only fill rows that are still unlocated; a user may have set one meanwhile.
+            await session.execute(
+                update(pizzeria_table)
+                .where(pizzeria_table.c.id == bindparam("_id"), pizzeria_table.c.lat.is_(None))
+                .values(lat=bindparam("lat"), lng=bindparam("lng"), geo_cell=bindparam("geo_cell")),
+                located,
+            )
+        await session.commit()
+
+        self.located += len(located)
+        if located and self.on_located is not None:
+            self.on_located(
+                [LocatedPizzeria(row["_id"], row["lat"], row["lng"]) for row in located]
+            )
+        return len(misses) - len(resolved)
+
+    async def _lookup_all(self, addresses: dict[str, str]) -> dict:
+        """Geocode ``{normalized: original}`` addresses; failed ones are left out."""
+        semaphore = asyncio.Semaphore(settings.geocode_concurrency)
+        results = {}
+
+        async def lookup(key: str, address: str) -> None:
+            async with semaphore:
+                while wait := await self._limiter.take(
+                    "geocode",
+                    settings.geocode_concurrency,
+                    settings.geocode_requests_per_second,
+                ):
+                    await asyncio.sleep(wait)
+                self.lookups += 1
+                try:
+                    results[key] = await self.geocoder.geocode(address)
+                except GeocodingError as exc:
+                    self.failures += 1
+                    logger.warning("Geocoding %r failed: %s", address, exc)
+
+        await asyncio.gather(*(lookup(key, address) for key, address in addresses.items()))
+        return results
+
+    async def handle_job(self, payload: dict) -> None:
+        """``app.jobs`` handler for ``geocode`` jobs queued by POST /pizzerias."""
+        await self.locate([payload["id"]])
+
+    async def handle_scan_job(self, payload: dict) -> None:
+        """``app.jobs`` handler for ``geocode_scan`` jobs; each queues the next.
+
+        A full batch is followed right away by the one after it; the end of
+        the table by a new pass in the next ``geocode_idle_seconds`` slot.
+        """
+        rows = await self._locate_after(payload["after_id"])
+        async with self.session_maker() as session:
+            if rows:
+                last_id = rows[-1].id
+                await enqueue(
+                    session,
+                    "geocode_scan",
+                    {"after_id": last_id},
+                    dedupe_key=f"geocode_scan:after:{last_id}",
+                )
+            else:
+                await schedule_geocode_scan(session)
+            await session.commit()
+
+    def stats(self) -> dict:
+        return {
+            "lookups": self.lookups,
+            "cache_hits": self.cache_hits,
+            "located": self.located,
+            "failures": self.failures,
+        }
+
+
+async def schedule_geocode_scan(session) -> None:
+    """Queue a ``geocode_scan`` pass in ``session``'s transaction.
+
+    The dedupe key names the ``geocode_idle_seconds`` slot the pass starts
+    in, so every worker may call this and the slot still gets one pass.
+    """
+    now = time.time()
+    slot = math.floor(now / settings.geocode_idle_seconds) + 1
+    await enqueue(
+        session,
+        "geocode_scan",
+        {"after_id": 0},
+        dedupe_key=f"geocode_scan:{slot}",
+        delay=slot * settings.geocode_idle_seconds - now,
+    )
+
+
+async def start_geocode_scans(session) -> None:
+    """Queue a ``geocode_scan`` pass unless one is already queued or running.
+
+    Called by every worker at startup; a pass in progress keeps exactly one
+    ``geocode_scan`` job in the table, so it is not joined by a second one.
+    """
+    pending = await session.execute(
+        select(job_table.c.id)
+        .where(job_table.c.kind == "geocode_scan", job_table.c.status != "failed")
+        .limit(1)
+    )
+    if pending.first() is None:
+        await schedule_geocode_scan(session)
+
+
+def _insert_ignore(dialect_name: str):
+    insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+    return insert(cache_table).on_conflict_do_nothing(index_elements=[cache_table.c.address])
@@ -0,0 +1,68 @@
+"""Operational endpoints reporting this worker's caches, pools and queues.
+
+They are off (404) unless ``settings.internal_endpoints_enabled`` is set;
+enable them only where ``/internal`` cannot be reached from outside, for
+instance when the reverse proxy does not forward it.
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.auth.dependencies import user_cache
+from app.auth.security import token_cache
+from app.cache import pizzeria_list_cache
+from app.config import settings
+from app.database import async_engine, get_session, pool_status, replica_engine
+from app.jobs import job_queue
+from app.startup import startup_report
+
+
+def require_internal_enabled() -> None:
+    if not settings.internal_endpoints_enabled:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+
+
+router = APIRouter(
+    prefix="/internal",
+    tags=["internal"],
+    include_in_schema=False,
+    dependencies=[Depends(require_internal_enabled)],
+)
+
+
+@router.get("/cache")
+async def get_cache_stats():
+    """Hit/miss counters of the in-process response caches."""
+    return {
+        "pizzeria_list": pizzeria_list_cache.stats(),
+        "users": user_cache.stats(),
+        "tokens": token_cache.stats(),
+    }
+
+
+@router.get("/db-pool")
+async def get_db_pool_stats():
+    """Connection pool occupancy and acquisition latency, per engine."""
+    return {
+        "primary": pool_status(async_engine),
+        "replica": pool_status(replica_engine) if replica_engine is not None else None,
+    }
+
+
+@router.get("/startup")
+async def get_startup_timings():
+    """How long this worker took to import the app and run its start-up check."""
+    return startup_report()
+
+
+@router.get("/geocoding")
+async def get_geocoding_stats(request: Request):
+    """Progress of this worker's background geocoder, if one is enabled."""
+    worker = getattr(request.app.state, "geocoding_worker", None)
+    return {"enabled": worker is not None, **(worker.stats() if worker else {})}
+
+
+@router.get("/jobs")
+async def get_job_queue_stats(session: AsyncSession = Depends(get_session)):
+    """Background job queue depth and this worker's job latency."""
+    return await job_queue.status(session)
@@ -0,0 +1,283 @@
+"""Durable background jobs, run by an asyncio dispatcher in each worker process.
+
+Jobs are rows in the ``job`` table. ``enqueue`` inserts one in the caller's
+session, so a job is queued if and only if the write that needs it commits.
+The dispatcher claims ready jobs with a compare-and-set UPDATE (safe with
+several worker processes on one database), runs up to
+``settings.jobs_concurrency`` at a time and deletes them when done. A failing
+job is retried with exponential backoff until ``settings.jobs_max_attempts``,
+then kept as ``failed``. A job left ``running`` by a crashed process is
+claimed again once its lease expires.
+
+Handlers are registered per kind and take the decoded payload::
+
+    job_queue.register("geocode", handle_geocode)
+    await enqueue(session, "geocode", {"id": 1}, dedupe_key="geocode:1")
+    await session.commit()
+    job_queue.notify()
+"""
+
+import asyncio
+import logging
+import statistics
+from collections import deque
+from collections.abc import Awaitable, Callable
+from contextlib import suppress
+from datetime import datetime, timedelta
+
+import orjson
+from sqlalchemy import and_, delete, func, insert, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.config import settings
+from app.metrics import JOB_LATENCY, JOBS
+from app.models import Job
+
+logger = logging.getLogger(__name__)
+
+job_table = Job.__table__
+
+Handler = Callable[[dict], Awaitable[None]]
+
+
+async def enqueue(
+    session, kind: str, payload: dict, dedupe_key: str | None = None, delay: float = 0.0
+) -> None:
+    """Queue a job in ``session``'s transaction.
+
+    A job whose ``dedupe_key`` matches one still queued or running is dropped.
+    """
+    await enqueue_many(session, kind, [(payload, dedupe_key)], delay)
+
+
+async def enqueue_many(
+    session, kind: str, jobs: list[tuple[dict, str | None]], delay: float = 0.0
+) -> None:
+    """Queue ``(payload, dedupe_key)`` jobs of one kind with a single INSERT."""
+    if not jobs:
+        return
+    now = datetime.utcnow()
+    values = [
+        {
+            "kind": kind,
+            "payload": orjson.dumps(payload).decode(),
+            "dedupe_key": dedupe_key,
+            "status": "queued",
+            "attempts": 0,
+            "run_after": now + timedelta(seconds=delay),
+            "created_at": now,
+        }
+        for payload, dedupe_key in jobs
+    ]
+    if all(dedupe_key is None for _, dedupe_key in jobs):
+        statement = insert(job_table)
+    else:
+        dialect_insert = (
+            postgresql.insert if session.bind.dialect.name == "postgresql" else sqlite.insert
+        )
+        statement = dialect_insert(job_table).on_conflict_do_nothing(
+            index_elements=[job_table.c.dedupe_key]
+        )
+    await session.execute(statement, values)
+
+
+def backoff_seconds(attempts: int) -> float:
+    """Delay before retrying a job that has failed ``attempts`` times."""
+    return min(
+        settings.jobs_backoff_seconds * 2 ** (attempts - 1), settings.jobs_backoff_max_seconds
+    )
+
+
+def _ready(now: datetime):
+    lease_start = now - timedelta(seconds=settings.jobs_lease_seconds)
+    return or_(
+        and_(job_table.c.status == "queued", job_table.c.run_after <= now),
+        and_(job_table.c.status == "running", job_table.c.started_at < lease_start),
+    )
+
+
+class JobQueue:
+    def __init__(self):
+        self.handlers: dict[str, Handler] = {}
+        self.session_maker = None
+        self._dispatcher: asyncio.Task | None = None
+        self._running: set[asyncio.Task] = set()
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._claiming = False
+        self.completed = 0
+        self.retried = 0
+        self.failed = 0
+        # Enqueue-to-completion seconds of recent jobs.
+        self._latencies: deque[float] = deque(maxlen=1000)
+
+    def register(self, kind: str, handler: Handler) -> None:
+        self.handlers[kind] = handler
+
+    @property
+    def started(self) -> bool:
+        return self._dispatcher is not None
+
+    def start(self, session_maker) -> None:
+        self.session_maker = session_maker
+        self._stopping = False
+        self._wake = asyncio.Event()
+        self._dispatcher = asyncio.create_task(self._dispatch())
+
+    def notify(self) -> None:
+        """Look for ready jobs now instead of at the next poll."""
+        self._wake.set()
+
+    async def stop(self, timeout: float | None = None) -> None:
+        """Stop claiming jobs and wait up to ``timeout`` for running ones.
+
+        Jobs still running after that are cancelled and queued again.
+        """
+        if self._dispatcher is None:
+            return
+        self._stopping = True
+        self._wake.set()
+        if not self._claiming:
+            # Idle or waiting for a free slot; a claim in progress is let finish.
+            self._dispatcher.cancel()
+        with suppress(asyncio.CancelledError):
+            await self._dispatcher
+        self._dispatcher = None
+        if self._running:
+            timeout = settings.jobs_drain_seconds if timeout is None else timeout
+            _, pending = await asyncio.wait(self._running, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _dispatch(self) -> None:
+        slots = asyncio.Semaphore(settings.jobs_concurrency)
+        while not self._stopping:
+            await slots.acquire()
+            # Cleared before claiming, so a notify() that races the claim is kept.
+            self._wake.clear()
+            self._claiming = True
+            try:
+                job = await self._claim()
+            except Exception:
+                logger.exception("Claiming a job failed")
+                job = None
+            finally:
+                self._claiming = False
+            if job is None:
+                slots.release()
+                with suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wake.wait(), settings.jobs_poll_seconds)
+                continue
+            task = asyncio.create_task(self._execute(job))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+            task.add_done_callback(lambda _: slots.release())
+
+    async def _claim(self):
+        """Mark the next ready job running and return it, or None."""
+        async with self.session_maker() as session:
+            while True:
+                now = datetime.utcnow()
+                job = (
+                    await session.execute(
+                        select(job_table)
+                        .where(_ready(now))
+                        .order_by(job_table.c.run_after, job_table.c.id)
+                        .limit(1)
+                    )
+                ).first()
+                if job is None:
+                    return None
+                result = await session.execute(
+                    update(job_table)
+                    .where(job_table.c.id == job.id, _ready(now))
+                    .values(status="running", started_at=now, attempts=job.attempts + 1)
+                )
+                await session.commit()
+                if result.rowcount == 1:
+                    return job
+                # Another process claimed it first.
+
+    async def _execute(self, job) -> None:
+        attempts = job.attempts + 1
+        try:
+            handler = self.handlers.get(job.kind)
+            if handler is None:
+                raise LookupError(f"no handler for job kind {job.kind!r}")
+            await handler(orjson.loads(job.payload))
+        except asyncio.CancelledError:
+            # Shutdown ran out of drain time: give the attempt back.
+            await self._finish(job.id, status="queued", attempts=job.attempts)
+            raise
+        except Exception as exc:
+            logger.exception("Job %s (%s) failed on attempt %d", job.id, job.kind, attempts)
+            error = f"{type(exc).__name__}: {exc}"
+            if attempts >= settings.jobs_max_attempts:
+                JOBS.inc(job.kind, "failed")
+                self.failed += 1
+                # Free the dedupe key so the same work can be queued again.
+                await self._finish(job.id, status="failed", dedupe_key=None, last_error=error)
+            else:
+                JOBS.inc(job.kind, "retried")
+                self.retried += 1
+                await self._finish(
+                    job.id,
+                    status="queued",
+                    run_after=datetime.utcnow() + timedelta(seconds=backoff_seconds(attempts)),
+                    last_error=error,
+                )
+        else:
+            async with self.session_maker() as session:
+                await session.execute(delete(job_table).where(job_table.c.id == job.id))
+                await session.commit()
+            latency = (datetime.utcnow() - job.created_at).total_seconds()
+            JOBS.inc(job.kind, "completed")
+            JOB_LATENCY.observe(latency, job.kind)
+            self.completed += 1
+            self._latencies.append(latency)
+
+    async def _finish(self, job_id: int, **values) -> None:
+        async with self.session_maker() as session:
+            await session.execute(
+                update(job_table)
+                .where(job_table.c.id == job_id)
+                .values(started_at=None, **values)
+            )
+            await session.commit()
+
+    async def status(self, session) -> dict:
+        """Queue depth per status plus this process's throughput and latency."""
+        result = await session.execute(
+            select(job_table.c.status, func.count(), func.min(job_table.c.created_at)).group_by(
+                job_table.c.status
+            )
+        )
+        depth = {"queued": 0, "running": 0, "failed": 0}
+        oldest_queued = None
+        for job_status, count, oldest in result:
+            depth[job_status] = count
+            if job_status == "queued":
+                oldest_queued = oldest
+        latencies = sorted(self._latencies)
+        return {
+            "started": self.started,
+            "depth": depth,
+            "oldest_queued_seconds": (datetime.utcnow() - oldest_queued).total_seconds()
+            if oldest_queued
+            else None,
+            "in_flight": len(self._running),
+            "completed": self.completed,
+            "retried": self.retried,
+            "failed": self.failed,
+            "latency_seconds": {
+                "p50": statistics.median(latencies),
+                "p95": latencies[int(0.95 * (len(latencies) - 1))],
+                "max": latencies[-1],
+            }
+            if latencies
+            else None,
+        }
+
+
+job_queue = JobQueue()
@@ -1,18 +1,104 @@
 from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any
 
-from fastapi import Depends, FastAPI
+from fastapi import Body, Depends, FastAPI, Header, HTTPException, Query, Response, status
+from fastapi.responses import ORJSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlmodel import select
 
 from app.auth import User, auth_router, get_current_user
-from app.database import create_db_and_tables, get_session
-from app.models import Pizzeria, PizzeriaCreate, PizzeriaRead
+from app.auth.hashing import password_hasher
+from app.cache import CachedResponse, etag_matches, pizzeria_list_cache, strong_etag
+from app.changes import (
+    cursor_expired,
+    decode_changes_cursor,
+    encode_changes_cursor,
+    fetch_changes,
+    followers,
+    schedule_tombstone_pruning,
+    settled_position,
+    tombstone_pruner,
+)
+from app.clusters import cluster_index
+from app.compression import CompressionMiddleware, negotiate_encoding
+from app.config import settings
+from app.database import (
+    ReadYourWritesMiddleware,
+    async_engine,
+    async_session_maker,
+    get_read_session,
+    get_read_session_maker,
+    get_session,
+    replica_engine,
+)
+from app.export import ExportFormat, export_statement, stream_export
+from app.filters import PizzeriaFilter, within_bbox
+from app.geo import bbox_around, haversine_m, parse_bbox
+from app.geocoding import GeocodingWorker, make_geocoder, start_geocode_scans
+from app.internal import router as internal_router
+from app.jobs import enqueue, enqueue_many, job_queue
+from app.metrics import MetricsMiddleware, instrument_engine, render_metrics
+from app.models import (
+    Pizzeria,
+    PizzeriaBulkResult,
+    PizzeriaChanges,
+    PizzeriaCluster,
+    PizzeriaCreate,
+    PizzeriaRead,
+    PizzeriaStat,
+    PizzeriaStats,
+)
+from app.nearest import nearest_index
+from app.pagination import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    InvalidCursorError,
+    PizzeriaSort,
+    decode_cursor,
+    encode_cursor,
+    paginate,
+)
+from app.search import SearchNotSupportedError, search_statement, search_terms
+from app.serializers import (
+    PIZZERIA_READ_COLUMNS,
+    dump_pizzerias,
+    pizzeria_row_to_dict,
+    select_pizzeria_rows,
+)
+from app.startup import mark_imported, run_startup
+from app.stats import record_pizzerias, summarize
+
+MAX_NEAR_RADIUS_M = 50_000
+MAX_NEAREST_K = 100
+MAX_SIMILAR_K = 50
+MAX_SEARCH_OFFSET = 10_000
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    await create_db_and_tables()
+    await run_startup(settings.db_startup_mode)
+    geocoder = make_geocoder(settings.geocoder)
+    if geocoder is not None:
+        app.state.geocoding_worker = GeocodingWorker(
+            geocoder, async_session_maker, on_located=pizzerias_changed
+        )
+        job_queue.register("geocode", app.state.geocoding_worker.handle_job)
+        job_queue.register("geocode_scan", app.state.geocoding_worker.handle_scan_job)
+    job_queue.register("prune_tombstones", tombstone_pruner(async_session_maker))
+    async with async_session_maker() as session:
+        await schedule_tombstone_pruning(session)
+        if geocoder is not None:
+            await start_geocode_scans(session)
+        await session.commit()
+    job_queue.start(async_session_maker)
     yield
+    await job_queue.stop()
+    if geocoder is not None:
+        await geocoder.close()
+    password_hasher.shutdown()
 
 
 app = FastAPI(
@@ -23,6 +109,27 @@ app = FastAPI(
 )
 
 app.include_router(auth_router)
+app.include_router(internal_router)
+
+app.add_middleware(ReadYourWritesMiddleware)
+
+if settings.compression_enabled:
+    app.add_middleware(CompressionMiddleware)
+
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware)
+    instrument_engine(async_engine)
+    if replica_engine is not None:
+        instrument_engine(replica_engine)
+
+
+def pizzerias_changed(rows) -> None:
+    """Update derived state after pizzeria ``rows`` (with id, lat, lng) were written."""
+    pizzeria_list_cache.clear()
+    for index in list(followers):
+        if index.loaded:
+            for row in rows:
+                index.add_row(row)
 
 
 @app.get("/")
@@ -30,12 +137,290 @@ async def read_root():
     return {"message": "Welcome to AI Pizza API"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus scrape endpoint."""
+    if not settings.metrics_enabled:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/pizzerias", response_model=list[PizzeriaRead])
-async def get_all_pizzerias(session: AsyncSession = Depends(get_session)):
-    """Get all pizzerias."""
-    result = await session.execute(select(Pizzeria))
-    pizzerias = result.scalars().all()
-    return pizzerias
+async def get_all_pizzerias(
+    filters: PizzeriaFilter = Depends(),
+    sort: PizzeriaSort = PizzeriaSort.id,
+    cursor: str | None = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    if_none_match: str | None = Header(None),
+    accept_encoding: str | None = Header(None),
+    session: AsyncSession = Depends(get_read_session),
+):
+    """Get one page of pizzerias.
+
+    When more rows follow, the cursor for the next page is returned in the
+    ``X-Next-Cursor`` response header. Pages are served from an in-process
+    cache with strong ETags; a matching ``If-None-Match`` gets a 304. Cached
+    pages keep their gzip/deflate bodies, so each is compressed only once.
+    """
+    # Replica pages may lag the primary; keep them apart so a client reading
+    # its own writes from the primary never gets a replica page from cache.
+    key = (filters.cache_key(), sort.value, cursor, limit, session.info.get("replica", False))
+    cached = pizzeria_list_cache.get(key)
+
+    if cached is None:
+        try:
+            after = decode_cursor(cursor, sort) if cursor else None
+        except InvalidCursorError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor",
+            )
+
+        generation = pizzeria_list_cache.generation
+        statement = paginate(filters.apply(select_pizzeria_rows()), sort, after, limit)
+        result = await session.execute(statement)
+        rows = result.all()
+
+        headers = {}
+        if len(rows) > limit:
+            rows = rows[:limit]
+            headers["X-Next-Cursor"] = encode_cursor(sort, rows[-1])
+        body = dump_pizzerias(rows)
+        cached = CachedResponse(body=body, etag=strong_etag(body), headers=headers)
+        pizzeria_list_cache.put(key, cached, generation)
+
+    encoding = None
+    if settings.compression_enabled and len(cached.body) >= settings.compression_min_size:
+        encoding = negotiate_encoding(accept_encoding)
+    body, etag = cached.representation(encoding)
+    headers = {"ETag": etag, "Cache-Control": "no-cache", **cached.headers}
+    if settings.compression_enabled:
+        headers["Vary"] = "Accept-Encoding"
+    # Any representation's ETag names the same page version.
+    if etag_matches(if_none_match, cached.etag) or etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@app.get("/pizzerias/within", response_model=list[PizzeriaRead])
+async def get_pizzerias_within(
+    bbox: str = Query(..., description="min_lng,min_lat,max_lng,max_lat"),
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    session: AsyncSession = Depends(get_read_session),
+):
+    """Get pizzerias located inside a map viewport."""
+    try:
+        box = parse_bbox(bbox)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid bbox",
+        )
+
+    statement = select_pizzeria_rows().where(within_bbox(box)).order_by(Pizzeria.id).limit(limit)
+    result = await session.execute(statement)
+    return ORJSONResponse([pizzeria_row_to_dict(row) for row in result])
+
+
+@app.get("/pizzerias/clusters", response_model=list[PizzeriaCluster])
+async def get_pizzeria_clusters(
+    bbox: str = Query(..., description="min_lng,min_lat,max_lng,max_lat"),
+    zoom: int = Query(..., ge=0, le=22),
+    primary: AsyncSession = Depends(get_session),
+):
+    """Get marker clusters for a map viewport at a zoom level.
+
+    Each cluster has its centroid and member count; single pizzerias also
+    carry their ``id``. Zoom levels above the index's deepest level reuse it.
+    """
+    try:
+        box = parse_bbox(bbox)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid bbox",
+        )
+
+    await cluster_index.sync(primary)
+    return ORJSONResponse(cluster_index.clusters(box, zoom))
+
+
+@app.get("/pizzerias/near", response_model=list[PizzeriaRead])
+async def get_pizzerias_near(
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    radius_m: float = Query(..., gt=0, le=MAX_NEAR_RADIUS_M),
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    session: AsyncSession = Depends(get_read_session),
+):
+    """Get pizzerias within ``radius_m`` meters of a point, closest first."""
+    statement = select_pizzeria_rows().where(within_bbox(bbox_around(lat, lng, radius_m)))
+    result = await session.execute(statement)
+
+    # The bounding box over-selects its corners; refine with the exact distance.
+    nearby = []
+    for row in result:
+        distance = haversine_m(lat, lng, row.lat, row.lng)
+        if distance <= radius_m:
+            nearby.append((distance, row.id, row))
+    nearby.sort(key=lambda item: item[:2])
+    return ORJSONResponse([pizzeria_row_to_dict(row) for _, _, row in nearby[:limit]])
+
+
+@app.get("/pizzerias/nearest", response_model=list[PizzeriaRead])
+async def get_nearest_pizzerias(
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    k: int = Query(10, ge=1, le=MAX_NEAREST_K),
+    session: AsyncSession = Depends(get_read_session),
+    primary: AsyncSession = Depends(get_session),
+):
+    """Get the ``k`` pizzerias closest to a point, closest first, however far."""
+    await nearest_index.sync(primary)
+    ranked = [pizzeria_id for pizzeria_id, _ in nearest_index.nearest(lat, lng, k)]
+    if not ranked:
+        return ORJSONResponse([])
+    result = await session.execute(select_pizzeria_rows().where(Pizzeria.id.in_(ranked)))
+    rows = {row.id: row for row in result}
+    # A row deleted since the index last synced is left out.
+    return ORJSONResponse([pizzeria_row_to_dict(rows[i]) for i in ranked if i in rows])
+
+
+@app.get("/pizzerias/search", response_model=list[PizzeriaRead])
+async def search_pizzerias(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0, le=MAX_SEARCH_OFFSET),
+    session: AsyncSession = Depends(get_read_session),
+):
+    """Full-text search over name, address and review, best matches first.
+
+    When more results follow, the offset of the next page is returned in the
+    ``X-Next-Offset`` response header.
+    """
+    terms = search_terms(q)
+    if not terms:
+        return ORJSONResponse([])
+
+    try:
+        statement = search_statement(session.bind.dialect.name, terms)
+    except SearchNotSupportedError:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Search is not supported on this database",
+        )
+
+    result = await session.execute(statement.limit(limit + 1).offset(offset))
+    rows = result.all()
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Offset"] = str(offset + limit)
+    return ORJSONResponse([pizzeria_row_to_dict(row) for row in rows], headers=headers)
+
+
+@app.get("/pizzerias/changes", response_model=PizzeriaChanges)
+async def get_pizzeria_changes(
+    since: str | None = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    session: AsyncSession = Depends(get_session),
+):
+    """Pizzerias inserted or updated, and ids deleted, since a previous call.
+
+    Without ``since`` every pizzeria is returned (page by page) and deletions
+    are tracked from now on. Pass the returned ``cursor`` as ``since`` to get
+    the next page, or, once ``has_more`` is false, to poll for later changes.
+    Apply ``deleted`` before ``changed``; a row may be sent more than once.
+    A cursor older than ``changes_tombstone_retention_days`` gets a 410:
+    start over without ``since``.
+    """
+    if since:
+        try:
+            rows_after, tombstones_after = decode_changes_cursor(since)
+        except InvalidCursorError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor",
+            )
+        if cursor_expired(tombstones_after, datetime.utcnow()):
+            raise HTTPException(
+                status_code=status.HTTP_410_GONE,
+                detail="Cursor expired; sync again without since",
+            )
+    else:
+        rows_after, tombstones_after = None, settled_position(datetime.utcnow())
+
+    page = await fetch_changes(session, rows_after, tombstones_after, limit)
+    return ORJSONResponse(
+        {
+            "changed": [pizzeria_row_to_dict(row) for row in page.rows],
+            "deleted": [tombstone.id for tombstone in page.tombstones],
+            "cursor": encode_changes_cursor(page.rows_after, page.tombstones_after),
+            "has_more": page.has_more,
+        }
+    )
+
+
+@app.get("/pizzerias/stats", response_model=PizzeriaStats)
+async def get_pizzeria_stats(session: AsyncSession = Depends(get_read_session)):
+    """Aggregate ratings and visits, read from the incrementally kept summary table."""
+    result = await session.execute(select(PizzeriaStat))
+    return summarize(result.scalars())
+
+
+@app.get("/pizzerias/export")
+async def export_pizzerias(
+    export_format: ExportFormat = Query(ExportFormat.ndjson, alias="format"),
+    filters: PizzeriaFilter = Depends(),
+    session_maker=Depends(get_read_session_maker),
+):
+    """Stream every matching pizzeria as NDJSON or CSV."""
+    return StreamingResponse(
+        stream_export(session_maker, filters.apply(export_statement()), export_format),
+        media_type=export_format.media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="pizzerias.{export_format.value}"'
+        },
+    )
+
+
+@app.get("/pizzerias/{pizzeria_id}/similar", response_model=list[PizzeriaRead])
+async def get_similar_pizzerias(
+    pizzeria_id: int,
+    k: int = Query(10, ge=1, le=MAX_SIMILAR_K),
+    session: AsyncSession = Depends(get_read_session),
+    primary: AsyncSession = Depends(get_session),
+):
+    """Get the pizzerias whose name and review read most like this one's.
+
+    Ranked by TF-IDF cosine similarity, most similar first; pizzerias sharing
+    no terms are left out.
+    """
+    # Imported on first use: numpy alone adds tens of ms to start-up.
+    from app.similar import similar_index
+
+    await similar_index.sync(primary)
+    if pizzeria_id not in similar_index:
+        # Possibly created by another worker since the index last synced.
+        statement = select(Pizzeria.id, Pizzeria.name, Pizzeria.review).where(
+            Pizzeria.id == pizzeria_id
+        )
+        row = (await session.execute(statement)).first()
+        if row is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Pizzeria not found",
+            )
+        similar_index.add_row(row)
+
+    ranked = [i for i, _ in similar_index.similar(pizzeria_id, k)]
+    if not ranked:
+        return ORJSONResponse([])
+    result = await session.execute(select_pizzeria_rows().where(Pizzeria.id.in_(ranked)))
+    rows = {row.id: row for row in result}
+    return ORJSONResponse([pizzeria_row_to_dict(rows[i]) for i in ranked if i in rows])
 
 
 @app.post("/pizzerias", response_model=PizzeriaRead, status_code=201)
@@ -47,6 +432,81 @@ async def create_pizzeria(
     """Create a new pizzeria. Requires authentication."""
     db_pizzeria = Pizzeria(**pizzeria.to_db_model())
     session.add(db_pizzeria)
+    await record_pizzerias(session, [db_pizzeria])
+    needs_geocoding = db_pizzeria.lat is None and settings.geocoder != "off"
+    if needs_geocoding:
+        await session.flush()
+        await enqueue(
+            session, "geocode", {"id": db_pizzeria.id}, dedupe_key=f"geocode:{db_pizzeria.id}"
+        )
     await session.commit()
+    if needs_geocoding:
+        job_queue.notify()
+    pizzerias_changed([db_pizzeria])
     await session.refresh(db_pizzeria)
     return db_pizzeria
+
+
+@app.post("/pizzerias/bulk", response_model=PizzeriaBulkResult)
+async def create_pizzerias_bulk(
+    items: list[Any] = Body(...),
+    session: AsyncSession = Depends(get_session),
+    current_user: User = Depends(get_current_user),
+):
+    """Create many pizzerias in one transaction. Requires authentication.
+
+    Items are validated one by one; invalid items are reported by index and
+    the valid ones are written with a single multi-row INSERT ... RETURNING.
+    Those without a location get a ``geocode`` job in the same transaction.
+    """
+    if len(items) > settings.bulk_insert_max_items:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {settings.bulk_insert_max_items} items per request",
+        )
+
+    now = datetime.utcnow()
+    rows, errors = [], []
+    for index, item in enumerate(items):
+        try:
+            pizzeria = PizzeriaCreate.model_validate(item)
+        except ValidationError as exc:
+            errors.append(
+                {"index": index, "errors": exc.errors(include_url=False, include_context=False)}
+            )
+            continue
+        rows.append({**pizzeria.to_db_model(), "created_at": now, "updated_at": now})
+
+    created = []
+    if rows:
+        # Core insert on the table: ORM bulk inserts split batches on NULLs,
+        # and asking for RETURNING in parameter order makes SQLite fall back
+        # to one statement per row. Ids are assigned in VALUES order, so
+        # sorting by id restores the request order.
+        statement = insert(Pizzeria.__table__).returning(*PIZZERIA_READ_COLUMNS)
+        result = await session.execute(statement, rows)
+        inserted = sorted(result, key=lambda row: row.id)
+        await record_pizzerias(session, inserted)
+        unlocated = [row.id for row in inserted if row.lat is None]
+        needs_geocoding = bool(unlocated) and settings.geocoder != "off"
+        if needs_geocoding:
+            await enqueue_many(
+                session,
+                "geocode",
+                [({"id": pizzeria_id}, f"geocode:{pizzeria_id}") for pizzeria_id in unlocated],
+            )
+        await session.commit()
+        if needs_geocoding:
+            job_queue.notify()
+        # SQLite's RETURNING gives whole REAL values back as ints (4 for 4.0);
+        # validating coerces them so the items read exactly as GET returns them.
+        created = [
+            PizzeriaRead.model_validate(pizzeria_row_to_dict(row)).model_dump()
+            for row in inserted
+        ]
+        pizzerias_changed(inserted)
+
+    return ORJSONResponse({"created": created, "errors": errors})
+
+
+mark_imported()
@@ -0,0 +1,224 @@
+"""In-process Prometheus metrics.
+
+Nothing here is installed unless ``Settings.metrics_enabled`` is set: the
+middleware and SQL event hooks are only attached when it is, so a disabled
+deployment pays nothing beyond the import.
+"""
+
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...], buckets: tuple):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for label_values, (counts, total, count) in sorted(self._series.items()):
+            labels = _labels(self.labels, label_values)
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += bucket_count
+                le = _labels(("le",), (str(bound),))
+                lines.append(f"{self.name}_bucket{_join(labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values: dict[tuple, float] = defaultdict(float)
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        self._values[label_values] += amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for label_values, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple[str, ...], values: tuple) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)) + "}"
+
+
+def _join(labels: str, extra: str) -> str:
+    if not labels:
+        return extra
+    return labels[:-1] + "," + extra[1:]
+
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route.",
+    ("method", "route"),
+    LATENCY_BUCKETS,
+)
+REQUESTS = Counter(
+    "http_requests_total", "HTTP requests by route and status.", ("method", "route", "status")
+)
+REQUEST_SQL_STATEMENTS = Histogram(
+    "http_request_sql_statements",
+    "SQL statements executed per request.",
+    ("route",),
+    COUNT_BUCKETS,
+)
+REQUEST_DB_TIME = Histogram(
+    "http_request_db_seconds",
+    "Total time spent in SQL statements per request.",
+    ("route",),
+    LATENCY_BUCKETS,
+)
+SQL_STATEMENT_LATENCY = Histogram(
+    "db_statement_duration_seconds", "SQL statement latency.", (), LATENCY_BUCKETS
+)
+PASSWORD_HASH_LATENCY = Histogram(
+    "password_hash_duration_seconds",
+    "bcrypt time per operation in the auth router.",
+    ("operation",),
+    LATENCY_BUCKETS,
+)
+TOKEN_DECODE_LATENCY = Histogram(
+    "token_decode_duration_seconds",
+    "JWT decode time by verified-token cache result.",
+    ("cache",),
+    LATENCY_BUCKETS,
+)
+AUTH_RATE_LIMITED = Counter(
+    "auth_rate_limited_total",
+    "Login and register attempts rejected before bcrypt, by limit.",
+    ("scope",),
+)
+JOB_LATENCY = Histogram(
+    "job_latency_seconds",
+    "Time from enqueue to completion of background jobs, by kind.",
+    ("kind",),
+    LATENCY_BUCKETS,
+)
+JOBS = Counter("jobs_total", "Background job attempts by kind and outcome.", ("kind", "outcome"))
+
+REGISTRY = [
+    REQUEST_LATENCY,
+    REQUESTS,
+    REQUEST_SQL_STATEMENTS,
+    REQUEST_DB_TIME,
+    SQL_STATEMENT_LATENCY,
+    PASSWORD_HASH_LATENCY,
+    TOKEN_DECODE_LATENCY,
+    AUTH_RATE_LIMITED,
+    JOB_LATENCY,
+    JOBS,
+]
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+@dataclass
+class RequestStats:
+    statements: int = 0
+    db_seconds: float = 0.0
+
+
+_request_stats: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording latency, status and SQL work per route."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _request_stats.reset(token)
+            # Label by route template, never the raw path, to bound cardinality.
+            route = getattr(scope.get("route"), "path", "unmatched")
+            method = scope["method"]
+            REQUEST_LATENCY.observe(elapsed, method, route)
+            REQUESTS.inc(method, route, str(status_code))
+            REQUEST_SQL_STATEMENTS.observe(stats.statements, route)
+            REQUEST_DB_TIME.observe(stats.db_seconds, route)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    SQL_STATEMENT_LATENCY.observe(elapsed)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.db_seconds += elapsed
+
+
+def _handle_error(context):
+    # Failed statements never reach after_cursor_execute; keep the stack aligned.
+    starts = context.connection.info.get("query_start") if context.connection else None
+    if starts:
+        starts.pop()
+
+
+def instrument_engine(engine) -> None:
+    """Attach statement timing hooks to an (async) engine."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
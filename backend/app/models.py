@@ -1,26 +1,92 @@
 from datetime import datetime
 
 from pydantic import BaseModel, model_validator
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel
 
+from app.geo import grid_cell
+
 
 class Location(BaseModel):
-    lat: float
-    lng: float
+    lat: float = Field(ge=-90, le=90)
+    lng: float = Field(ge=-180, le=180)
 
 
 class Pizzeria(SQLModel, table=True):
+    # Composite (sort key, id) indexes back the keyset-paginated list endpoint.
+    __table_args__ = (
+        Index("ix_pizzeria_name_id", "name", "id"),
+        Index("ix_pizzeria_rating_id", "rating", "id"),
+        Index("ix_pizzeria_visited_at_id", "visited_at", "id"),
+        Index("ix_pizzeria_created_at_id", "created_at", "id"),
+        # Backs the GET /pizzerias/changes keyset.
+        Index("ix_pizzeria_updated_at_id", "updated_at", "id"),
+    )
+
     id: int | None = Field(default=None, primary_key=True)
     name: str
     address: str
     lat: float | None = None
     lng: float | None = None
+    geo_cell: int | None = Field(default=None, index=True)
     rating: float | None = None
     google_maps_url: str | None = None
     review: str | None = None
     visited_at: datetime | None = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(
+        default_factory=datetime.utcnow,
+        sa_column_kwargs={"onupdate": datetime.utcnow},
+    )
+
+
+class PizzeriaTombstone(SQLModel, table=True):
+    """A deleted pizzeria id, written by a database trigger (see app.changes)."""
+
+    __tablename__ = "pizzeria_tombstone"
+
+    id: int = Field(primary_key=True)
+    deleted_at: datetime = Field(index=True)
+
+
+class GeocodeCache(SQLModel, table=True):
+    """Geocoder result per normalized address; NULL lat/lng means not found."""
+
+    __tablename__ = "geocode_cache"
+
+    address: str = Field(primary_key=True)
+    lat: float | None = None
+    lng: float | None = None
+    resolved_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class Job(SQLModel, table=True):
+    """A queued, running or failed background job; done jobs are deleted (see app.jobs)."""
+
+    __table_args__ = (Index("ix_job_status_run_after", "status", "run_after"),)
+
+    id: int | None = Field(default=None, primary_key=True)
+    kind: str
+    payload: str = "{}"
+    # Unique while the job exists, so an equal job is not queued twice.
+    dedupe_key: str | None = Field(default=None, unique=True)
+    status: str = "queued"
+    attempts: int = 0
+    run_after: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    started_at: datetime | None = None
+    last_error: str | None = None
+
+
+class PizzeriaStat(SQLModel, table=True):
+    """One aggregate bucket behind GET /pizzerias/stats, kept up to date on write."""
+
+    __tablename__ = "pizzeria_stat"
+
+    kind: str = Field(primary_key=True)
+    bucket: str = Field(default="", primary_key=True)
+    count: int = 0
+    rating_sum: float = 0.0
 
 
 class PizzeriaCreate(BaseModel):
@@ -33,10 +99,11 @@ class PizzeriaCreate(BaseModel):
     visited_at: datetime | None = None
 
     def to_db_model(self) -> dict:
+        # Always emit the same keys so bulk inserts batch into one statement.
         data = self.model_dump(exclude={"location"})
-        if self.location:
-            data["lat"] = self.location.lat
-            data["lng"] = self.location.lng
+        data["lat"] = self.location.lat if self.location else None
+        data["lng"] = self.location.lng if self.location else None
+        data["geo_cell"] = grid_cell(data["lat"], data["lng"])
         return data
 
 
@@ -68,3 +135,36 @@ class PizzeriaRead(BaseModel):
                 data = dict(data.__dict__)
                 data["location"] = {"lat": lat, "lng": lng}
         return data
+
+
+class BulkItemError(BaseModel):
+    index: int
+    errors: list[dict]
+
+
+class PizzeriaBulkResult(BaseModel):
+    created: list[PizzeriaRead]
+    errors: list[BulkItemError]
+
+
+class PizzeriaCluster(BaseModel):
+    lat: float
+    lng: float
+    count: int
+    id: int | None = None
+
+
+class PizzeriaChanges(BaseModel):
+    changed: list[PizzeriaRead]
+    deleted: list[int]
+    cursor: str
+    has_more: bool
+
+
+class PizzeriaStats(BaseModel):
+    total: int
+    rated: int
+    average_rating: float | None
+    visited: int
+    visits_per_month: dict[str, int]
+    rating_histogram: dict[str, int]
@@ -0,0 +1,190 @@
+"""Exact k-nearest-neighbour lookups of located pizzerias.
+
+Points are stored as 3D unit vectors, where straight-line (chord) distance
+grows with great-circle distance, so a plain Euclidean KD-tree ranks them
+correctly everywhere on the sphere, poles and antimeridian included.
+
+The tree is immutable. Points added or moved since it was built wait in a
+small unsorted buffer that every query also scans, and tree entries whose
+point was removed or moved are skipped, so answers are exact at all times.
+Once the buffer and the skipped entries grow past ``REBUILD_MIN`` (or an
+eighth of the index), ``sync`` builds a new tree in a thread from a snapshot
+and swaps it in; queries keep using the old tree meanwhile.
+
+Like ``app.clusters``, the index lives in each worker process, is loaded on
+first use and follows other workers' writes through the changes feed.
+"""
+
+import asyncio
+import heapq
+import math
+
+from app.changes import ChangesFollower
+from app.config import settings
+from app.geo import EARTH_RADIUS_M
+
+REBUILD_MIN = 512
+LEAF_SIZE = 8
+
+Vector = tuple[float, float, float]
+
+
+def unit_vector(lat: float, lng: float) -> Vector:
+    lat, lng = math.radians(lat), math.radians(lng)
+    cos_lat = math.cos(lat)
+    return cos_lat * math.cos(lng), cos_lat * math.sin(lng), math.sin(lat)
+
+
+def chord_to_meters(chord: float) -> float:
+    return 2 * EARTH_RADIUS_M * math.asin(min(chord / 2, 1.0))
+
+
+def _squared_distance(a: Vector, b: Vector) -> float:
+    return (a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2 + (a[2] - b[2]) ** 2
+
+
+class KDTree:
+    """Static KD-tree over ``(id, vector)`` items.
+
+    Nodes are laid out implicitly: the node for items ``[lo, hi)`` is the
+    median at ``(lo + hi) // 2``, split on the axis with the widest spread;
+    ranges of at most ``LEAF_SIZE`` items are leaves scanned in full.
+    """
+
+    def __init__(self, items: list[tuple[int, Vector]]):
+        self.items = list(items)
+        self.axes = [0] * len(self.items)
+        stack = [(0, len(self.items))]
+        while stack:
+            lo, hi = stack.pop()
+            if hi - lo <= LEAF_SIZE:
+                continue
+            chunk = self.items[lo:hi]
+            spreads = [max(values) - min(values) for values in zip(*(item[1] for item in chunk))]
+            axis = spreads.index(max(spreads))
+            chunk.sort(key=lambda item: item[1][axis])
+            self.items[lo:hi] = chunk
+            mid = (lo + hi) // 2
+            self.axes[mid] = axis
+            stack.append((lo, mid))
+            stack.append((mid + 1, hi))
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def nearest(self, query: Vector, k: int, heap: list, is_current) -> None:
+        """Offer the ``k`` nearest current items to ``heap``.
+
+        ``heap`` holds ``(-squared distance, -id, id)`` of the best items so
+        far, at most ``k``; ``is_current(id, vector)`` filters stale entries.
+        """
+        stack = [(0, len(self.items), 0.0)]
+        while stack:
+            lo, hi, bound = stack.pop()
+            if lo >= hi or (len(heap) == k and bound > -heap[0][0]):
+                continue
+            if hi - lo <= LEAF_SIZE:
+                for pizzeria_id, vector in self.items[lo:hi]:
+                    if is_current(pizzeria_id, vector):
+                        _offer(heap, k, _squared_distance(query, vector), pizzeria_id)
+                continue
+            mid = (lo + hi) // 2
+            pizzeria_id, vector = self.items[mid]
+            if is_current(pizzeria_id, vector):
+                _offer(heap, k, _squared_distance(query, vector), pizzeria_id)
+            diff = query[self.axes[mid]] - vector[self.axes[mid]]
+            if diff < 0:
+                near, far = (lo, mid), (mid + 1, hi)
+            else:
+                near, far = (mid + 1, hi), (lo, mid)
+            stack.append((*far, max(bound, diff * diff)))
+            stack.append((*near, bound))
+
+
+def _offer(heap: list, k: int, squared: float, pizzeria_id: int) -> None:
+    # Ties go to the lower id, so results are deterministic.
+    entry = (-squared, -pizzeria_id, pizzeria_id)
+    if len(heap) < k:
+        heapq.heappush(heap, entry)
+    elif entry > heap[0]:
+        heapq.heapreplace(heap, entry)
+
+
+class NearestIndex(ChangesFollower):
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self._points: dict[int, Vector] = {}
+        self._tree = KDTree([])
+        # Points not in the tree as they are now: new or moved since it was built.
+        self._pending: dict[int, Vector] = {}
+        # Tree entries no longer current (removed or moved points).
+        self._stale = 0
+        self._rebuilding = False
+        self.reset_sync()
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    @property
+    def sync_seconds(self) -> float:
+        return settings.nearest_sync_seconds
+
+    def add(self, pizzeria_id: int, lat: float | None, lng: float | None) -> None:
+        """Insert or move a point; a point without a location is removed."""
+        if lat is None or lng is None:
+            self.remove(pizzeria_id)
+            return
+        vector = unit_vector(lat, lng)
+        if self._points.get(pizzeria_id) == vector:
+            return
+        self.remove(pizzeria_id)
+        self._points[pizzeria_id] = vector
+        self._pending[pizzeria_id] = vector
+
+    def add_row(self, row) -> None:
+        self.add(row.id, row.lat, row.lng)
+
+    def remove(self, pizzeria_id: int) -> None:
+        if self._points.pop(pizzeria_id, None) is None:
+            return
+        if self._pending.pop(pizzeria_id, None) is None:
+            self._stale += 1
+
+    def nearest(self, lat: float, lng: float, k: int) -> list[tuple[int, float]]:
+        """The ``k`` closest ``(id, meters)``, closest first."""
+        query = unit_vector(lat, lng)
+        heap: list = []
+        points, pending = self._points, self._pending
+        self._tree.nearest(
+            query, k, heap, lambda i, vector: i not in pending and points.get(i) == vector
+        )
+        for pizzeria_id, vector in self._pending.items():
+            _offer(heap, k, _squared_distance(query, vector), pizzeria_id)
+        return [
+            (pizzeria_id, chord_to_meters(math.sqrt(-negative)))
+            for negative, _, pizzeria_id in sorted(heap, reverse=True)
+        ]
+
+    async def sync(self, session) -> None:
+        await super().sync(session)
+        if self._rebuilding or len(self._pending) + self._stale < max(
+            REBUILD_MIN, len(self._points) // 8
+        ):
+            return
+        self._rebuilding = True
+        try:
+            snapshot = dict(self._points)
+            tree = await asyncio.to_thread(KDTree, list(snapshot.items()))
+        finally:
+            self._rebuilding = False
+        # Writes that landed while building are still pending or stale.
+        self._tree = tree
+        self._pending = {
+            i: vector for i, vector in self._pending.items() if snapshot.get(i) != vector
+        }
+        self._stale = sum(1 for i, vector in tree.items if self._points.get(i) != vector)
+
+
+nearest_index = NearestIndex()
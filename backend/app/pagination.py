@@ -0,0 +1,155 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from enum import Enum
+
+from sqlalchemy import select, tuple_, union_all
+
+from app.models import Pizzeria
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+class PizzeriaSort(str, Enum):
+    id = "id"
+    id_desc = "-id"
+    name = "name"
+    name_desc = "-name"
+    rating = "rating"
+    rating_desc = "-rating"
+    visited_at = "visited_at"
+    visited_at_desc = "-visited_at"
+    created_at = "created_at"
+    created_at_desc = "-created_at"
+
+    @property
+    def field(self) -> str:
+        return self.value.lstrip("-")
+
+    @property
+    def descending(self) -> bool:
+        return self.value.startswith("-")
+
+    @property
+    def column(self):
+        return getattr(Pizzeria, self.field)
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+# Sort fields whose column is nullable, so a cursor may carry a null value.
+NULLABLE_FIELDS = ("rating", "visited_at")
+
+
+def is_int(value) -> bool:
+    """An int, but not a bool (JSON true/false decode to Python bools)."""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _decode_value(sort: PizzeriaSort, value):
+    """Check a cursor's sort value against the column type and convert it back."""
+    if value is None:
+        if sort.field not in NULLABLE_FIELDS:
+            raise InvalidCursorError(value)
+        return None
+    if sort.field == "id":
+        valid = is_int(value)
+    elif sort.field == "rating":
+        valid = is_int(value) or isinstance(value, float)
+    else:
+        valid = isinstance(value, str)
+    if not valid:
+        raise InvalidCursorError(value)
+    if sort.field in ("visited_at", "created_at"):
+        return datetime.fromisoformat(value)
+    return value
+
+
+def encode_cursor(sort: PizzeriaSort, row) -> str:
+    """Build the opaque cursor pointing just past ``row`` in ``sort`` order."""
+    payload = [sort.value, _encode_value(getattr(row, sort.field)), row.id]
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(cursor: str, sort: PizzeriaSort) -> tuple:
+    """Return the ``(value, id)`` keyset encoded in ``cursor``."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        sort_value, value, last_id = json.loads(raw)
+        if sort_value != sort.value or not is_int(last_id):
+            raise InvalidCursorError(cursor)
+        return _decode_value(sort, value), last_id
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError) as exc:
+        raise InvalidCursorError(cursor) from exc
+
+
+def paginate(statement, sort: PizzeriaSort, after: tuple | None, limit: int):
+    """Apply keyset ordering and the page window to a pizzeria select.
+
+    One extra row is fetched so callers can tell whether another page exists.
+    Every branch is a range seek on the ``(sort key, id)`` index. Rows with a
+    NULL sort value come last in either direction: a nullable key pages
+    through its non-null range and its NULL tail (ordered by id) as two
+    seeks, and only the at most ``2 * (limit + 1)`` rows they return are
+    sorted into one page.
+    """
+    column = sort.column
+    pk = Pizzeria.id
+    descending = sort.descending
+
+    def after_id(last_id):
+        return pk < last_id if descending else pk > last_id
+
+    def by_id():
+        return pk.desc() if descending else pk.asc()
+
+    if sort.field == "id":
+        if after is not None:
+            statement = statement.where(after_id(after[1]))
+        return statement.order_by(by_id()).limit(limit + 1)
+
+    keyset = tuple_(column, pk)
+    order_by = [column.desc(), pk.desc()] if descending else [column.asc(), pk.asc()]
+
+    def seek(value, last_id):
+        return keyset < (value, last_id) if descending else keyset > (value, last_id)
+
+    if sort.field not in NULLABLE_FIELDS:
+        if after is not None:
+            statement = statement.where(seek(*after))
+        return statement.order_by(*order_by).limit(limit + 1)
+
+    tail = statement.where(column.is_(None))
+    if after is not None and after[0] is None:
+        return tail.where(after_id(after[1])).order_by(by_id()).limit(limit + 1)
+
+    values = statement.where(column.is_not(None))
+    if after is not None:
+        values = values.where(seek(*after))
+    # Each part keeps its own ORDER BY and LIMIT (so its own index seek)
+    # inside a subquery; the outer sort only merges their few rows.
+    parts = union_all(
+        select(values.order_by(*order_by).limit(limit + 1).subquery()),
+        select(tail.order_by(by_id()).limit(limit + 1).subquery()),
+    ).subquery()
+    merged = parts.c[sort.field]
+    return (
+        select(parts)
+        .order_by(
+            merged.is_(None),
+            merged.desc() if descending else merged.asc(),
+            parts.c.id.desc() if descending else parts.c.id.asc(),
+        )
+        .limit(limit + 1)
+    )
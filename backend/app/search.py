@@ -0,0 +1,111 @@
+"""Full-text search over pizzeria name, address and review.
+
+Postgres keeps a generated, GIN-indexed ``tsvector`` column on the pizzeria
+table; SQLite keeps an external-content FTS5 table that triggers sync on every
+insert, update and delete. The same DDL is used by migration 009 and, through
+the table events below, by ``SQLModel.metadata.create_all`` -- so this module
+must be imported before tables are created (``app.main`` does).
+"""
+
+import re
+
+from sqlalchemy import DDL, column, event, func, literal_column, select, table
+
+from app.models import Pizzeria
+from app.serializers import PIZZERIA_READ_COLUMNS
+
+SQLITE_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS pizzeria_fts USING fts5(
+        name, address, review,
+        content='pizzeria', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS pizzeria_fts_ai AFTER INSERT ON pizzeria BEGIN
+        INSERT INTO pizzeria_fts(rowid, name, address, review)
+        VALUES (new.id, new.name, new.address, new.review);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS pizzeria_fts_ad AFTER DELETE ON pizzeria BEGIN
+        INSERT INTO pizzeria_fts(pizzeria_fts, rowid, name, address, review)
+        VALUES ('delete', old.id, old.name, old.address, old.review);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS pizzeria_fts_au AFTER UPDATE OF name, address, review
+    ON pizzeria BEGIN
+        INSERT INTO pizzeria_fts(pizzeria_fts, rowid, name, address, review)
+        VALUES ('delete', old.id, old.name, old.address, old.review);
+        INSERT INTO pizzeria_fts(rowid, name, address, review)
+        VALUES (new.id, new.name, new.address, new.review);
+    END
+    """,
+]
+SQLITE_REBUILD = "INSERT INTO pizzeria_fts(pizzeria_fts) VALUES ('rebuild')"
+SQLITE_DROP = "DROP TABLE IF EXISTS pizzeria_fts"
+
+POSTGRES_DDL = [
+    """
+    ALTER TABLE pizzeria ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(address, '')), 'B') ||
+        setweight(to_tsvector('simple', coalesce(review, '')), 'C')
+    ) STORED
+    """,
+    "CREATE INDEX ix_pizzeria_search_vector ON pizzeria USING GIN (search_vector)",
+]
+POSTGRES_DROP = [
+    "DROP INDEX IF EXISTS ix_pizzeria_search_vector",
+    "ALTER TABLE pizzeria DROP COLUMN IF EXISTS search_vector",
+]
+
+for statement in SQLITE_DDL:
+    event.listen(Pizzeria.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+for statement in POSTGRES_DDL:
+    event.listen(
+        Pizzeria.__table__, "after_create", DDL(statement).execute_if(dialect="postgresql")
+    )
+# The FTS5 table is not part of the metadata, so drop it alongside pizzeria.
+event.listen(Pizzeria.__table__, "before_drop", DDL(SQLITE_DROP).execute_if(dialect="sqlite"))
+
+# Column weights for bm25(): name, address, review.
+SQLITE_WEIGHTS = (10.0, 5.0, 1.0)
+
+pizzeria_fts = table("pizzeria_fts", column("rowid"))
+
+
+class SearchNotSupportedError(Exception):
+    pass
+
+
+def search_terms(query: str) -> list[str]:
+    """Split free text into word tokens, dropping query-syntax characters."""
+    return re.findall(r"\w+", query.lower())
+
+
+def search_statement(dialect: str, terms: list[str]):
+    """Select PizzeriaRead rows matching every term (as a prefix), best first."""
+    if dialect == "sqlite":
+        match = " ".join(f'"{term}"*' for term in terms)
+        fts = literal_column("pizzeria_fts")
+        rank = func.bm25(fts, *SQLITE_WEIGHTS)
+        return (
+            select(*PIZZERIA_READ_COLUMNS)
+            .join(pizzeria_fts, pizzeria_fts.c.rowid == Pizzeria.id)
+            .where(fts.op("MATCH")(match))
+            .order_by(rank, Pizzeria.id)
+        )
+
+    if dialect == "postgresql":
+        tsquery = func.to_tsquery("simple", " & ".join(f"{term}:*" for term in terms))
+        search_vector = literal_column("pizzeria.search_vector")
+        return (
+            select(*PIZZERIA_READ_COLUMNS)
+            .where(search_vector.op("@@")(tsquery))
+            .order_by(func.ts_rank(search_vector, tsquery).desc(), Pizzeria.id)
+        )
+
+    raise SearchNotSupportedError(dialect)
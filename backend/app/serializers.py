@@ -0,0 +1,68 @@
+import orjson
+from sqlmodel import select
+
+from app.models import Pizzeria
+
+# Columns projected for read paths, in PizzeriaRead field order (lat/lng are
+# folded into ``location``).
+PIZZERIA_READ_COLUMNS = (
+    Pizzeria.id,
+    Pizzeria.name,
+    Pizzeria.address,
+    Pizzeria.lat,
+    Pizzeria.lng,
+    Pizzeria.rating,
+    Pizzeria.google_maps_url,
+    Pizzeria.review,
+    Pizzeria.visited_at,
+    Pizzeria.created_at,
+    Pizzeria.updated_at,
+)
+
+
+def select_pizzeria_rows():
+    """Select the PizzeriaRead columns as plain rows instead of ORM objects."""
+    return select(*PIZZERIA_READ_COLUMNS)
+
+
+def pizzeria_row_to_dict(row) -> dict:
+    """Build the PizzeriaRead JSON shape straight from a projected row.
+
+    This skips ORM identity-map bookkeeping and ``PizzeriaRead`` validation;
+    the encoded bytes are identical to ``PizzeriaRead(...).model_dump_json()``.
+    """
+    (
+        id_,
+        name,
+        address,
+        lat,
+        lng,
+        rating,
+        google_maps_url,
+        review,
+        visited_at,
+        created_at,
+        updated_at,
+    ) = row
+    return {
+        "id": id_,
+        "name": name,
+        "address": address,
+        "location": {"lat": lat, "lng": lng} if lat is not None and lng is not None else None,
+        "rating": rating,
+        "google_maps_url": google_maps_url,
+        "review": review,
+        "visited_at": visited_at,
+        "created_at": created_at,
+        "updated_at": updated_at,
+    }
+
+
+def dump_pizzerias(rows) -> bytes:
+    """Encode projected rows as a JSON array."""
+    return orjson.dumps([pizzeria_row_to_dict(row) for row in rows])
+
+
+def dump_pizzeria_lines(rows) -> bytes:
+    """Encode projected rows as newline-delimited JSON."""
+    return b"".join(orjson.dumps(pizzeria_row_to_dict(row)) + b"\n" for row in rows)
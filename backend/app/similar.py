@@ -0,0 +1,274 @@
+"""Similar-pizzeria recommendations from name and review text.
+
+Every pizzeria is a row of hashed term features (words and word pairs,
+sublinear term frequency) in a dense float32 matrix. IDF weights are applied
+at query time from document frequencies kept per feature, so adding or
+changing a review only rewrites its own row; weights and row norms are
+refreshed in one vectorized pass once the document count has moved by
+``IDF_REFRESH`` since they were computed. A query is one matrix-vector
+product over all rows plus a top-k partition.
+
+With ``settings.similar_index_dir`` set, the index is saved there as ``.npy``
+files every ``settings.similar_snapshot_rows`` changes, together with the
+changes-feed position it reflects; the files are written in a thread while
+requests carry on. A new worker memory-maps the newest snapshot and replays
+only the changes made after it, instead of reading and hashing every review.
+Snapshots carry spare zero rows, so those first changes fill pages of the
+mapping rather than copying the whole matrix into a larger one. Like
+``app.clusters``, the index lives in each worker process, is loaded on first
+use and follows writes through the changes feed. ``app.main`` imports this
+module on first use, keeping numpy out of start-up.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import re
+import shutil
+import time
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+from app.changes import ChangesFollower, decode_changes_cursor, encode_changes_cursor
+from app.config import settings
+from app.models import Pizzeria
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r"\w+")
+IDF_REFRESH = 0.1
+# Snapshots other than the current one are kept this long, in case another
+# worker is still about to switch to one.
+SNAPSHOT_KEEP_SECONDS = 3600
+# Spare rows written after the used ones: this fraction, at least the minimum.
+SNAPSHOT_SPARE_FRACTION = 0.25
+SNAPSHOT_MIN_SPARE_ROWS = 64
+
+
+def features(name: str, review: str | None, dimensions: int) -> np.ndarray:
+    """Hashed sublinear term frequencies of the words and word pairs."""
+    tokens = TOKEN_RE.findall(f"{name} {review or ''}".casefold())
+    terms = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    # crc32 rather than hash(): it is the same in every process.
+    buckets = np.fromiter(
+        (zlib.crc32(term.encode()) % dimensions for term in terms), dtype=np.int64
+    )
+    counts = np.bincount(buckets, minlength=dimensions).astype(np.float32)
+    present = counts > 0
+    counts[present] = 1 + np.log(counts[present])
+    return counts
+
+
+class SimilarIndex(ChangesFollower):
+    sync_columns = (Pizzeria.id, Pizzeria.name, Pizzeria.review, Pizzeria.updated_at)
+
+    def __init__(self):
+        self._save_task: asyncio.Task | None = None
+        self.reset()
+
+    def reset(self) -> None:
+        self.dimensions = settings.similar_dimensions
+        self._vectors = np.zeros((0, self.dimensions), dtype=np.float32)
+        self._ids = np.zeros(0, dtype=np.int64)  # -1 marks a free row
+        self._norms = np.zeros(0, dtype=np.float32)
+        self._count = 0  # rows in use or free; the arrays may be longer
+        self._positions: dict[int, int] = {}
+        self._free: list[int] = []
+        self._df = np.zeros(self.dimensions, dtype=np.int64)
+        self._idf = np.ones(self.dimensions, dtype=np.float32)
+        self._idf_documents = 0
+        self._changed = 0
+        self._saving = False
+        self.reset_sync()
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __contains__(self, pizzeria_id: int) -> bool:
+        return pizzeria_id in self._positions
+
+    @property
+    def sync_seconds(self) -> float:
+        return settings.similar_sync_seconds
+
+    def add_row(self, row) -> None:
+        """Insert or update a row with ``id``, ``name`` and ``review``.
+
+        Rows without text columns (location-only updates) are ignored.
+        """
+        if not hasattr(row, "review"):
+            return
+        vector = features(row.name, row.review, self.dimensions)
+        position = self._positions.get(row.id)
+        if position is None:
+            position = self._allocate(row.id)
+        else:
+            self._df -= self._vectors[position] > 0
+        self._vectors[position] = vector
+        self._df += vector > 0
+        self._norms[position] = np.sqrt(np.dot(vector * vector, self._idf * self._idf))
+        self._changed += 1
+
+    def remove(self, pizzeria_id: int) -> None:
+        position = self._positions.pop(pizzeria_id, None)
+        if position is None:
+            return
+        self._df -= self._vectors[position] > 0
+        self._vectors[position] = 0
+        self._norms[position] = 0
+        self._ids[position] = -1
+        self._free.append(position)
+        self._changed += 1
+
+    def _allocate(self, pizzeria_id: int) -> int:
+        if self._free:
+            position = self._free.pop()
+        else:
+            if self._count == len(self._ids):
+                self._grow(max(64, 2 * self._count))
+            position = self._count
+            self._count += 1
+        self._ids[position] = pizzeria_id
+        self._positions[pizzeria_id] = position
+        return position
+
+    def _grow(self, capacity: int) -> None:
+        # Also moves a memory-mapped snapshot into process memory.
+        vectors = np.zeros((capacity, self.dimensions), dtype=np.float32)
+        vectors[: self._count] = self._vectors[: self._count]
+        ids = np.full(capacity, -1, dtype=np.int64)
+        ids[: self._count] = self._ids[: self._count]
+        norms = np.zeros(capacity, dtype=np.float32)
+        norms[: self._count] = self._norms[: self._count]
+        self._vectors, self._ids, self._norms = vectors, ids, norms
+
+    def _refresh_weights(self) -> None:
+        documents = len(self._positions)
+        if abs(documents - self._idf_documents) <= IDF_REFRESH * self._idf_documents:
+            return
+        # Smoothed IDF, as in scikit-learn.
+        self._idf = (np.log((1 + documents) / (1 + self._df)) + 1).astype(np.float32)
+        self._norms[: self._count] = np.sqrt(
+            np.square(self._vectors[: self._count]) @ np.square(self._idf)
+        )
+        self._idf_documents = documents
+
+    def similar(self, pizzeria_id: int, k: int) -> list[tuple[int, float]]:
+        """Up to ``k`` ``(id, cosine similarity)`` sharing terms, most similar first."""
+        self._refresh_weights()
+        position = self._positions[pizzeria_id]
+        query_norm = self._norms[position]
+        if not query_norm:
+            return []
+        count = self._count
+        scores = self._vectors[:count] @ (self._vectors[position] * np.square(self._idf))
+        norms = self._norms[:count]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            scores = np.where(norms > 0, scores / (norms * query_norm), 0.0)
+        scores[position] = 0.0
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        return sorted(
+            ((int(self._ids[i]), float(scores[i])) for i in candidates),
+            key=lambda item: (-item[1], item[0]),
+        )
+
+    async def sync(self, session) -> None:
+        if not self.loaded and self._rows_after is None and settings.similar_index_dir:
+            self._load_snapshot(Path(settings.similar_index_dir))
+        await super().sync(session)
+        if (
+            settings.similar_index_dir
+            and not self._saving
+            and self._changed >= settings.similar_snapshot_rows
+        ):
+            self._start_snapshot(Path(settings.similar_index_dir))
+
+    def _load_snapshot(self, directory: Path) -> None:
+        try:
+            snapshot = directory / (directory / "CURRENT").read_text().strip()
+            meta = json.loads((snapshot / "meta.json").read_text())
+            if meta["dimensions"] != self.dimensions:
+                return
+            # Copy-on-write: pages are read lazily and changes stay private.
+            vectors = np.load(snapshot / "vectors.npy", mmap_mode="c")
+            ids = np.load(snapshot / "ids.npy")
+            norms = np.load(snapshot / "norms.npy")
+            df = np.load(snapshot / "df.npy")
+            idf = np.load(snapshot / "idf.npy")
+            rows_after, tombstones_after = decode_changes_cursor(meta["cursor"])
+        except (OSError, ValueError, KeyError) as exc:
+            logger.warning("Not using similar-pizzeria snapshot: %s", exc)
+            return
+        # The arrays run on past the used rows (spare rows; older snapshots have none).
+        count = meta.get("count", len(ids))
+        self._vectors, self._ids, self._norms = vectors, ids, norms
+        self._df, self._idf = df, idf
+        self._count = count
+        used = ids[:count]
+        self._positions = {int(i): position for position, i in enumerate(used) if i >= 0}
+        self._free = [position for position, i in enumerate(used) if i < 0]
+        self._idf_documents = meta["idf_documents"]
+        self._rows_after, self._tombstones_after = rows_after, tombstones_after
+        self._changed = 0
+
+    def _start_snapshot(self, directory: Path) -> None:
+        # Copied in one go so the arrays agree with each other and the cursor;
+        # changes after the cursor are replayed by whoever loads it.
+        count = self._count
+        arrays = {
+            "vectors": self._vectors[:count].copy(),
+            "ids": self._ids[:count].copy(),
+            "norms": self._norms[:count].copy(),
+            "df": self._df.copy(),
+            "idf": self._idf.copy(),
+        }
+        meta = {
+            "dimensions": self.dimensions,
+            "idf_documents": self._idf_documents,
+            "count": count,
+            "cursor": encode_changes_cursor(self._rows_after, self._tombstones_after),
+        }
+        self._changed = 0
+        self._saving = True
+        # Not awaited: the request that triggered the sync does not wait for the disk.
+        self._save_task = asyncio.create_task(self._save_snapshot(directory, arrays, meta))
+
+    async def _save_snapshot(self, directory: Path, arrays: dict, meta: dict) -> None:
+        try:
+            await asyncio.to_thread(_write_snapshot, directory, arrays, meta)
+        except OSError:
+            logger.exception("Saving the similar-pizzeria snapshot failed")
+        finally:
+            self._saving = False
+
+
+def _write_snapshot(directory: Path, arrays: dict, meta: dict) -> None:
+    spare = max(SNAPSHOT_MIN_SPARE_ROWS, int(meta["count"] * SNAPSHOT_SPARE_FRACTION))
+    arrays = {
+        **arrays,
+        "vectors": np.pad(arrays["vectors"], ((0, spare), (0, 0))),
+        "ids": np.pad(arrays["ids"], (0, spare), constant_values=-1),
+        "norms": np.pad(arrays["norms"], (0, spare)),
+    }
+    name = f"snapshot-{time.time_ns()}-{os.getpid()}"
+    snapshot = directory / name
+    snapshot.mkdir(parents=True)
+    for key, array in arrays.items():
+        np.save(snapshot / f"{key}.npy", array)
+    (snapshot / "meta.json").write_text(json.dumps(meta))
+    pointer = directory / f"CURRENT.{os.getpid()}"
+    pointer.write_text(name)
+    os.replace(pointer, directory / "CURRENT")
+
+    cutoff = time.time() - SNAPSHOT_KEEP_SECONDS
+    for old in directory.glob("snapshot-*"):
+        if old.name != name and old.stat().st_mtime < cutoff:
+            shutil.rmtree(old, ignore_errors=True)
+
+
+similar_index = SimilarIndex()
@@ -0,0 +1,47 @@
+"""Worker start-up: the schema check run by ``lifespan`` and its timings."""
+
+import logging
+import time
+from dataclasses import asdict, dataclass
+
+from app import IMPORT_STARTED
+from app.database import create_db_and_tables, verify_schema_revision
+
+# uvicorn configures this logger, so the line shows up in worker output.
+logger = logging.getLogger("uvicorn.error")
+
+
+@dataclass
+class StartupTimings:
+    mode: str | None = None
+    import_seconds: float | None = None
+    startup_seconds: float | None = None
+    schema_revision: str | None = None
+
+
+startup_timings = StartupTimings()
+
+
+def mark_imported() -> None:
+    """Record how long importing the application took."""
+    startup_timings.import_seconds = time.perf_counter() - IMPORT_STARTED
+
+
+async def run_startup(mode: str) -> None:
+    started = time.perf_counter()
+    if mode == "verify":
+        startup_timings.schema_revision = await verify_schema_revision()
+    else:
+        await create_db_and_tables()
+    startup_timings.mode = mode
+    startup_timings.startup_seconds = time.perf_counter() - started
+    logger.info(
+        "App imported in %.3fs, start-up (%s) took %.3fs",
+        startup_timings.import_seconds or 0.0,
+        mode,
+        startup_timings.startup_seconds,
+    )
+
+
+def startup_report() -> dict:
+    return asdict(startup_timings)
@@ -0,0 +1,111 @@
+import math
+from collections import defaultdict
+from collections.abc import Iterable
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+
+from app.models import Pizzeria, PizzeriaStat
+
+REBUILD_BATCH_SIZE = 5000
+
+stat_table = PizzeriaStat.__table__
+
+
+def _rating_bucket(rating: float) -> str:
+    # Half-star bins: 4.0 covers [4.0, 4.5).
+    return f"{math.floor(rating * 2) / 2:.1f}"
+
+
+def stat_deltas(rows: Iterable, sign: int = 1) -> dict[tuple[str, str], list]:
+    """Per-bucket ``[count, rating_sum]`` changes for inserting (or, with
+    ``sign=-1``, removing) pizzerias. ``rows`` need ``rating`` and ``visited_at``.
+    """
+    deltas: dict[tuple[str, str], list] = defaultdict(lambda: [0, 0.0])
+
+    def add(key, rating_sum=0.0):
+        deltas[key][0] += sign
+        deltas[key][1] += sign * rating_sum
+
+    for row in rows:
+        add(("total", ""))
+        if row.rating is not None:
+            add(("rated", ""), row.rating)
+            add(("rating_bucket", _rating_bucket(row.rating)))
+        if row.visited_at is not None:
+            add(("visited", ""))
+            add(("visited_month", row.visited_at.strftime("%Y-%m")))
+    return deltas
+
+
+def stat_upsert(dialect_name: str, deltas: dict[tuple[str, str], list]):
+    """``(statement, params)`` adding ``deltas`` to the summary table in place."""
+    insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+    statement = insert(stat_table)
+    statement = statement.on_conflict_do_update(
+        index_elements=[stat_table.c.kind, stat_table.c.bucket],
+        set_={
+            "count": stat_table.c.count + statement.excluded.count,
+            "rating_sum": stat_table.c.rating_sum + statement.excluded.rating_sum,
+        },
+    )
+    params = [
+        {"kind": kind, "bucket": bucket, "count": count, "rating_sum": rating_sum}
+        for (kind, bucket), (count, rating_sum) in deltas.items()
+    ]
+    return statement, params
+
+
+async def record_pizzerias(session, rows: Iterable, sign: int = 1) -> None:
+    """Fold written pizzerias into the summary table, inside the caller's transaction."""
+    deltas = stat_deltas(rows, sign)
+    if deltas:
+        statement, params = stat_upsert(session.bind.dialect.name, deltas)
+        await session.execute(statement, params)
+
+
+def rebuild_stats(connection: Connection) -> None:
+    """Recompute the summary table from scratch to repair any drift."""
+    connection.execute(delete(stat_table))
+    result = connection.execute(
+        select(Pizzeria.rating, Pizzeria.visited_at).execution_options(
+            yield_per=REBUILD_BATCH_SIZE
+        )
+    )
+    totals: dict[tuple[str, str], list] = defaultdict(lambda: [0, 0.0])
+    for rows in result.partitions():
+        for key, (count, rating_sum) in stat_deltas(rows).items():
+            totals[key][0] += count
+            totals[key][1] += rating_sum
+    if totals:
+        statement, params = stat_upsert(connection.dialect.name, totals)
+        connection.execute(statement, params)
+
+
+def summarize(stats: Iterable[PizzeriaStat]) -> dict:
+    by_kind: dict[str, dict[str, PizzeriaStat]] = defaultdict(dict)
+    for stat in stats:
+        by_kind[stat.kind][stat.bucket] = stat
+
+    def count(kind: str) -> int:
+        stat = by_kind[kind].get("")
+        return stat.count if stat else 0
+
+    rated = by_kind["rated"].get("")
+    return {
+        "total": count("total"),
+        "rated": count("rated"),
+        "average_rating": rated.rating_sum / rated.count if rated and rated.count else None,
+        "visited": count("visited"),
+        "visits_per_month": {
+            bucket: stat.count
+            for bucket, stat in sorted(by_kind["visited_month"].items())
+            if stat.count
+        },
+        "rating_histogram": {
+            bucket: stat.count
+            for bucket, stat in sorted(by_kind["rating_bucket"].items(), key=lambda i: float(i[0]))
+            if stat.count
+        },
+    }
@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+"""Benchmark the API hot paths in-process and compare against a baseline.
+
+The app is driven through ``httpx.ASGITransport`` (as in ``tests/conftest.py``)
+against its real engine, so pool and cache settings apply. By default a fresh
+SQLite file is used; pass ``--database-url`` to run against a local Postgres.
+The target database is reset, so only point it at a throwaway database.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_api --size 100k --output results.json
+    python -m benchmarks.bench_api --size 100k --baseline results.json --threshold 0.15
+
+With ``--baseline`` the exit status is 1 if any scenario's p95 latency rose or
+its throughput fell by more than the threshold.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from collections.abc import Awaitable, Callable
+from datetime import datetime, timedelta
+from pathlib import Path
+
+SIZES = {"1k": 1_000, "100k": 100_000, "1M": 1_000_000}
+
+
+def parse_size(value: str) -> int:
+    try:
+        return SIZES.get(value) or int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected one of {', '.join(SIZES)} or a number")
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=parse_size, default="1k", help="1k, 100k, 1M or a count")
+    parser.add_argument(
+        "--database-url",
+        help="Async SQLAlchemy URL of a throwaway database (default: a temporary SQLite file)",
+    )
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=20, help="unmeasured requests per scenario")
+    parser.add_argument("--scenario", action="append", help="run only these scenarios")
+    parser.add_argument("--output", type=Path, help="write results as JSON here")
+    parser.add_argument("--baseline", type=Path, help="compare against this results file")
+    parser.add_argument(
+        "--threshold", type=float, default=0.2, help="allowed relative regression (0.2 = 20%%)"
+    )
+    return parser.parse_args(argv)
+
+
+# The app reads its settings at import time, so configure the environment first.
+args = parse_args() if __name__ == "__main__" else None
+_tmpdir = None
+if args is not None:
+    if args.database_url is None:
+        _tmpdir = tempfile.TemporaryDirectory(prefix="bench-api-")
+        args.database_url = f"sqlite+aiosqlite:///{_tmpdir.name}/bench.db"
+    os.environ["DATABASE_URL"] = args.database_url
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key")
+# One client logs in repeatedly; measure bcrypt, not the auth rate limiter.
+os.environ.setdefault("AUTH_RATE_LIMIT_IP_BURST", "1000000000")
+os.environ.setdefault("AUTH_RATE_LIMIT_EMAIL_BURST", "1000000000")
+
+from httpx import ASGITransport, AsyncClient  # noqa: E402
+from sqlmodel import SQLModel  # noqa: E402
+
+from app.auth.hashing import password_hasher  # noqa: E402
+from app.cache import pizzeria_list_cache  # noqa: E402
+from app.config import settings  # noqa: E402
+from app.database import async_engine, create_db_and_tables  # noqa: E402
+from app.main import app  # noqa: E402
+from app.stats import rebuild_stats  # noqa: E402
+from seed import batched, insert_batch, to_rows  # noqa: E402
+
+EMAIL = "bench@example.com"
+PASSWORD = "benchmark-password"
+SEED_BATCH_SIZE = 5000
+
+
+def make_items(count: int):
+    start = datetime(2025, 1, 1)
+    for i in range(count):
+        yield {
+            "name": f"Pizzeria {i}",
+            "address": f"Teststraße {i}, 10115 Berlin",
+            "location": {"lat": 52.4 + (i % 1000) / 5000, "lng": 13.3 + (i % 997) / 5000}
+            if i % 4
+            else None,
+            "rating": (i % 50) / 10,
+            "google_maps_url": f"https://maps.google.com/?q=pizzeria+{i}",
+            "review": "Leopard-spotted crust, bright tomato, would come back.",
+            "visited_at": (start - timedelta(days=i % 365)).isoformat() if i % 3 else None,
+        }
+
+
+async def prepare_database(rows: int) -> None:
+    async with async_engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
+    await create_db_and_tables()
+
+    started = time.perf_counter()
+    async with async_engine.begin() as conn:
+        for batch in batched(to_rows(make_items(rows), datetime.utcnow()), SEED_BATCH_SIZE):
+            await insert_batch(conn, batch)
+        await conn.run_sync(rebuild_stats)
+    print(f"Seeded {rows} pizzerias in {time.perf_counter() - started:.1f}s")
+
+
+async def measure(
+    request: Callable[[int], Awaitable], requests: int, concurrency: int, warmup: int
+) -> dict:
+    """Issue ``requests`` calls from ``concurrency`` workers and summarize them."""
+    for i in range(warmup):
+        await request(i)
+
+    latencies: list[float] = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            started = time.perf_counter()
+            response = await request(i)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "requests": requests,
+        "errors": errors,
+        "throughput_rps": round(requests / elapsed, 2),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3),
+        "p50_ms": round(cuts[49] * 1000, 3),
+        "p95_ms": round(cuts[94] * 1000, 3),
+        "p99_ms": round(cuts[98] * 1000, 3),
+    }
+
+
+async def run(options: argparse.Namespace) -> dict:
+    await prepare_database(options.size)
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+        await client.post("/auth/register", json={"email": EMAIL, "password": PASSWORD})
+        tokens = (
+            await client.post("/auth/login", json={"email": EMAIL, "password": PASSWORD})
+        ).json()
+        auth = {"Authorization": f"Bearer {tokens['access_token']}"}
+
+        async def list_uncached(i):
+            pizzeria_list_cache.clear()
+            return await client.get("/pizzerias", params={"min_rating": (i % 40) / 10})
+
+        async def list_cached(i):
+            return await client.get("/pizzerias")
+
+        async def create(i):
+            return await client.post(
+                "/pizzerias",
+                json={"name": f"Bench {i}", "address": f"Benchstraße {i}", "rating": 4.0},
+                headers=auth,
+            )
+
+        async def login(i):
+            return await client.post("/auth/login", json={"email": EMAIL, "password": PASSWORD})
+
+        async def refresh(i):
+            return await client.post(
+                "/auth/refresh", json={"refresh_token": tokens["refresh_token"]}
+            )
+
+        async def me(i):
+            return await client.get("/auth/me", headers=auth)
+
+        scenarios = {
+            "GET /pizzerias (uncached)": list_uncached,
+            "GET /pizzerias (cached)": list_cached,
+            "POST /pizzerias": create,
+            "POST /auth/login": login,
+            "POST /auth/refresh": refresh,
+            "GET /auth/me": me,
+        }
+
+        results = {}
+        for name, request in scenarios.items():
+            if options.scenario and name not in options.scenario:
+                continue
+            results[name] = await measure(
+                request, options.requests, options.concurrency, options.warmup
+            )
+            print_result(name, results[name])
+
+    return {
+        "meta": {
+            "dialect": async_engine.dialect.name,
+            "rows": options.size,
+            "requests": options.requests,
+            "concurrency": options.concurrency,
+            "bcrypt_rounds": settings.bcrypt_rounds,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "timestamp": datetime.utcnow().isoformat(timespec="seconds"),
+        },
+        "results": results,
+    }
+
+
+def print_result(name: str, result: dict) -> None:
+    print(
+        f"{name:>28}: {result['throughput_rps']:9.1f} req/s  "
+        f"p50 {result['p50_ms']:8.2f} ms  p95 {result['p95_ms']:8.2f} ms  "
+        f"p99 {result['p99_ms']:8.2f} ms  errors {result['errors']}"
+    )
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list[str]:
+    """Describe every scenario that regressed by more than ``threshold``."""
+    regressions = []
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+        if result["p95_ms"] > base["p95_ms"] * (1 + threshold):
+            regressions.append(f"{name}: p95 {base['p95_ms']} ms -> {result['p95_ms']} ms")
+        if result["throughput_rps"] < base["throughput_rps"] * (1 - threshold):
+            regressions.append(
+                f"{name}: throughput {base['throughput_rps']} -> {result['throughput_rps']} req/s"
+            )
+    for key in ("dialect", "rows", "concurrency", "bcrypt_rounds"):
+        if current["meta"].get(key) != baseline["meta"].get(key):
+            print(f"warning: baseline {key} differs ({baseline['meta'].get(key)})")
+    return regressions
+
+
+async def main(options: argparse.Namespace) -> int:
+    try:
+        report = await run(options)
+    finally:
+        password_hasher.shutdown()
+        await async_engine.dispose()
+
+    if options.output:
+        options.output.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"Wrote {options.output}")
+
+    if options.baseline:
+        regressions = compare(report, json.loads(options.baseline.read_text()), options.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+        print(f"No regressions beyond {options.threshold:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(asyncio.run(main(args)))
+    finally:
+        if _tmpdir is not None:
+            _tmpdir.cleanup()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+"""Measure worker cold start: import, start-up check and time to first request.
+
+Each sample is a fresh interpreter that imports ``app.main``, runs the
+lifespan start-up and serves one ``GET /pizzerias`` through
+``httpx.ASGITransport``. Both ``DB_STARTUP_MODE`` values are measured against
+the same SQLite file, which is created and stamped with the Alembic head.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_cold_start --repeat 10 --output cold_start.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+MODES = ("create_all", "verify")
+PHASES = ("import_seconds", "startup_seconds", "first_request_seconds", "total_seconds")
+
+
+async def child() -> None:
+    """Run inside the measured interpreter and print its timings as JSON."""
+    started = time.perf_counter()
+
+    from httpx import ASGITransport, AsyncClient
+
+    from app.main import app
+
+    imported = time.perf_counter()
+    async with app.router.lifespan_context(app):
+        ready = time.perf_counter()
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as c:
+            response = await c.get("/pizzerias")
+            response.raise_for_status()
+        served = time.perf_counter()
+
+    print(
+        json.dumps(
+            {
+                "import_seconds": imported - started,
+                "startup_seconds": ready - imported,
+                "first_request_seconds": served - ready,
+            }
+        )
+    )
+
+
+async def prepare_database(database_url: str) -> None:
+    os.environ["DATABASE_URL"] = database_url
+    from sqlalchemy import text
+
+    from app.database import async_engine, create_db_and_tables, expected_schema_revision
+
+    await create_db_and_tables()
+    async with async_engine.begin() as conn:
+        await conn.execute(
+            text("CREATE TABLE alembic_version (version_num VARCHAR(32) PRIMARY KEY)")
+        )
+        await conn.execute(
+            text("INSERT INTO alembic_version VALUES (:head)"),
+            {"head": expected_schema_revision()},
+        )
+    await async_engine.dispose()
+
+
+def sample(database_url: str, mode: str) -> dict:
+    env = {
+        **os.environ,
+        "DATABASE_URL": database_url,
+        "DB_STARTUP_MODE": mode,
+        "SECRET_KEY": os.environ.get("SECRET_KEY", "benchmark-secret-key"),
+    }
+    started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_cold_start", "--child"],
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    # Includes interpreter start-up, which the child cannot see.
+    result["total_seconds"] = time.perf_counter() - started
+    return result
+
+
+def main(repeat: int, output: Path | None) -> None:
+    with tempfile.TemporaryDirectory(prefix="bench-cold-start-") as tmpdir:
+        database_url = f"sqlite+aiosqlite:///{tmpdir}/bench.db"
+        os.environ.setdefault("SECRET_KEY", "benchmark-secret-key")
+        asyncio.run(prepare_database(database_url))
+
+        report = {}
+        for mode in MODES:
+            samples = [sample(database_url, mode) for _ in range(repeat)]
+            report[mode] = {
+                phase: round(statistics.median(s[phase] for s in samples) * 1000, 2)
+                for phase in PHASES
+            }
+            print(
+                f"{mode:>10}: "
+                + "  ".join(f"{phase[:-8]} {report[mode][phase]:7.1f} ms" for phase in PHASES)
+            )
+
+    if output:
+        output.write_text(json.dumps({"repeat": repeat, "median_ms": report}, indent=2) + "\n")
+        print(f"Wrote {output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", type=Path)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        asyncio.run(child())
+    else:
+        main(args.repeat, args.output)
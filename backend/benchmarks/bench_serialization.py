@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+"""Compare the ORM + response_model list path with the projected-row fast path.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_serialization --rows 10000
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key")
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine  # noqa: E402
+from sqlmodel import SQLModel, select  # noqa: E402
+
+from app.models import Pizzeria, PizzeriaRead  # noqa: E402
+from app.serializers import dump_pizzerias, select_pizzeria_rows  # noqa: E402
+
+list_adapter = TypeAdapter(list[PizzeriaRead])
+
+
+def make_rows(count: int) -> list[dict]:
+    now = datetime(2025, 1, 1)
+    return [
+        {
+            "name": f"Pizzeria {i}",
+            "address": f"Teststraße {i}, 10115 Berlin",
+            "lat": 52.4 + (i % 1000) / 5000 if i % 4 else None,
+            "lng": 13.3 + (i % 997) / 5000 if i % 4 else None,
+            "rating": (i % 50) / 10,
+            "google_maps_url": f"https://maps.google.com/?q=pizzeria+{i}",
+            "review": "Leopard-spotted crust, bright tomato, would come back. " * 3,
+            "visited_at": now - timedelta(days=i % 365) if i % 3 else None,
+            "created_at": now,
+            "updated_at": now,
+        }
+        for i in range(count)
+    ]
+
+
+async def orm_path(session) -> bytes:
+    pizzerias = (await session.execute(select(Pizzeria))).all()
+    models = list_adapter.validate_python([row[0] for row in pizzerias], from_attributes=True)
+    return JSONResponse(jsonable_encoder(models)).body
+
+
+async def fast_path(session) -> bytes:
+    rows = (await session.execute(select_pizzeria_rows())).all()
+    return dump_pizzerias(rows)
+
+
+async def timed(label, func, session, repeat: int, rows: int) -> bytes:
+    body = await func(session)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        await func(session)
+    per_call = (time.perf_counter() - start) / repeat
+    print(f"{label:>12}: {per_call * 1000:8.2f} ms/call, "
+          f"{per_call * 1000 * 10_000 / rows:8.2f} ms per 10k rows")
+    return body
+
+
+async def main(rows: int, repeat: int) -> None:
+    engine = create_async_engine(os.environ["DATABASE_URL"])
+    async with engine.begin() as connection:
+        await connection.run_sync(SQLModel.metadata.create_all)
+        await connection.execute(insert(Pizzeria), make_rows(rows))
+
+    async with AsyncSession(engine) as session:
+        baseline = await timed("orm", orm_path, session, repeat, rows)
+        fast = await timed("projected", fast_path, session, repeat, rows)
+
+    assert fast == baseline, "fast path output differs from response_model output"
+    print(f"{'identical':>12}: {len(fast)} bytes")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.repeat))
@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+"""Geocode every pizzeria without a location once, then exit."""
+
+import argparse
+import asyncio
+
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.config import settings
+from app.geocoding import GeocodingWorker, make_geocoder
+
+
+async def main(geocoder_name: str):
+    engine = create_async_engine(settings.database_url, echo=False)
+    session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    geocoder = make_geocoder(geocoder_name)
+    worker = GeocodingWorker(geocoder, session_maker)
+    try:
+        while await worker.run_once():
+            pass
+    finally:
+        await geocoder.close()
+        await engine.dispose()
+    stats = worker.stats()
+    print(
+        f"Located {stats['located']} pizzerias "
+        f"({stats['lookups']} lookups, {stats['cache_hits']} cached, {stats['failures']} failed)."
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--geocoder",
+        choices=("google", "fake"),
+        default=settings.geocoder if settings.geocoder != "off" else "google",
+    )
+    args = parser.parse_args()
+    asyncio.run(main(args.geocoder))
@@ -0,0 +1,21 @@
+#!/usr/bin/env python
+"""Recompute the pizzeria_stat summary table from the pizzeria table."""
+
+import asyncio
+
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.config import settings
+from app.stats import rebuild_stats
+
+
+async def main():
+    engine = create_async_engine(settings.database_url, echo=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(rebuild_stats)
+    await engine.dispose()
+    print("Rebuilt pizzeria stats.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
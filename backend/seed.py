@@ -4,62 +4,209 @@
 import argparse
 import asyncio
 import json
+import time
+from collections.abc import Iterator
 from datetime import datetime
+from itertools import islice
 from pathlib import Path
 
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from sqlalchemy.orm import sessionmaker
-from sqlmodel import select
+from pydantic import ValidationError
+from sqlalchemy import bindparam, delete, func, insert, select, text, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncConnection, create_async_engine
 
+from app.changes import POSTGRES_TOMBSTONE_ALL
 from app.config import settings
-from app.models import Pizzeria
+from app.models import Pizzeria, PizzeriaCreate
+from app.stats import rebuild_stats
 
 SEED_FILE = Path(__file__).parent / "seed_data.json"
+BATCH_SIZE = 1000
+READ_CHUNK_SIZE = 64 * 1024
 
+COLUMNS = [
+    "name",
+    "address",
+    "lat",
+    "lng",
+    "geo_cell",
+    "rating",
+    "google_maps_url",
+    "review",
+    "visited_at",
+    "created_at",
+    "updated_at",
+]
 
-async def seed_database(force: bool = False):
+
+def iter_json_array(path: Path, key: str = "pizzerias") -> Iterator[dict]:
+    """Yield the items of the ``key`` array of a JSON document one at a time.
+
+    Only the current read chunk and one item are held in memory. Files ending
+    in ``.ndjson`` (as written by ``GET /pizzerias/export``) are read line by
+    line instead.
+    """
+    if path.suffix == ".ndjson":
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        return
+
+    decoder = json.JSONDecoder()
+    with open(path, encoding="utf-8") as f:
+        buffer = f.read(READ_CHUNK_SIZE)
+        marker = f'"{key}"'
+        while marker not in buffer or "[" not in buffer[buffer.index(marker) :]:
+            chunk = f.read(READ_CHUNK_SIZE)
+            if not chunk:
+                raise ValueError(f"No {marker} array found in {path}")
+            buffer += chunk
+        pos = buffer.index("[", buffer.index(marker)) + 1
+
+        while True:
+            # Skip separators, then decode one item, reading more as needed.
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buffer) and buffer[pos] == "]":
+                return
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                chunk = f.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    raise
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+            yield item
+            pos = end
+
+
+def to_rows(items: Iterator[dict], now: datetime) -> Iterator[dict]:
+    for index, item in enumerate(items):
+        try:
+            pizzeria = PizzeriaCreate.model_validate(item)
+        except ValidationError as exc:
+            print(f"Skipping item {index}: {exc.errors(include_url=False)}")
+            continue
+        yield {**pizzeria.to_db_model(), "created_at": now, "updated_at": now}
+
+
+def batched(rows: Iterator[dict], size: int) -> Iterator[list[dict]]:
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+async def insert_batch(conn: AsyncConnection, batch: list[dict]) -> None:
+    if conn.dialect.driver == "asyncpg":
+        # COPY is the fastest bulk path on Postgres.
+        raw = await conn.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(
+            Pizzeria.__tablename__,
+            records=[tuple(row[column] for column in COLUMNS) for row in batch],
+            columns=COLUMNS,
+        )
+    else:
+        await conn.execute(insert(Pizzeria.__table__), batch)
+
+
+async def upsert_batch(conn: AsyncConnection, batch: list[dict]) -> tuple[int, int]:
+    """Update rows matching on name+address and insert the rest."""
+    by_key = {(row["name"], row["address"]): row for row in batch}
+    table = Pizzeria.__table__
+    result = await conn.execute(
+        select(table.c.id, table.c.name, table.c.address).where(
+            tuple_(table.c.name, table.c.address).in_(list(by_key))
+        )
+    )
+    existing = {(row.name, row.address): row.id for row in result}
+
+    updates = [
+        {**{k: v for k, v in row.items() if k != "created_at"}, "_id": existing[key]}
+        for key, row in by_key.items()
+        if key in existing
+    ]
+    inserts = [row for key, row in by_key.items() if key not in existing]
+
+    if updates:
+        await conn.execute(
+            update(table).where(table.c.id == bindparam("_id")),
+            updates,
+        )
+    if inserts:
+        await insert_batch(conn, inserts)
+    return len(inserts), len(updates)
+
+
+async def seed_database(
+    force: bool = False,
+    upsert: bool = False,
+    path: Path = SEED_FILE,
+    batch_size: int = BATCH_SIZE,
+):
     engine = create_async_engine(settings.database_url, echo=False)
-    async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    try:
+        await _load(engine, force, upsert, path, batch_size)
+    finally:
+        await engine.dispose()
+
 
-    with open(SEED_FILE) as f:
-        data = json.load(f)
+async def _load(engine, force: bool, upsert: bool, path: Path, batch_size: int):
+    started = time.perf_counter()
+    inserted = updated = 0
 
-    async with async_session() as session:
-        # Check if already seeded
-        result = await session.execute(select(Pizzeria))
-        existing = result.scalars().all()
+    async with engine.begin() as conn:
+        count = (await conn.execute(select(func.count()).select_from(Pizzeria))).scalar_one()
 
-        if existing and not force:
-            print(f"Database already has {len(existing)} pizzerias. Use --force to reseed.")
+        if count and not (force or upsert):
+            print(f"Database already has {count} pizzerias. Use --force to reseed or --upsert.")
             return
 
-        if existing and force:
-            print(f"Deleting {len(existing)} existing pizzerias...")
-            for p in existing:
-                await session.delete(p)
-            await session.commit()
-
-        # Insert pizzerias
-        for pizzeria_data in data["pizzerias"]:
-            # Convert nested location to flat lat/lng
-            location = pizzeria_data.pop("location", None)
-            if location:
-                pizzeria_data["lat"] = location["lat"]
-                pizzeria_data["lng"] = location["lng"]
-            # Parse visited_at date string
-            if pizzeria_data.get("visited_at"):
-                pizzeria_data["visited_at"] = datetime.fromisoformat(pizzeria_data["visited_at"])
-            pizzeria = Pizzeria(**pizzeria_data)
-            session.add(pizzeria)
-            print(f"Adding: {pizzeria.name}")
-
-        await session.commit()
-        print(f"\nSeeded {len(data['pizzerias'])} pizzerias!")
+        if count and force:
+            print(f"Deleting {count} existing pizzerias...")
+            if conn.dialect.name == "postgresql":
+                await conn.execute(text(POSTGRES_TOMBSTONE_ALL))
+                await conn.execute(text(f"TRUNCATE TABLE {Pizzeria.__tablename__}"))
+            else:
+                await conn.execute(delete(Pizzeria.__table__))
+
+        rows = to_rows(iter_json_array(path), datetime.utcnow())
+        for batch in batched(rows, batch_size):
+            if upsert:
+                batch_inserted, batch_updated = await upsert_batch(conn, batch)
+            else:
+                await insert_batch(conn, batch)
+                batch_inserted, batch_updated = len(batch), 0
+            inserted += batch_inserted
+            updated += batch_updated
+            print(f"  {inserted + updated} pizzerias loaded...")
+
+        # One pass over the table is cheaper than tracking per-row deltas here.
+        await conn.run_sync(rebuild_stats)
+
+    elapsed = time.perf_counter() - started
+    print(f"\nSeeded {inserted} new and {updated} updated pizzerias in {elapsed:.2f}s!")
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Seed the database with pizzeria data")
     parser.add_argument("--force", action="store_true", help="Delete existing data and reseed")
+    parser.add_argument(
+        "--upsert",
+        action="store_true",
+        help="Update pizzerias matching on name+address and insert the rest",
+    )
+    parser.add_argument(
+        "--file", type=Path, default=SEED_FILE, help="JSON or NDJSON file to load"
+    )
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
     args = parser.parse_args()
 
-    asyncio.run(seed_database(force=args.force))
+    asyncio.run(
+        seed_database(
+            force=args.force,
+            upsert=args.upsert,
+            path=args.file,
+            batch_size=args.batch_size,
+        )
+    )
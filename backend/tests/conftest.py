@@ -9,9 +9,20 @@ from sqlmodel import SQLModel
 # Set test environment variables before importing app modules
 os.environ["SECRET_KEY"] = "test-secret-key-for-testing-only-do-not-use-in-production"
 os.environ["DATABASE_URL"] = "sqlite+aiosqlite:///:memory:"
+os.environ["BCRYPT_ROUNDS"] = "4"
+os.environ["METRICS_ENABLED"] = "true"
+os.environ["INTERNAL_ENDPOINTS_ENABLED"] = "true"
 
-from app.database import get_session
+from app.auth.dependencies import user_cache
+from app.auth.rate_limit import auth_rate_limiter
+from app.auth.security import token_cache
+from app.cache import pizzeria_list_cache
+from app.clusters import cluster_index
+from app.database import get_session, get_session_maker
 from app.main import app
+from app.metrics import instrument_engine
+from app.nearest import nearest_index
+from app.similar import similar_index
 
 TEST_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
 
@@ -21,6 +32,8 @@ test_engine = create_async_engine(
     future=True,
 )
 
+instrument_engine(test_engine)
+
 test_session_maker = sessionmaker(
     test_engine,
     class_=AsyncSession,
@@ -34,10 +47,18 @@ async def override_get_session():
 
 
 app.dependency_overrides[get_session] = override_get_session
+app.dependency_overrides[get_session_maker] = lambda: test_session_maker
 
 
 @pytest.fixture(scope="function")
 async def async_client():
+    pizzeria_list_cache.clear()
+    user_cache.clear()
+    token_cache.clear()
+    auth_rate_limiter.backend.clear()
+    cluster_index.reset()
+    nearest_index.reset()
+    similar_index.reset()
     async with test_engine.begin() as conn:
         await conn.run_sync(SQLModel.metadata.create_all)
 
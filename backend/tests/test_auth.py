@@ -1,4 +1,16 @@
+import hashlib
+
+import bcrypt
 import pytest
+from jose import jwt
+from sqlmodel import select
+
+from app.auth import User, security
+from app.auth.dependencies import get_current_user
+from app.auth.hashing import password_hasher
+from app.auth.rate_limit import MemoryRateLimitBackend, client_ip
+from app.config import settings
+from tests.conftest import test_session_maker as session_maker
 
 
 @pytest.mark.asyncio
@@ -203,3 +215,231 @@ async def test_public_routes_without_auth(async_client):
 
     response = await async_client.get("/pizzerias")
     assert response.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_current_user_cache_invalidated_on_deactivation(async_client):
+    """Test cached users are dropped as soon as they are deactivated."""
+    await async_client.post(
+        "/auth/register",
+        json={"email": "test@example.com", "password": "testpassword123"},
+    )
+    login_response = await async_client.post(
+        "/auth/login",
+        json={"email": "test@example.com", "password": "testpassword123"},
+    )
+    headers = {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+
+    before = (await async_client.get("/internal/cache")).json()["users"]
+    assert (await async_client.get("/auth/me", headers=headers)).status_code == 200
+    assert (await async_client.get("/auth/me", headers=headers)).status_code == 200
+    after = (await async_client.get("/internal/cache")).json()["users"]
+    assert after["hits"] - before["hits"] == 1
+
+    async with session_maker() as session:
+        result = await session.execute(select(User).where(User.email == "test@example.com"))
+        user = result.scalar_one()
+        user.is_active = False
+        await session.commit()
+
+    response = await async_client.get("/auth/me", headers=headers)
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Inactive user"
+
+
+@pytest.mark.asyncio
+async def test_cached_user_is_a_fresh_object_per_request(async_client):
+    """Test cache hits never share a User instance between requests or sessions."""
+    async with session_maker() as session:
+        session.add(User(email="test@example.com", hashed_password="x"))
+        await session.commit()
+    token = security.create_access_token("test@example.com")
+
+    async with session_maker() as session:
+        first = await get_current_user(token, session)
+        second = await get_current_user(token, session)
+        third = await get_current_user(token, session)
+    assert second is not third
+    second.is_superuser = True
+    assert third.is_superuser is False
+
+    # A cached user can join another session without reloading or leaking changes.
+    async with session_maker() as session:
+        merged = await session.merge(third, load=False)
+        assert merged.id == first.id
+        assert merged.email == "test@example.com"
+        assert not session.dirty
+
+
+@pytest.mark.asyncio
+async def test_login_rehashes_password_with_configured_cost(async_client):
+    """Test login upgrades hashes made with a different bcrypt cost."""
+    async with session_maker() as session:
+        old_hash = bcrypt.hashpw(b"testpassword123", bcrypt.gensalt(rounds=5)).decode()
+        session.add(User(email="test@example.com", hashed_password=old_hash))
+        await session.commit()
+
+    response = await async_client.post(
+        "/auth/login",
+        json={"email": "test@example.com", "password": "testpassword123"},
+    )
+    assert response.status_code == 200
+
+    async with session_maker() as session:
+        result = await session.execute(select(User).where(User.email == "test@example.com"))
+        new_hash = result.scalar_one().hashed_password
+    assert new_hash.startswith(f"$2b${settings.bcrypt_rounds:02d}$")
+    assert bcrypt.checkpw(b"testpassword123", new_hash.encode())
+
+
+@pytest.mark.asyncio
+async def test_login_returns_503_when_hashing_queue_full(async_client, monkeypatch):
+    """Test logins are rejected instead of queued when the hash pool is saturated."""
+    await async_client.post(
+        "/auth/register",
+        json={"email": "test@example.com", "password": "testpassword123"},
+    )
+    monkeypatch.setattr(password_hasher, "max_pending", 0)
+
+    response = await async_client.post(
+        "/auth/login",
+        json={"email": "test@example.com", "password": "testpassword123"},
+    )
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+
+def test_decode_token_verifies_each_token_once(monkeypatch):
+    """Repeated tokens are served from the verified-token cache."""
+    token = security.create_access_token("cached@example.com")
+    calls = []
+    real_decode = jwt.decode
+
+    def counting_decode(*args, **kwargs):
+        calls.append(token)
+        return real_decode(*args, **kwargs)
+
+    monkeypatch.setattr(jwt, "decode", counting_decode)
+
+    first = security.decode_token(token)
+    second = security.decode_token(token)
+
+    assert first == second
+    assert first["sub"] == "cached@example.com"
+    assert len(calls) == 1
+    assert security.decode_token("not-a-token") is None
+
+
+def test_token_cache_entry_expires_at_token_exp():
+    token = security.create_access_token("expiring@example.com")
+    payload = security.decode_token(token)
+    key = hashlib.sha256(token.encode()).digest()
+
+    clock = security.token_cache.clock
+    try:
+        security.token_cache.clock = lambda: payload["exp"] - 1
+        assert security.token_cache.get(key) == payload
+        security.token_cache.clock = lambda: payload["exp"]
+        assert security.token_cache.get(key) is None
+    finally:
+        security.token_cache.clock = clock
+
+
+def test_token_cache_flushed_when_secret_rotates(monkeypatch):
+    token = security.create_access_token("rotated@example.com")
+    assert security.decode_token(token) is not None
+
+    monkeypatch.setattr(settings, "secret_key", "a-brand-new-secret-key")
+
+    assert security.decode_token(token) is None
+
+
+async def test_memory_rate_limit_backend_refills_and_expires():
+    now = [0.0]
+    backend = MemoryRateLimitBackend(max_buckets=2, clock=lambda: now[0])
+
+    assert [await backend.take("a", 2, 1.0) for _ in range(3)] == [0, 0, pytest.approx(1.0)]
+    now[0] = 0.5
+    assert await backend.take("a", 2, 1.0) == pytest.approx(0.5)
+    now[0] = 1.0
+    assert await backend.take("a", 2, 1.0) == 0
+
+    # Full buckets are dropped; max_buckets evicts the least recently used.
+    now[0] = 10.0
+    await backend.take("b", 2, 1.0)
+    assert len(backend) == 1
+    await backend.take("c", 2, 1.0)
+    await backend.take("d", 2, 1.0)
+    assert len(backend) == 2
+
+
+@pytest.mark.asyncio
+async def test_login_rate_limited_before_bcrypt(async_client, monkeypatch):
+    monkeypatch.setattr(settings, "auth_rate_limit_email_burst", 3)
+    await async_client.post(
+        "/auth/register",
+        json={"email": "test@example.com", "password": "testpassword123"},
+    )
+    verifications = []
+    real_verify = password_hasher.verify
+
+    async def counting_verify(*args):
+        verifications.append(args)
+        return await real_verify(*args)
+
+    monkeypatch.setattr(password_hasher, "verify", counting_verify)
+
+    statuses = []
+    for email in ("test@example.com", "test@example.com", " Test@Example.com", "test@example.com"):
+        response = await async_client.post(
+            "/auth/login",
+            json={"email": email, "password": "wrongpassword"},
+        )
+        statuses.append(response.status_code)
+
+    # Only failures count, and case and spaces of the email don't matter.
+    assert statuses == [401, 401, 401, 429]
+    assert int(response.headers["Retry-After"]) >= 1
+    # The differently typed address matches no user, so nothing was verified for it.
+    assert len(verifications) == 2
+
+    response = await async_client.post(
+        "/auth/login",
+        json={"email": "other@example.com", "password": "wrongpassword"},
+    )
+    assert response.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_failed_logins_only_lock_out_the_client_making_them(async_client, monkeypatch):
+    monkeypatch.setattr(settings, "auth_rate_limit_email_burst", 2)
+    monkeypatch.setattr(settings, "trusted_proxy_hops", 1)
+    await async_client.post(
+        "/auth/register",
+        json={"email": "test@example.com", "password": "testpassword123"},
+    )
+
+    async def login(password, forwarded_for):
+        return await async_client.post(
+            "/auth/login",
+            json={"email": "test@example.com", "password": password},
+            headers={"X-Forwarded-For": forwarded_for},
+        )
+
+    # The attacker forges a leftmost entry; the proxy appends the real address.
+    attacker = "203.0.113.9, 198.51.100.7"
+    assert [(await login("wrong", attacker)).status_code for _ in range(3)] == [401, 401, 429]
+    assert (await login("testpassword123", "192.0.2.1")).status_code == 200
+    assert (await login("testpassword123", "192.0.2.1, 198.51.100.7")).status_code == 429
+
+
+def test_client_ip_trusts_only_configured_proxy_hops(monkeypatch):
+    chain = "10.0.0.1, 203.0.113.9, 198.51.100.7"
+    assert client_ip("172.16.0.2", chain) == "172.16.0.2"
+    monkeypatch.setattr(settings, "trusted_proxy_hops", 1)
+    assert client_ip("172.16.0.2", chain) == "198.51.100.7"
+    assert client_ip("172.16.0.2", None) == "172.16.0.2"
+    monkeypatch.setattr(settings, "trusted_proxy_hops", 2)
+    assert client_ip("172.16.0.2", chain) == "203.0.113.9"
+    monkeypatch.setattr(settings, "trusted_proxy_hops", 5)
+    assert client_ip("172.16.0.2", chain) == "10.0.0.1"
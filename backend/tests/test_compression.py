@@ -0,0 +1,129 @@
+import gzip
+import json
+import zlib
+
+import pytest
+
+from app import cache
+from app.cache import pizzeria_list_cache
+from app.compression import CompressionMiddleware, negotiate_encoding
+from app.config import settings
+from tests.test_pizzerias import BERLIN_PIZZERIAS, create_pizzerias, get_auth_header
+
+
+def test_negotiate_encoding():
+    assert negotiate_encoding(None) is None
+    assert negotiate_encoding("identity") is None
+    assert negotiate_encoding("gzip, deflate, br") == "gzip"
+    assert negotiate_encoding("deflate") == "deflate"
+    assert negotiate_encoding("gzip;q=0.5, deflate") == "deflate"
+    assert negotiate_encoding("gzip;q=0, *") == "deflate"
+    assert negotiate_encoding("br, *;q=0") is None
+
+
+async def get_raw(async_client, url, accept_encoding, **kwargs):
+    """GET without httpx decoding the body."""
+    headers = {"Accept-Encoding": accept_encoding, **kwargs.pop("headers", {})}
+    request = async_client.build_request("GET", url, headers=headers, **kwargs)
+    response = await async_client.send(request, stream=True)
+    body = b"".join([chunk async for chunk in response.aiter_raw()])
+    await response.aclose()
+    return response, body
+
+
+@pytest.mark.asyncio
+async def test_list_is_compressed_once_per_cached_page(async_client, monkeypatch):
+    monkeypatch.setattr(settings, "compression_min_size", 100)
+    auth_header = await get_auth_header(async_client)
+    await create_pizzerias(async_client, auth_header, BERLIN_PIZZERIAS)
+
+    plain, plain_body = await get_raw(async_client, "/pizzerias", "identity")
+    assert "content-encoding" not in plain.headers
+    assert plain.headers["vary"] == "Accept-Encoding"
+
+    zipped, zipped_body = await get_raw(async_client, "/pizzerias", "gzip, deflate")
+    assert zipped.headers["content-encoding"] == "gzip"
+    assert zipped.headers["vary"] == "Accept-Encoding"
+    assert gzip.decompress(zipped_body) == plain_body
+    assert len(zipped_body) < len(plain_body)
+    assert zipped.headers["etag"] == plain.headers["etag"][:-1] + '-gzip"'
+
+    deflated, deflated_body = await get_raw(async_client, "/pizzerias", "deflate")
+    assert zlib.decompress(deflated_body) == plain_body
+
+    [cached] = [entry[0] for entry in pizzeria_list_cache._entries.values()]
+    assert set(cached.encoded) == {"gzip", "deflate"}
+    monkeypatch.setattr(cache, "compress", None)  # must not be called again
+    again, again_body = await get_raw(async_client, "/pizzerias", "gzip")
+    assert again_body == zipped_body
+
+    # Either representation's ETag revalidates the page.
+    for etag in (plain.headers["etag"], zipped.headers["etag"]):
+        not_modified, _ = await get_raw(
+            async_client, "/pizzerias", "gzip", headers={"If-None-Match": etag}
+        )
+        assert not_modified.status_code == 304
+        assert "content-encoding" not in not_modified.headers
+
+
+@pytest.mark.asyncio
+async def test_small_responses_are_not_compressed(async_client):
+    response, body = await get_raw(async_client, "/pizzerias", "gzip")
+    assert "content-encoding" not in response.headers
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert body == b"[]"
+
+
+@pytest.mark.asyncio
+async def test_uncompressed_responses_of_compressible_types_vary(async_client):
+    auth_header = await get_auth_header(async_client)
+    await create_pizzerias(async_client, auth_header, BERLIN_PIZZERIAS[:1])
+
+    for url in ("/pizzerias/stats", "/pizzerias/export"):
+        response, _ = await get_raw(async_client, url, "identity")
+        assert "content-encoding" not in response.headers
+        assert response.headers["vary"] == "Accept-Encoding"
+
+
+@pytest.mark.asyncio
+async def test_middleware_compresses_streamed_exports(async_client):
+    auth_header = await get_auth_header(async_client)
+    await create_pizzerias(async_client, auth_header, BERLIN_PIZZERIAS)
+
+    response, body = await get_raw(
+        async_client, "/pizzerias/export", "gzip", params={"format": "ndjson"}
+    )
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    lines = gzip.decompress(body).decode().splitlines()
+    assert [json.loads(line)["name"] for line in lines] == [p["name"] for p in BERLIN_PIZZERIAS]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("encoding, wbits", [("gzip", 31), ("deflate", 15)])
+async def test_streamed_chunks_decode_as_they_arrive(encoding, wbits):
+    chunks = [b'{"name": "Zola"}\n', b'{"name": "Mater"}\n', b""]
+
+    async def app(scope, receive, send):
+        headers = [(b"content-type", b"application/x-ndjson")]
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        for i, chunk in enumerate(chunks):
+            more_body = i < len(chunks) - 1
+            await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "headers": [(b"accept-encoding", encoding.encode())]}
+    await CompressionMiddleware(app)(scope, None, send)
+
+    start, *bodies = sent
+    assert (b"content-encoding", encoding.encode()) in start["headers"]
+    decoder = zlib.decompressobj(wbits)
+    # Each chunk is complete on its own, before the stream ends.
+    assert decoder.decompress(bodies[0]["body"]) == chunks[0]
+    assert decoder.decompress(bodies[1]["body"]) == chunks[1]
+    assert decoder.decompress(bodies[-1]["body"]) == b""
+    assert decoder.eof and not bodies[-1]["more_body"]
@@ -0,0 +1,166 @@
+import random
+
+import pytest
+
+from app.clusters import ClusterIndex, project, unproject
+from app.nearest import KDTree, NearestIndex
+from app.geo import (
+    MAX_CELL_RANGES,
+    MAX_COVER_CELLS,
+    BoundingBox,
+    bbox_around,
+    cell_ranges,
+    grid_cell,
+    haversine_m,
+    parse_bbox,
+)
+
+
+def test_grid_cell_is_inside_covering_ranges():
+    bbox = BoundingBox(13.3, 52.45, 13.5, 52.55)
+    ranges = cell_ranges(bbox)
+    for lat, lng in [(52.45, 13.3), (52.5, 13.4), (52.55, 13.5)]:
+        cell = grid_cell(lat, lng)
+        assert any(first <= cell <= last for first, last in ranges)
+    assert not any(first <= grid_cell(48.14, 11.58) <= last for first, last in ranges)
+
+
+def test_cell_ranges_on_the_equator_and_prime_meridian():
+    ranges = cell_ranges(BoundingBox(-0.01, -0.01, 0.01, 0.01))
+    assert len(ranges) == 4
+    for lat, lng in [(-0.005, -0.005), (0.005, 0.005), (-0.005, 0.005), (0.005, -0.005)]:
+        assert any(first <= grid_cell(lat, lng) <= last for first, last in ranges)
+
+
+def test_cell_ranges_cover_random_boxes_in_a_few_ranges():
+    rng = random.Random(7)
+    for _ in range(200):
+        lat, lng = rng.uniform(-80, 80), rng.uniform(-179, 179)
+        height, width = rng.uniform(0.001, 2), rng.uniform(0.001, 2)
+        bbox = BoundingBox(lng, lat, min(lng + width, 180), min(lat + height, 90))
+        ranges = cell_ranges(bbox)
+        assert ranges is not None and len(ranges) <= MAX_COVER_CELLS
+        for _ in range(20):
+            cell = grid_cell(
+                rng.uniform(bbox.min_lat, bbox.max_lat), rng.uniform(bbox.min_lng, bbox.max_lng)
+            )
+            assert any(first <= cell <= last for first, last in ranges)
+
+
+def test_cell_ranges_split_at_antimeridian():
+    bbox = BoundingBox(179.5, -0.1, -179.5, 0.1)
+    assert bbox.crosses_antimeridian
+    ranges = cell_ranges(bbox)
+    for lng in (179.9, -179.9):
+        cell = grid_cell(0.0, lng)
+        assert any(first <= cell <= last for first, last in ranges)
+
+
+def test_cell_ranges_give_up_on_country_sized_boxes():
+    assert cell_ranges(BoundingBox(-180, -60, 180, 60)) is None
+    assert cell_ranges(BoundingBox(6, 47, 15, 55)) is None
+    # A city viewport of 20 old 0.01-degree grid rows is one or two ranges.
+    assert len(cell_ranges(BoundingBox(13.3, 52.4, 13.5, 52.6))) <= MAX_CELL_RANGES
+
+
+def test_haversine_known_distance():
+    # Brandenburger Tor to Alexanderplatz is roughly 2.2 km.
+    distance = haversine_m(52.5163, 13.3777, 52.5219, 13.4132)
+    assert 2_300 < distance < 2_500
+
+
+def test_bbox_around_contains_circle():
+    bbox = bbox_around(52.5, 13.4, 1_000)
+    assert bbox.contains(52.5 + 0.0089, 13.4)
+    assert bbox.contains(52.5, 13.4 + 0.0147)
+    assert not bbox.contains(52.52, 13.4)
+
+
+@pytest.mark.parametrize(
+    "value", ["", "1,2,3", "a,b,c,d", "13,53,14,52", "13,-91,14,52", "nan,1,2,3"]
+)
+def test_parse_bbox_rejects_invalid(value):
+    with pytest.raises(ValueError):
+        parse_bbox(value)
+
+
+WORLD = BoundingBox(-180, -85, 180, 85)
+
+
+def test_project_roundtrip():
+    lat, lng = unproject(*project(52.52, 13.405))
+    assert lat == pytest.approx(52.52)
+    assert lng == pytest.approx(13.405)
+
+
+def test_cluster_index_groups_by_zoom_and_updates_incrementally():
+    index = ClusterIndex()
+    index.add(1, 52.520, 13.405)  # Berlin Mitte
+    index.add(2, 52.521, 13.406)
+    index.add(3, 52.480, 13.430)  # Neukölln
+    index.add(4, 48.137, 11.575)  # Munich
+
+    assert sum(c["count"] for c in index.clusters(WORLD, 0)) == 4
+    assert sorted(c["count"] for c in index.clusters(WORLD, 3)) == [1, 3]
+    assert sorted(c["count"] for c in index.clusters(WORLD, 12)) == [1, 1, 2]
+    assert sorted(c["id"] or 0 for c in index.clusters(WORLD, 16)) == [1, 2, 3, 4]
+
+    berlin = BoundingBox(13.3, 52.4, 13.5, 52.6)
+    [cluster] = index.clusters(berlin, 3)
+    assert cluster["count"] == 3 and cluster["id"] is None
+    assert cluster["lat"] == pytest.approx((52.520 + 52.521 + 52.480) / 3, abs=0.01)
+
+    index.remove(1)
+    index.remove(3)
+    [cluster] = index.clusters(berlin, 3)
+    assert cluster["count"] == 1 and cluster["id"] == 2
+
+    index.add(2, None, None)
+    assert index.clusters(berlin, 3) == []
+    assert len(index) == 1
+
+
+def test_cluster_index_bbox_across_antimeridian():
+    index = ClusterIndex()
+    index.add(1, -17.7, 178.0)  # Fiji
+    index.add(2, -13.8, -171.8)  # Samoa
+    index.add(3, 52.5, 13.4)
+
+    clusters = index.clusters(BoundingBox(170, -30, -165, 0), 6)
+    assert sorted(c["id"] for c in clusters) == [1, 2]
+
+
+def test_nearest_index_matches_brute_force_through_updates():
+    rng = random.Random(7)
+    index = NearestIndex()
+    points = {}
+
+    def place(pizzeria_id):
+        # Mostly Berlin, some anywhere (poles and antimeridian included).
+        if pizzeria_id % 10:
+            point = (rng.uniform(52.3, 52.7), rng.uniform(13.0, 13.8))
+        else:
+            point = (rng.uniform(-90, 90), rng.uniform(-180, 180))
+        points[pizzeria_id] = point
+        index.add(pizzeria_id, *point)
+
+    for pizzeria_id in range(1, 1001):
+        place(pizzeria_id)
+    index._tree = KDTree(list(index._points.items()))
+    index._pending.clear()
+    # Updates after the build: moves, removals and new points.
+    for pizzeria_id in range(1, 100, 2):
+        place(pizzeria_id)
+    for pizzeria_id in range(2, 100, 4):
+        index.remove(pizzeria_id)
+        del points[pizzeria_id]
+    for pizzeria_id in range(1001, 1051):
+        place(pizzeria_id)
+
+    for query in [(52.5, 13.4), (89.9, 0.0), (-10.0, 179.99), (52.52, 13.405)]:
+        for k in (1, 10, 60):
+            expected = sorted(points, key=lambda i: (haversine_m(*query, *points[i]), i))[:k]
+            found = index.nearest(*query, k)
+            assert [pizzeria_id for pizzeria_id, _ in found] == expected
+            for pizzeria_id, meters in found:
+                assert meters == pytest.approx(haversine_m(*query, *points[pizzeria_id]), abs=0.01)
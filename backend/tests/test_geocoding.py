@@ -0,0 +1,84 @@
+import pytest
+
+from app.geocoding import FakeGeocoder, GeocodingError, GeocodingWorker, normalize_address
+from app.main import pizzerias_changed
+from tests.conftest import test_session_maker as session_maker
+from tests.test_pizzerias import get_auth_header
+
+
+def test_normalize_address_folds_case_spacing_and_commas():
+    assert normalize_address("  Teststraße 1,  10115 BERLIN ") == "teststrasse 1 10115 berlin"
+    assert normalize_address("Teststraße 1, 10115 Berlin") == normalize_address(
+        "teststrasse 1 ,10115   berlin"
+    )
+
+
+async def create_unlocated(async_client, headers, *addresses):
+    for i, address in enumerate(addresses):
+        response = await async_client.post(
+            "/pizzerias", json={"name": f"Pizzeria {i}", "address": address}, headers=headers
+        )
+        assert response.status_code == 201
+
+
+@pytest.mark.asyncio
+async def test_worker_geocodes_each_address_once(async_client):
+    headers = await get_auth_header(async_client)
+    await create_unlocated(
+        async_client,
+        headers,
+        "Teststraße 1, Berlin",
+        "teststrasse 1 berlin",
+        "Nowhere 0",
+        "Teststraße 2, Berlin",
+    )
+    # Served (and cached) before the worker runs.
+    assert all(p["location"] is None for p in (await async_client.get("/pizzerias")).json())
+
+    geocoder = FakeGeocoder(unknown={"Nowhere 0"})
+    worker = GeocodingWorker(geocoder, session_maker, on_located=pizzerias_changed)
+    assert await worker.run_once() == 4
+    assert await worker.run_once() == 0
+    assert len(geocoder.calls) == 3
+    assert worker.stats() == {"lookups": 3, "cache_hits": 0, "located": 3, "failures": 0}
+
+    pizzerias = (await async_client.get("/pizzerias")).json()
+    locations = [p["location"] for p in pizzerias]
+    assert locations[0] == locations[1] is not None
+    assert locations[2] is None
+    assert locations[3] not in (None, locations[0])
+
+    # Known addresses, found or not, come from the cache.
+    await create_unlocated(async_client, headers, "TESTSTRASSE 2, BERLIN", "Nowhere 0")
+    geocoder.calls.clear()
+    while await worker.run_once():
+        pass
+    assert geocoder.calls == []
+    located = (await async_client.get("/pizzerias")).json()
+    assert located[4]["location"] == locations[3]
+    assert located[5]["location"] is None
+
+
+@pytest.mark.asyncio
+async def test_failed_lookups_are_retried(async_client):
+    headers = await get_auth_header(async_client)
+    await create_unlocated(async_client, headers, "Teststraße 1, Berlin")
+
+    class FlakyGeocoder(FakeGeocoder):
+        async def geocode(self, address):
+            if not self.calls:
+                self.calls.append(address)
+                raise GeocodingError("OVER_QUERY_LIMIT")
+            return await super().geocode(address)
+
+    geocoder = FlakyGeocoder()
+    worker = GeocodingWorker(geocoder, session_maker)
+    while await worker.run_once():
+        pass
+    assert worker.failures == 1
+    assert (await async_client.get("/pizzerias")).json()[0]["location"] is None
+
+    while await worker.run_once():
+        pass
+    assert len(geocoder.calls) == 2
+    assert worker.located == 1
@@ -0,0 +1,213 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from sqlalchemy import select, update
+
+from app.config import settings
+from app.geocoding import FakeGeocoder, GeocodingWorker, start_geocode_scans
+from app.jobs import JobQueue, backoff_seconds, enqueue, job_queue
+from app.main import pizzerias_changed
+from app.models import Job
+from tests.conftest import test_session_maker as session_maker
+from tests.test_pizzerias import get_auth_header
+
+
+async def wait_until(condition, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+async def queued_jobs():
+    async with session_maker() as session:
+        return (await session.execute(select(Job).order_by(Job.id))).scalars().all()
+
+
+def test_backoff_doubles_up_to_the_cap(monkeypatch):
+    monkeypatch.setattr(settings, "jobs_backoff_seconds", 1.0)
+    monkeypatch.setattr(settings, "jobs_backoff_max_seconds", 5.0)
+    assert [backoff_seconds(n) for n in range(1, 6)] == [1.0, 2.0, 4.0, 5.0, 5.0]
+
+
+@pytest.mark.asyncio
+async def test_jobs_run_once_per_dedupe_key_and_are_deleted(async_client):
+    seen = []
+
+    async def record(payload):
+        seen.append(payload["n"])
+
+    queue = JobQueue()
+    queue.register("record", record)
+    async with session_maker() as session:
+        await enqueue(session, "record", {"n": 1}, dedupe_key="record:1")
+        await enqueue(session, "record", {"n": 1}, dedupe_key="record:1")
+        await enqueue(session, "record", {"n": 2})
+        await session.commit()
+    assert len(await queued_jobs()) == 2
+
+    queue.start(session_maker)
+    await wait_until(lambda: queue.completed == 2)
+    await queue.stop()
+
+    assert sorted(seen) == [1, 2]
+    assert await queued_jobs() == []
+    async with session_maker() as session:
+        status = await queue.status(session)
+    assert status["depth"] == {"queued": 0, "running": 0, "failed": 0}
+    assert status["completed"] == 2
+    assert status["latency_seconds"]["max"] >= status["latency_seconds"]["p50"] >= 0
+
+
+@pytest.mark.asyncio
+async def test_failing_jobs_back_off_then_fail(async_client, monkeypatch):
+    monkeypatch.setattr(settings, "jobs_max_attempts", 3)
+    monkeypatch.setattr(settings, "jobs_backoff_seconds", 0.01)
+    monkeypatch.setattr(settings, "jobs_poll_seconds", 0.01)
+    attempts = 0
+
+    async def broken(payload):
+        nonlocal attempts
+        attempts += 1
+        raise RuntimeError("boom")
+
+    queue = JobQueue()
+    queue.register("broken", broken)
+    async with session_maker() as session:
+        await enqueue(session, "broken", {}, dedupe_key="broken")
+        await session.commit()
+
+    queue.start(session_maker)
+    await wait_until(lambda: queue.failed == 1)
+    await queue.stop()
+
+    assert attempts == 3
+    assert queue.retried == 2
+    [job] = await queued_jobs()
+    assert (job.status, job.attempts, job.dedupe_key) == ("failed", 3, None)
+    assert job.last_error == "RuntimeError: boom"
+
+
+@pytest.mark.asyncio
+async def test_stop_drains_and_requeues_unfinished_jobs(async_client):
+    started, release = asyncio.Event(), asyncio.Event()
+
+    async def slow(payload):
+        started.set()
+        if payload["wait"]:
+            await release.wait()
+
+    queue = JobQueue()
+    queue.register("slow", slow)
+    async with session_maker() as session:
+        await enqueue(session, "slow", {"wait": True})
+        await session.commit()
+
+    queue.start(session_maker)
+    await started.wait()
+    await queue.stop(timeout=0.05)
+
+    [job] = await queued_jobs()
+    assert (job.status, job.attempts, job.started_at) == ("queued", 0, None)
+
+    # A restarted queue picks it up again.
+    release.set()
+    queue.start(session_maker)
+    await wait_until(lambda: queue.completed == 1)
+    await queue.stop()
+    assert await queued_jobs() == []
+
+
+@pytest.mark.asyncio
+async def test_create_pizzeria_queues_geocoding(async_client, monkeypatch):
+    monkeypatch.setattr(settings, "geocoder", "fake")
+    headers = await get_auth_header(async_client)
+    response = await async_client.post(
+        "/pizzerias", json={"name": "Da Mario", "address": "Teststraße 1"}, headers=headers
+    )
+    assert response.status_code == 201
+    assert response.json()["location"] is None
+    [job] = await queued_jobs()
+    assert (job.kind, job.dedupe_key) == ("geocode", f"geocode:{response.json()['id']}")
+
+    stats = (await async_client.get("/internal/jobs")).json()
+    assert stats["depth"]["queued"] == 1
+    assert stats["oldest_queued_seconds"] >= 0
+
+    worker = GeocodingWorker(FakeGeocoder(), session_maker, on_located=pizzerias_changed)
+    monkeypatch.setitem(job_queue.handlers, "geocode", worker.handle_job)
+    job_queue.start(session_maker)
+    await wait_until(lambda: worker.located == 1)
+    await job_queue.stop()
+
+    [pizzeria] = (await async_client.get("/pizzerias")).json()
+    assert pizzeria["location"] is not None
+    assert await queued_jobs() == []
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_queues_geocoding_for_unlocated_rows(async_client, monkeypatch):
+    monkeypatch.setattr(settings, "geocoder", "fake")
+    headers = await get_auth_header(async_client)
+    items = [
+        {"name": "Da Mario", "address": "Teststraße 1"},
+        {"name": "Mater", "address": "Neukölln", "location": {"lat": 52.48585, "lng": 13.43635}},
+        {"name": "Zola", "address": "Teststraße 2"},
+    ]
+    response = await async_client.post("/pizzerias/bulk", json=items, headers=headers)
+    assert response.status_code == 200
+    created = response.json()["created"]
+
+    jobs = await queued_jobs()
+    assert [(job.kind, job.dedupe_key) for job in jobs] == [
+        ("geocode", f"geocode:{created[0]['id']}"),
+        ("geocode", f"geocode:{created[2]['id']}"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_geocode_scan_jobs_walk_unlocated_rows_one_batch_at_a_time(
+    async_client, monkeypatch
+):
+    monkeypatch.setattr(settings, "geocode_batch_size", 2)
+    monkeypatch.setattr(settings, "jobs_poll_seconds", 0.01)
+    headers = await get_auth_header(async_client)
+    for i in range(5):
+        response = await async_client.post(
+            "/pizzerias", json={"name": f"P{i}", "address": f"Teststraße {i}"}, headers=headers
+        )
+        assert response.status_code == 201
+
+    # Every worker calls this at startup; only the first queues a pass.
+    for _ in range(3):
+        async with session_maker() as session:
+            await start_geocode_scans(session)
+            await session.commit()
+    [job] = await queued_jobs()
+    assert job.kind == "geocode_scan"
+    assert job.run_after > datetime.utcnow()
+
+    async with session_maker() as session:
+        await session.execute(update(Job).values(run_after=datetime.utcnow()))
+        await session.commit()
+    worker = GeocodingWorker(FakeGeocoder(), session_maker, on_located=pizzerias_changed)
+    scans = []
+
+    async def handle(payload):
+        scans.append((payload["after_id"], len(await queued_jobs())))
+        await worker.handle_scan_job(payload)
+
+    monkeypatch.setitem(job_queue.handlers, "geocode_scan", handle)
+    job_queue.start(session_maker)
+    await wait_until(lambda: len(scans) == 4)
+    await job_queue.stop()
+
+    # Three batches of at most two, then an empty one; never two passes at once.
+    assert [count for _, count in scans] == [1, 1, 1, 1]
+    assert scans[0][0] == 0 and scans[-1][0] > scans[1][0] > scans[0][0]
+    assert worker.located == 5
+    assert all(p["location"] for p in (await async_client.get("/pizzerias")).json())
+    [job] = await queued_jobs()
+    assert (job.kind, job.payload) == ("geocode_scan", '{"after_id":0}')
+    assert job.run_after > datetime.utcnow()
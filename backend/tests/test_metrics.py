@@ -0,0 +1,42 @@
+import pytest
+
+from app.metrics import Histogram
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("latency_seconds", "Latency.", ("route",), (0.1, 1.0))
+    histogram.observe(0.05, "/a")
+    histogram.observe(0.1, "/a")
+    histogram.observe(5.0, "/a")
+
+    assert histogram.render() == [
+        "# HELP latency_seconds Latency.",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{route="/a",le="0.1"} 2',
+        'latency_seconds_bucket{route="/a",le="1.0"} 2',
+        'latency_seconds_bucket{route="/a",le="+Inf"} 3',
+        'latency_seconds_sum{route="/a"} 5.15',
+        'latency_seconds_count{route="/a"} 3',
+    ]
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_reports_routes_sql_and_bcrypt(async_client):
+    await async_client.post(
+        "/auth/register",
+        json={"email": "test@example.com", "password": "testpassword123"},
+    )
+    await async_client.get("/pizzerias", params={"limit": 5})
+    await async_client.get("/pizzerias/not-a-route")
+
+    response = await async_client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+
+    assert 'http_requests_total{method="GET",route="/pizzerias",status="200"}' in body
+    assert 'route="unmatched",status="404"' in body
+    assert 'http_request_duration_seconds_count{method="POST",route="/auth/register"}' in body
+    assert 'http_request_sql_statements_bucket{route="/pizzerias",le="1"}' in body
+    assert 'http_request_db_seconds_sum{route="/auth/register"}' in body
+    assert 'password_hash_duration_seconds_count{operation="hash"}' in body
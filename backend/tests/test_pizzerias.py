@@ -1,4 +1,25 @@
+import base64
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+import orjson
 import pytest
+from sqlalchemy import event, select, text, update
+
+from app import export
+from app.changes import ChangesFollower, encode_changes_cursor, tombstone_pruner
+from app.clusters import cluster_index
+from app.config import settings
+from app.filters import within_bbox
+from app.geo import BoundingBox, haversine_m
+from app.models import Job, Pizzeria, PizzeriaTombstone
+from app.pagination import PizzeriaSort, paginate
+from app.serializers import select_pizzeria_rows
+from app.stats import rebuild_stats
+from tests.conftest import test_engine
+from tests.conftest import test_session_maker as session_maker
 
 
 async def get_auth_header(async_client):
@@ -91,3 +112,698 @@ async def test_create_pizzeria_with_location(async_client):
     assert pizzeria["location"] == {"lat": 52.48585, "lng": 13.43635}
     assert "lat" not in pizzeria  # Should not have flat lat/lng
     assert "lng" not in pizzeria
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("location", [{"lat": 90.5, "lng": 13.4}, {"lat": 52.5, "lng": -181}])
+async def test_create_pizzeria_rejects_location_out_of_range(async_client, location):
+    auth_header = await get_auth_header(async_client)
+    response = await async_client.post(
+        "/pizzerias",
+        json={"name": "Nowhere", "address": "Berlin", "location": location},
+        headers=auth_header,
+    )
+    assert response.status_code == 422
+
+
+async def create_pizzerias(async_client, auth_header, pizzerias):
+    for pizzeria_data in pizzerias:
+        response = await async_client.post(
+            "/pizzerias", json=pizzeria_data, headers=auth_header
+        )
+        assert response.status_code == 201
+
+
+@pytest.mark.asyncio
+async def test_get_pizzerias_paginates_with_cursor(async_client):
+    auth_header = await get_auth_header(async_client)
+    await create_pizzerias(
+        async_client,
+        auth_header,
+        [{"name": f"Pizzeria {i}", "address": "Berlin"} for i in range(5)],
+    )
+
+    names = []
+    params = {"limit": 2}
+    while True:
+        response = await async_client.get("/pizzerias", params=params)
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page) <= 2
+        names.extend(p["name"] for p in page)
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+        params = {"limit": 2, "cursor": cursor}
+
+    assert names == [f"Pizzeria {i}" for i in range(5)]
+
+
+@pytest.mark.asyncio
+async def test_get_pizzerias_sorted_by_rating_keeps_unrated_last(async_client):
+    auth_header = await get_auth_header(async_client)
+    await create_pizzerias(
+        async_client,
+        auth_header,
+        [
+            {"name": "Unrated", "address": "Berlin"},
+            {"name": "Good", "address": "Berlin", "rating": 4.0},
+            {"name": "Best", "address": "Berlin", "rating": 4.9},
+            {"name": "Also Good", "address": "Berlin", "rating": 4.0},
+        ],
+    )
+
+    names = []
+    params = {"limit": 1, "sort": "-rating"}
+    while True:
+        response = await async_client.get("/pizzerias", params=params)
+        names.extend(p["name"] for p in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+        params = {"limit": 1, "sort": "-rating", "cursor": cursor}
+
+    assert names == ["Best", "Also Good", "Good", "Unrated"]
+
+
+@pytest.mark.asyncio
+async def test_get_pizzerias_filters(async_client):
+    auth_header = await get_auth_header(async_client)
+    await create_pizzerias(
+        async_client,
+        auth_header,
+        [
+            {"name": "Gazzo", "address": "Berlin", "rating": 4.7,
+             "visited_at": "2024-05-10T19:00:00"},
+            {"name": "Mangiare", "address": "Berlin", "rating": 3.5,
+             "visited_at": "2024-08-01T12:00:00"},
+            {"name": "Mater", "address": "Berlin", "rating": 5.0},
+        ],
+    )
+
+    response = await async_client.get("/pizzerias", params={"min_rating": 4.5})
+    assert [p["name"] for p in response.json()] == ["Gazzo", "Mater"]
+
+    response = await async_client.get("/pizzerias", params={"visited": False})
+    assert [p["name"] for p in response.json()] == ["Mater"]
+
+    response = await async_client.get(
+        "/pizzerias",
+        params={"visited_after": "2024-06-01T00:00:00Z", "visited_before": "2025-01-01"},
+    )
+    assert [p["name"] for p in response.json()] == ["Mangiare"]
+
+
+@pytest.mark.asyncio
+async def test_get_pizzerias_rejects_invalid_cursor(async_client):
+    response = await async_client.get("/pizzerias", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+    auth_header = await get_auth_header(async_client)
+    await create_pizzerias(
+        async_client,
+        auth_header,
+        [{"name": f"Pizzeria {i}", "address": "Berlin"} for i in range(2)],
+    )
+    response = await async_client.get("/pizzerias", params={"limit": 1})
+    cursor = response.headers["X-Next-Cursor"]
+
+    # A cursor is only valid for the sort order that produced it.
+    response = await async_client.get(
+        "/pizzerias", params={"cursor": cursor, "sort": "name"}
+    )
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "sort, value, last_id",
+    [
+        ("rating", "4.5", 1),
+        ("name", 3, 1),
+        ("name", None, 1),
+        ("created_at", None, 1),
+        ("visited_at", 12, 1),
+        ("id", True, 1),
+        ("rating", 4.5, True),
+        ("rating", 4.5, 1.5),
+    ],
+)
+async def test_get_pizzerias_rejects_cursor_of_wrong_type(async_client, sort, value, last_id):
+    raw = json.dumps([sort, value, last_id]).encode()
+    cursor = base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+    response = await async_client.get("/pizzerias", params={"cursor": cursor, "sort": sort})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+
+async def query_plan(statement) -> list[str]:
+    """SQLite's ``EXPLAIN QUERY PLAN`` detail lines for ``statement``."""
+    compiled = statement.compile(test_engine.sync_engine)
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    async with test_engine.connect() as conn:
+        result = await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params)
+        return [row[-1] for row in result]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "sort, value",
+    [
+        ("name", "Mater"),
+        ("-created_at", datetime(2024, 5, 1)),
+        ("rating", 4.5),
+        ("-rating", 4.5),
+        ("-visited_at", datetime(2024, 5, 1)),
+        ("rating", None),
+    ],
+)
+async def test_cursor_pages_seek_the_sort_index(async_client, sort, value):
+    sort = PizzeriaSort(sort)
+    plan = await query_plan(paginate(select_pizzeria_rows(), sort, (value, 10), 100))
+    seeks = [line for line in plan if line.startswith("SEARCH pizzeria USING INDEX")]
+    assert seeks and all(f"ix_pizzeria_{sort.field}_id ({sort.field}" in line for line in seeks)
+    assert not any(line.startswith("SCAN pizzeria") for line in plan)
+
+
+BERLIN_PIZZERIAS = [
+    {"name": "Gazzo", "address": "Neukölln", "location": {"lat": 52.4877, "lng": 13.4262}},
+    {"name": "Mater", "address": "Neukölln", "location": {"lat": 52.48585, "lng": 13.43635}},
+    {"name": "Zola", "address": "Kreuzberg", "location": {"lat": 52.4990, "lng": 13.4186}},
+    {"name": "Standard", "address": "Prenzlauer Berg", "location": {"lat": 52.5365, "lng": 13.4164}},
+    {"name": "Mangiare", "address": "Moabit"},
+]
+
+
+@pytest.mark.asyncio
+async def test_get_pizzerias_within_bbox(async_client):
+    auth_header = await get_auth_header(async_client)
+    await create_pizzerias(async_client, auth_header, BERLIN_PIZZERIAS)
+
+    response = await async_client.get(
+        "/pizzerias/within", params={"bbox": "13.40,52.48,13.44,52.50"}
+    )
+    assert response.status_code == 200
+    assert [p["name"] for p in response.json()] == ["Gazzo", "Mater", "Zola"]
+
+    response = await async_client.get("/pizzerias/within", params={"bbox": "13.4,52.5"})
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_city_viewport_seeks_the_geo_cell_index(async_client):
+    box = BoundingBox(13.3, 52.4, 13.5, 52.6)
+    statement = select_pizzeria_rows().where(within_bbox(box)).order_by(Pizzeria.id).limit(100)
+    plan = await query_plan(statement)
+    assert any(line.startswith("SEARCH pizzeria USING INDEX ix_pizzeria_geo_cell") for line in plan)
+    assert not any(line.startswith("SCAN pizzeria") for line in plan)
+
+
+@pytest.mark.asyncio
+async def test_get_pizzerias_near_orders_by_distance(async_client):
+    auth_header = await get_auth_header(async_client)
+    await create_pizzerias(async_client, auth_header, BERLIN_PIZZERIAS)
+
+    response = await async_client.get(
+        "/pizzerias/near", params={"lat": 52.4860, "lng": 13.4360, "radius_m": 2_000}
+    )
+    assert response.status_code == 200
+    assert [p["name"] for p in response.json()] == ["Mater", "Gazzo", "Zola"]
+
+    response = await async_client.get(
+        "/pizzerias/near", params={"lat": 52.4860, "lng": 13.4360, "radius_m": 100}
+    )
+    assert [p["name"] for p in response.json()] == ["Mater"]
+
+
+@pytest.mark.asyncio
+async def test_export_pizzerias_ndjson(async_client):
+    auth_header = await get_auth_header(async_client)
+    await create_pizzerias(async_client, auth_header, BERLIN_PIZZERIAS)
+
+    response = await async_client.get("/pizzerias/export", params={"format": "ndjson"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+
+    listed = (await async_client.get("/pizzerias")).json()
+    exported = [json.loads(line) for line in response.text.splitlines()]
+    assert exported == listed
+
+
+@pytest.mark.asyncio
+async def test_export_sends_a_small_first_batch_then_grows(async_client, monkeypatch):
+    monkeypatch.setattr(export, "EXPORT_FIRST_BATCH_SIZE", 2)
+    monkeypatch.setattr(export, "EXPORT_BATCH_SIZE", 20)
+    now = datetime.utcnow()
+    async with session_maker() as session:
+        session.add_all(
+            Pizzeria(name=f"P{i}", address="A", created_at=now, updated_at=now)
+            for i in range(50)
+        )
+        await session.commit()
+
+    chunks = [
+        chunk.count(b"\n")
+        async for chunk in export.stream_export(
+            session_maker, export.export_statement(), export.ExportFormat.ndjson
+        )
+    ]
+    assert chunks == [2, 8, 20, 20]
+
+
+@pytest.mark.asyncio
+async def test_export_pizzerias_csv(async_client):
+    auth_header = await get_auth_header(async_client)
+    await create_pizzerias(async_client, auth_header, BERLIN_PIZZERIAS)
+
+    response = await async_client.get(
+        "/pizzerias/export", params={"format": "csv", "min_rating": 0}
+    )
+    assert response.status_code == 200
+    assert response.text.splitlines() == [
+        "id,name,address,lat,lng,rating,google_maps_url,review,visited_at,created_at,updated_at"
+    ]
+
+    response = await async_client.get("/pizzerias/export", params={"format": "csv"})
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [row["name"] for row in rows] == [p["name"] for p in BERLIN_PIZZERIAS]
+    assert rows[0]["lat"] == "52.4877"
+    assert rows[-1]["lat"] == ""
+
+
+@pytest.mark.asyncio
+async def test_get_pizzerias_etag_and_invalidation(async_client):
+    auth_header = await get_auth_header(async_client)
+    await create_pizzerias(async_client, auth_header, BERLIN_PIZZERIAS[:1])
+    before = (await async_client.get("/internal/cache")).json()["pizzeria_list"]
+
+    first = await async_client.get("/pizzerias")
+    etag = first.headers["ETag"]
+    second = await async_client.get("/pizzerias")
+    assert second.headers["ETag"] == etag
+    assert second.content == first.content
+
+    not_modified = await async_client.get("/pizzerias", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+
+    stats = (await async_client.get("/internal/cache")).json()["pizzeria_list"]
+    assert stats["misses"] - before["misses"] == 1
+    assert stats["hits"] - before["hits"] == 2
+
+    await create_pizzerias(async_client, auth_header, BERLIN_PIZZERIAS[1:2])
+    changed = await async_client.get("/pizzerias", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert len(changed.json()) == 2
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_pizzerias_reports_invalid_items(async_client):
+    auth_header = await get_auth_header(async_client)
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("INSERT INTO pizzeria ("):
+            statements.append(statement)
+
+    event.listen(test_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        response = await async_client.post(
+            "/pizzerias/bulk",
+            json=[
+                BERLIN_PIZZERIAS[0],
+                {"name": "No Address"},
+                BERLIN_PIZZERIAS[4],
+                "not an object",
+            ],
+            headers=auth_header,
+        )
+    finally:
+        event.remove(test_engine.sync_engine, "before_cursor_execute", record)
+
+    assert response.status_code == 200
+    result = response.json()
+    assert [p["name"] for p in result["created"]] == ["Gazzo", "Mangiare"]
+    assert result["created"][0]["location"] == BERLIN_PIZZERIAS[0]["location"]
+    assert [e["index"] for e in result["errors"]] == [1, 3]
+    assert result["errors"][0]["errors"][0]["loc"] == ["address"]
+    assert len(statements) == 1
+
+    listed = (await async_client.get("/pizzerias")).json()
+    assert listed == result["created"]
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_pizzerias_returns_floats_like_get(async_client):
+    auth_header = await get_auth_header(async_client)
+    response = await async_client.post(
+        "/pizzerias/bulk",
+        json=[
+            {"name": "Round", "address": "Berlin", "rating": 4, "location": {"lat": 52, "lng": 13}}
+        ],
+        headers=auth_header,
+    )
+    created = response.json()["created"][0]
+    assert isinstance(created["rating"], float)
+    assert isinstance(created["location"]["lat"], float)
+
+    listed = await async_client.get("/pizzerias")
+    assert listed.content == orjson.dumps(response.json()["created"])
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_pizzerias_enforces_max_items(async_client, monkeypatch):
+    auth_header = await get_auth_header(async_client)
+    monkeypatch.setattr(settings, "bulk_insert_max_items", 2)
+
+    response = await async_client.post(
+        "/pizzerias/bulk", json=BERLIN_PIZZERIAS[:3], headers=auth_header
+    )
+    assert response.status_code == 413
+
+    response = await async_client.post("/pizzerias/bulk", json=BERLIN_PIZZERIAS[:3])
+    assert response.status_code == 401
+
+
+SEARCHABLE_PIZZERIAS = [
+    {"name": "Gazzo", "address": "Hobrechtstraße 57, Neukölln",
+     "review": "Sourdough crust with a great char"},
+    {"name": "Sourdough Brothers", "address": "Kreuzberg", "review": "Solid"},
+    {"name": "Mangiare", "address": "Arminius Markthalle, Moabit"},
+]
+
+
+@pytest.mark.asyncio
+async def test_search_pizzerias_ranks_name_matches_first(async_client):
+    auth_header = await get_auth_header(async_client)
+    await create_pizzerias(async_client, auth_header, SEARCHABLE_PIZZERIAS)
+
+    response = await async_client.get("/pizzerias/search", params={"q": "sourdough"})
+    assert response.status_code == 200
+    assert [p["name"] for p in response.json()] == ["Sourdough Brothers", "Gazzo"]
+
+    # Prefix matching, diacritic folding and AND semantics across terms.
+    response = await async_client.get("/pizzerias/search", params={"q": "neukolln hobrecht"})
+    assert [p["name"] for p in response.json()] == ["Gazzo"]
+
+    response = await async_client.get("/pizzerias/search", params={"q": '"*)'})
+    assert response.json() == []
+
+
+@pytest.mark.asyncio
+async def test_search_pizzerias_paginates_and_tracks_updates(async_client):
+    auth_header = await get_auth_header(async_client)
+    await create_pizzerias(async_client, auth_header, SEARCHABLE_PIZZERIAS)
+
+    response = await async_client.get(
+        "/pizzerias/search", params={"q": "sourdough", "limit": 1}
+    )
+    assert len(response.json()) == 1
+    assert response.headers["X-Next-Offset"] == "1"
+
+    async with session_maker() as session:
+        pizzeria = (
+            await session.execute(select(Pizzeria).where(Pizzeria.name == "Mangiare"))
+        ).scalar_one()
+        pizzeria.review = "Thin sourdough slices"
+        await session.commit()
+
+    response = await async_client.get("/pizzerias/search", params={"q": "sourdough"})
+    names = [p["name"] for p in response.json()]
+    assert names[0] == "Sourdough Brothers"
+    assert sorted(names[1:]) == ["Gazzo", "Mangiare"]
+
+
+@pytest.mark.asyncio
+async def test_pizzeria_stats_are_maintained_on_write(async_client):
+    auth_header = await get_auth_header(async_client)
+    response = await async_client.get("/pizzerias/stats")
+    assert response.json() == {
+        "total": 0,
+        "rated": 0,
+        "average_rating": None,
+        "visited": 0,
+        "visits_per_month": {},
+        "rating_histogram": {},
+    }
+
+    await create_pizzerias(
+        async_client,
+        auth_header,
+        [
+            {"name": "Gazzo", "address": "Berlin", "rating": 4.7,
+             "visited_at": "2024-05-10T19:00:00"},
+            {"name": "Mater", "address": "Berlin", "rating": 5.0},
+        ],
+    )
+    await async_client.post(
+        "/pizzerias/bulk",
+        json=[
+            {"name": "Zola", "address": "Berlin", "rating": 4.2,
+             "visited_at": "2024-05-20T12:00:00"},
+            {"name": "Mangiare", "address": "Berlin", "visited_at": "2024-08-01T12:00:00"},
+        ],
+        headers=auth_header,
+    )
+
+    stats = (await async_client.get("/pizzerias/stats")).json()
+    assert stats == {
+        "total": 4,
+        "rated": 3,
+        "average_rating": pytest.approx((4.7 + 5.0 + 4.2) / 3),
+        "visited": 3,
+        "visits_per_month": {"2024-05": 2, "2024-08": 1},
+        "rating_histogram": {"4.0": 1, "4.5": 1, "5.0": 1},
+    }
+
+    async with test_engine.begin() as conn:
+        await conn.run_sync(rebuild_stats)
+    assert (await async_client.get("/pizzerias/stats")).json() == stats
+
+
+@pytest.mark.asyncio
+async def test_changes_returns_updates_and_tombstones(async_client, monkeypatch):
+    monkeypatch.setattr(settings, "changes_settle_seconds", 0)
+    auth_header = await get_auth_header(async_client)
+    await create_pizzerias(
+        async_client,
+        auth_header,
+        [{"name": f"Pizzeria {i}", "address": "Berlin"} for i in range(3)],
+    )
+
+    first = (await async_client.get("/pizzerias/changes")).json()
+    assert [p["name"] for p in first["changed"]] == ["Pizzeria 0", "Pizzeria 1", "Pizzeria 2"]
+    assert first["deleted"] == []
+    assert first["has_more"] is False
+
+    idle = (await async_client.get("/pizzerias/changes", params={"since": first["cursor"]}))
+    assert idle.json()["changed"] == [] and idle.json()["deleted"] == []
+
+    ids = [p["id"] for p in first["changed"]]
+    async with session_maker() as session:
+        updated = await session.get(Pizzeria, ids[1])
+        created_updated_at = updated.updated_at
+        updated.rating = 4.5
+        await session.delete(await session.get(Pizzeria, ids[0]))
+        await session.commit()
+
+    changes = (
+        await async_client.get("/pizzerias/changes", params={"since": first["cursor"]})
+    ).json()
+    assert [p["id"] for p in changes["changed"]] == [ids[1]]
+    assert changes["changed"][0]["rating"] == 4.5
+    assert changes["changed"][0]["updated_at"] > created_updated_at.isoformat()
+    assert changes["deleted"] == [ids[0]]
+
+    # Updates that bypass SQLAlchemy are stamped by the trigger.
+    async with session_maker() as session:
+        await session.execute(
+            text("UPDATE pizzeria SET name = 'Renamed' WHERE id = :id"), {"id": ids[2]}
+        )
+        await session.commit()
+    raw = (
+        await async_client.get("/pizzerias/changes", params={"since": changes["cursor"]})
+    ).json()
+    assert [p["name"] for p in raw["changed"]] == ["Renamed"]
+    assert raw["changed"][0]["updated_at"] > changes["changed"][0]["updated_at"]
+
+
+@pytest.mark.asyncio
+async def test_changes_pages_and_holds_back_unsettled_cursor(async_client):
+    auth_header = await get_auth_header(async_client)
+    await create_pizzerias(
+        async_client,
+        auth_header,
+        [{"name": f"Pizzeria {i}", "address": "Berlin"} for i in range(3)],
+    )
+
+    page = (await async_client.get("/pizzerias/changes", params={"limit": 2})).json()
+    assert len(page["changed"]) == 2 and page["has_more"] is True
+
+    page = (
+        await async_client.get(
+            "/pizzerias/changes", params={"limit": 2, "since": page["cursor"]}
+        )
+    ).json()
+    assert [p["name"] for p in page["changed"]] == ["Pizzeria 2"]
+    assert page["has_more"] is False
+
+    # Rows written within the settle window are sent again on the next poll.
+    again = (await async_client.get("/pizzerias/changes", params={"since": page["cursor"]}))
+    assert len(again.json()["changed"]) == 3
+
+    response = await async_client.get("/pizzerias/changes", params={"since": "bogus"})
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "values",
+    [
+        ["2024-05-01T00:00:00", True, None, None],
+        [None, None, "2024-05-01T00:00:00", False],
+        ["2024-05-01T00:00:00", 1.0, None, None],
+        [12, 1, None, None],
+    ],
+)
+async def test_changes_rejects_cursor_of_wrong_type(async_client, values):
+    raw = json.dumps(["changes", *values]).encode()
+    cursor = base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+    response = await async_client.get("/pizzerias/changes", params={"since": cursor})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+
+@pytest.mark.asyncio
+async def test_changes_prunes_old_tombstones_and_expires_old_cursors(async_client):
+    auth_header = await get_auth_header(async_client)
+    await create_pizzerias(
+        async_client,
+        auth_header,
+        [{"name": f"Pizzeria {i}", "address": "Berlin"} for i in range(3)],
+    )
+    async with session_maker() as session:
+        await cluster_index.sync(session)
+    assert cluster_index.loaded
+
+    now = datetime.utcnow()
+    old = now - timedelta(days=settings.changes_tombstone_retention_days + 1)
+    async with session_maker() as session:
+        for pizzeria_id in (1, 2):
+            await session.delete(await session.get(Pizzeria, pizzeria_id))
+        await session.commit()
+        await session.execute(
+            update(PizzeriaTombstone).where(PizzeriaTombstone.id == 1).values(deleted_at=old)
+        )
+        await session.commit()
+
+    await tombstone_pruner(session_maker)({})
+    async with session_maker() as session:
+        tombstones = (await session.execute(select(PizzeriaTombstone.id))).scalars().all()
+        jobs = (await session.execute(select(Job))).scalars().all()
+    assert tombstones == [2]
+    assert [job.kind for job in jobs] == ["prune_tombstones"]
+    assert jobs[0].run_after > now
+
+    expired = encode_changes_cursor(None, (old, 0))
+    response = await async_client.get("/pizzerias/changes", params={"since": expired})
+    assert response.status_code == 410
+    current = encode_changes_cursor(None, (now - timedelta(days=1), 0))
+    response = await async_client.get("/pizzerias/changes", params={"since": current})
+    assert response.status_code == 200
+
+    # An in-process index that fell that far behind starts over.
+    cluster_index._tombstones_after = (old, 0)
+    cluster_index._synced_at = 0.0
+    async with session_maker() as session:
+        await cluster_index.sync(session)
+    assert cluster_index._tombstones_after[0] > old
+
+
+def test_changes_follower_requires_its_abstract_members():
+    class Incomplete(ChangesFollower):
+        sync_seconds = 1.0
+
+        def reset(self) -> None:
+            self.reset_sync()
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+@pytest.mark.asyncio
+async def test_clusters_load_lazily_and_follow_writes(async_client, monkeypatch):
+    auth_header = await get_auth_header(async_client)
+    await create_pizzerias(
+        async_client,
+        auth_header,
+        [
+            {"name": "Mitte", "address": "Berlin", "location": {"lat": 52.520, "lng": 13.405}},
+            {"name": "Mitte 2", "address": "Berlin", "location": {"lat": 52.521, "lng": 13.406}},
+            {"name": "Nowhere", "address": "Berlin"},
+        ],
+    )
+    params = {"bbox": "13.3,52.4,13.5,52.6", "zoom": 10}
+
+    [cluster] = (await async_client.get("/pizzerias/clusters", params=params)).json()
+    assert cluster["count"] == 2 and cluster["id"] is None
+
+    # Writes through this worker are applied immediately.
+    response = await async_client.post(
+        "/pizzerias",
+        json={"name": "Mitte 3", "address": "Berlin", "location": {"lat": 52.52, "lng": 13.4}},
+        headers=auth_header,
+    )
+    [cluster] = (await async_client.get("/pizzerias/clusters", params=params)).json()
+    assert cluster["count"] == 3
+
+    # Writes made elsewhere arrive through the changes feed.
+    async with session_maker() as session:
+        await session.delete(await session.get(Pizzeria, response.json()["id"]))
+        await session.commit()
+    [cluster] = (await async_client.get("/pizzerias/clusters", params=params)).json()
+    assert cluster["count"] == 3
+    monkeypatch.setattr(settings, "cluster_sync_seconds", 0)
+    [cluster] = (await async_client.get("/pizzerias/clusters", params=params)).json()
+    assert cluster["count"] == 2
+
+    response = await async_client.get("/pizzerias/clusters", params={**params, "bbox": "x"})
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_nearest_ranks_by_distance_and_follows_writes(async_client, monkeypatch):
+    auth_header = await get_auth_header(async_client)
+    await create_pizzerias(async_client, auth_header, BERLIN_PIZZERIAS)
+    params = {"lat": 52.52, "lng": 13.405, "k": 2}
+
+    located = [p for p in BERLIN_PIZZERIAS if p.get("location")]
+    expected = sorted(
+        located,
+        key=lambda p: haversine_m(52.52, 13.405, p["location"]["lat"], p["location"]["lng"]),
+    )
+    response = await async_client.get("/pizzerias/nearest", params=params)
+    assert response.status_code == 200
+    assert [p["name"] for p in response.json()] == [p["name"] for p in expected[:2]]
+
+    # Writes through this worker are applied immediately.
+    created = await async_client.post(
+        "/pizzerias",
+        json={"name": "Right here", "address": "Berlin", "location": {"lat": 52.52, "lng": 13.405}},
+        headers=auth_header,
+    )
+    nearest = (await async_client.get("/pizzerias/nearest", params=params)).json()
+    assert [p["name"] for p in nearest] == ["Right here", expected[0]["name"]]
+
+    # Writes made elsewhere arrive through the changes feed.
+    async with session_maker() as session:
+        await session.delete(await session.get(Pizzeria, created.json()["id"]))
+        await session.commit()
+    monkeypatch.setattr(settings, "nearest_sync_seconds", 0)
+    nearest = (await async_client.get("/pizzerias/nearest", params=params)).json()
+    assert [p["name"] for p in nearest] == [p["name"] for p in expected[:2]]
+
+    response = await async_client.get("/pizzerias/nearest", params={**params, "k": 0})
+    assert response.status_code == 422
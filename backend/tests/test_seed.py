@@ -0,0 +1,146 @@
+import json
+from datetime import datetime
+
+import pytest
+from sqlalchemy import select
+
+import seed
+from app.models import Pizzeria, PizzeriaStat, PizzeriaTombstone
+from app.stats import rebuild_stats
+from tests.conftest import test_engine
+from tests.conftest import test_session_maker as session_maker
+
+# Strings with the characters the parser splits on, plus escapes and
+# multi-byte text, so chunk boundaries land inside every kind of token.
+ITEMS = [
+    {"name": "Zola, \"the\" [best]", "address": "Paul-Lincke-Ufer 39, Berlin", "rating": 4.5},
+    {"name": "Mater", "address": "Neukölln ]}", "location": {"lat": 52.48585, "lng": 13.43635}},
+    {"name": "Gazzo", "address": "Hobrechtstraße 57", "review": "a\\nb è 🍕"},
+    {"name": "Empty", "address": "", "visited_at": "2024-05-10T19:00:00", "rating": 3.0},
+]
+
+
+def write_seed(path, items, other=None):
+    document = {"wanted": other or [{"name": "Ignored", "address": "[,]"}], "pizzerias": items}
+    path.write_text(json.dumps(document, indent=2, ensure_ascii=False), encoding="utf-8")
+    return path
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64 * 1024])
+def test_iter_json_array_across_chunk_boundaries(tmp_path, monkeypatch, chunk_size):
+    monkeypatch.setattr(seed, "READ_CHUNK_SIZE", chunk_size)
+    path = write_seed(tmp_path / "seed.json", ITEMS)
+    assert list(seed.iter_json_array(path)) == ITEMS
+    assert list(seed.iter_json_array(path, key="wanted")) == [
+        {"name": "Ignored", "address": "[,]"}
+    ]
+
+
+def test_iter_json_array_empty_missing_and_ndjson(tmp_path, monkeypatch):
+    monkeypatch.setattr(seed, "READ_CHUNK_SIZE", 3)
+    assert list(seed.iter_json_array(write_seed(tmp_path / "empty.json", []))) == []
+
+    missing = tmp_path / "missing.json"
+    missing.write_text('{"other": []}')
+    with pytest.raises(ValueError):
+        list(seed.iter_json_array(missing))
+
+    truncated = tmp_path / "truncated.json"
+    truncated.write_text('{"pizzerias": [{"name": "Zola", "addr')
+    with pytest.raises(json.JSONDecodeError):
+        list(seed.iter_json_array(truncated))
+
+    lines = tmp_path / "export.ndjson"
+    lines.write_text("".join(json.dumps(item) + "\n" for item in ITEMS) + "\n")
+    assert list(seed.iter_json_array(lines)) == ITEMS
+
+
+async def stat_rows():
+    async with session_maker() as session:
+        result = await session.execute(select(PizzeriaStat))
+        return sorted((s.kind, s.bucket, s.count, s.rating_sum) for s in result.scalars())
+
+
+async def pizzerias():
+    async with session_maker() as session:
+        result = await session.execute(select(Pizzeria).order_by(Pizzeria.id))
+        return list(result.scalars())
+
+
+@pytest.mark.asyncio
+async def test_load_inserts_in_batches_and_builds_stats(async_client, tmp_path):
+    path = write_seed(tmp_path / "seed.json", ITEMS + [{"name": "No address"}])
+    await seed._load(test_engine, force=False, upsert=False, path=path, batch_size=3)
+
+    rows = await pizzerias()
+    assert [p.name for p in rows] == [item["name"] for item in ITEMS]
+    assert rows[1].geo_cell is not None
+
+    stats = await stat_rows()
+    async with test_engine.begin() as conn:
+        await conn.run_sync(rebuild_stats)
+    assert stats == await stat_rows()
+    summary = (await async_client.get("/pizzerias/stats")).json()
+    assert summary["total"] == 4
+    assert summary["rated"] == 2
+    assert summary["average_rating"] == pytest.approx(3.75)
+    assert summary["visits_per_month"] == {"2024-05": 1}
+
+    # A seeded database is left alone without --force or --upsert.
+    await seed._load(test_engine, force=False, upsert=False, path=path, batch_size=3)
+    assert len(await pizzerias()) == 4
+
+
+@pytest.mark.asyncio
+async def test_upsert_updates_matching_rows_and_inserts_the_rest(async_client, tmp_path):
+    await seed._load(
+        test_engine, False, False, write_seed(tmp_path / "first.json", ITEMS[:2]), 10
+    )
+    before = {p.name: p for p in await pizzerias()}
+
+    changed = [{**ITEMS[0], "rating": 2.0, "review": "Went downhill"}, ITEMS[2], ITEMS[3]]
+    path = write_seed(tmp_path / "second.json", changed)
+    async with test_engine.begin() as conn:
+        batch = list(seed.to_rows(iter(changed), datetime.utcnow()))
+        assert await seed.upsert_batch(conn, batch) == (2, 1)
+        await conn.rollback()
+
+    await seed._load(test_engine, force=False, upsert=True, path=path, batch_size=2)
+    after = {p.name: p for p in await pizzerias()}
+    assert set(after) == {item["name"] for item in ITEMS}
+    zola = after[ITEMS[0]["name"]]
+    assert zola.id == before[ITEMS[0]["name"]].id
+    assert (zola.rating, zola.review) == (2.0, "Went downhill")
+    assert zola.created_at == before[ITEMS[0]["name"]].created_at
+    # Not in the second file, so untouched.
+    assert after["Mater"].updated_at == before["Mater"].updated_at
+
+    stats = await stat_rows()
+    async with test_engine.begin() as conn:
+        await conn.run_sync(rebuild_stats)
+    assert stats == await stat_rows()
+
+
+@pytest.mark.asyncio
+async def test_force_replaces_rows_records_tombstones_and_rebuilds_stats(
+    async_client, tmp_path
+):
+    await seed._load(test_engine, False, False, write_seed(tmp_path / "old.json", ITEMS), 10)
+    old_ids = [p.id for p in await pizzerias()]
+
+    path = write_seed(tmp_path / "new.json", ITEMS[:1])
+    await seed._load(test_engine, force=True, upsert=False, path=path, batch_size=10)
+
+    rows = await pizzerias()
+    assert [p.name for p in rows] == [ITEMS[0]["name"]]
+    async with session_maker() as session:
+        tombstones = (await session.execute(select(PizzeriaTombstone.id))).scalars().all()
+    # SQLite may reuse the highest id for the new row, which clears its tombstone.
+    assert set(tombstones) == set(old_ids) - {rows[0].id}
+
+    summary = (await async_client.get("/pizzerias/stats")).json()
+    assert (summary["total"], summary["rated"]) == (1, 1)
+    stats = await stat_rows()
+    async with test_engine.begin() as conn:
+        await conn.run_sync(rebuild_stats)
+    assert stats == await stat_rows()
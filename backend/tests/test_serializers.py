@@ -0,0 +1,53 @@
+from datetime import datetime
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from app.models import Pizzeria, PizzeriaRead
+from app.serializers import PIZZERIA_READ_COLUMNS, dump_pizzeria_lines, dump_pizzerias
+
+PIZZERIAS = [
+    Pizzeria(
+        id=1,
+        name="Mater Pizzeria",
+        address="Weserstraße 10, 12047 Berlin-Neukölln",
+        lat=52.48585,
+        lng=13.43635,
+        rating=5.0,
+        google_maps_url="https://maps.google.com/?q=Mater",
+        review='Crispy "cornicione", über good.\nWould return.',
+        visited_at=datetime(2024, 5, 10, 19, 30),
+        created_at=datetime(2025, 1, 14, 12, 0, 0, 123456),
+        updated_at=datetime(2025, 1, 14, 12, 0, 0, 123456),
+    ),
+    Pizzeria(
+        id=2,
+        name="Mangiare",
+        address="Arminius Markthalle, Moabit, Berlin",
+        lat=52.5,
+        created_at=datetime(2025, 1, 15),
+        updated_at=datetime(2025, 1, 15),
+    ),
+]
+
+
+def as_row(pizzeria):
+    return tuple(getattr(pizzeria, column.key) for column in PIZZERIA_READ_COLUMNS)
+
+
+def test_dump_pizzerias_matches_response_model_bytes():
+    adapter = TypeAdapter(list[PizzeriaRead])
+    models = adapter.validate_python(PIZZERIAS, from_attributes=True)
+    expected = JSONResponse(jsonable_encoder(models)).body
+
+    assert dump_pizzerias([as_row(p) for p in PIZZERIAS]) == expected
+
+
+def test_dump_pizzeria_lines_matches_model_dump_json():
+    expected = b"".join(
+        PizzeriaRead.model_validate(p, from_attributes=True).model_dump_json().encode() + b"\n"
+        for p in PIZZERIAS
+    )
+
+    assert dump_pizzeria_lines([as_row(p) for p in PIZZERIAS]) == expected
@@ -0,0 +1,127 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from app.config import settings
+from app.geocoding import LocatedPizzeria
+from app.models import Pizzeria
+from app.similar import SimilarIndex, features
+from tests.conftest import test_session_maker as session_maker
+from tests.test_pizzerias import create_pizzerias, get_auth_header
+
+REVIEWED = [
+    {"name": "Gazzo", "address": "Neukölln", "review": "Sourdough crust, leopard spotted, fior di latte"},
+    {"name": "Mater", "address": "Neukölln", "review": "Leopard spotted sourdough crust and great tiramisu"},
+    {"name": "Standard", "address": "Prenzlauer Berg", "review": "Classic Neapolitan, fior di latte"},
+    {"name": "Slice Club", "address": "Mitte", "review": "New York slices to go"},
+    {"name": "Zola", "address": "Kreuzberg"},
+]
+
+
+def test_features_hash_words_and_word_pairs():
+    vector = features("Da Mario", "Great great crust", 64)
+    assert vector.dtype.name == "float32"
+    # 5 words and 4 word pairs, "great" twice; collisions aside.
+    assert 0 < (vector > 0).sum() <= 8
+    assert vector.max() > 1
+    assert not features("", None, 64).any()
+
+
+def test_similar_index_updates_incrementally():
+    index = SimilarIndex()
+
+    class Row:
+        def __init__(self, id, name, review=None):
+            self.id, self.name, self.review = id, name, review
+
+    index.add_row(Row(1, "A", "thin crust with basil"))
+    index.add_row(Row(2, "B", "thin crust with basil and garlic"))
+    index.add_row(Row(3, "C", "deep dish chicago"))
+    assert [i for i, _ in index.similar(1, 5)] == [2]
+    assert index.similar(3, 5) == []
+
+    index.add_row(Row(3, "C", "thin crust basil"))
+    assert [i for i, _ in index.similar(1, 5)] == [2, 3]
+    index.remove(2)
+    assert [i for i, _ in index.similar(1, 5)] == [3]
+    # A freed row is reused, and location-only rows leave the index alone.
+    index.add_row(Row(4, "D", "garlic"))
+    index.add_row(LocatedPizzeria(5, 52.5, 13.4))
+    assert len(index) == 3 and index._count == 3
+
+
+@pytest.mark.asyncio
+async def test_similar_ranks_by_review_text(async_client):
+    auth_header = await get_auth_header(async_client)
+    await create_pizzerias(async_client, auth_header, REVIEWED)
+    ids = {p["name"]: p["id"] for p in (await async_client.get("/pizzerias")).json()}
+
+    response = await async_client.get(f"/pizzerias/{ids['Gazzo']}/similar", params={"k": 2})
+    assert response.status_code == 200
+    assert [p["name"] for p in response.json()] == ["Mater", "Standard"]
+
+    response = await async_client.get(f"/pizzerias/{ids['Gazzo']}/similar", params={"k": 1})
+    assert [p["name"] for p in response.json()] == ["Mater"]
+
+    # New reviews are indexed as they are written.
+    await create_pizzerias(
+        async_client,
+        auth_header,
+        [{"name": "Sauce", "address": "Mitte", "review": "Sourdough crust, leopard spotted, fior di latte"}],
+    )
+    response = await async_client.get(f"/pizzerias/{ids['Gazzo']}/similar", params={"k": 1})
+    assert [p["name"] for p in response.json()] == ["Sauce"]
+
+    response = await async_client.get("/pizzerias/999/similar")
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_similar_index_resumes_from_snapshot(async_client, monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "similar_index_dir", str(tmp_path))
+    monkeypatch.setattr(settings, "similar_snapshot_rows", 1)
+    auth_header = await get_auth_header(async_client)
+    await create_pizzerias(async_client, auth_header, REVIEWED)
+    ids = {p["name"]: p["id"] for p in (await async_client.get("/pizzerias")).json()}
+
+    first = SimilarIndex()
+    async with session_maker() as session:
+        await first.sync(session)
+    # Written in the background, after the sync has returned.
+    await first._save_task
+    assert (tmp_path / "CURRENT").exists()
+
+    # Changed after the snapshot: replayed from the changes feed on load.
+    async with session_maker() as session:
+        await session.delete(await session.get(Pizzeria, ids["Mater"]))
+        await session.commit()
+
+    resumed = SimilarIndex()
+    async with session_maker() as session:
+        await resumed.sync(session)
+    assert isinstance(resumed._vectors, np.memmap)
+    # New rows go into spare rows of the mapping instead of a full copy.
+    assert len(resumed._ids) > resumed._count
+    resumed.add_row(Pizzeria(id=999, name="Mater", review="Sourdough crust and tiramisu"))
+    assert isinstance(resumed._vectors, np.memmap)
+    resumed.remove(999)
+    monkeypatch.setattr(settings, "similar_index_dir", None)
+    rebuilt = SimilarIndex()
+    async with session_maker() as session:
+        await rebuilt.sync(session)
+
+    assert len(resumed) == len(rebuilt) == len(REVIEWED) - 1
+    for name in ("Gazzo", "Standard"):
+        expected = rebuilt.similar(ids[name], 5)
+        found = resumed.similar(ids[name], 5)
+        assert [i for i, _ in found] == [i for i, _ in expected]
+        assert [score for _, score in found] == pytest.approx([score for _, score in expected])
+
+
+def test_app_imports_without_numpy():
+    # app.similar is imported on first use, so numpy stays out of start-up.
+    code = "import sys, app.main; sys.exit('numpy' in sys.modules)"
+    subprocess.run([sys.executable, "-c", code], cwd=Path(__file__).parents[1], check=True)
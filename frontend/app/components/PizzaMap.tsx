@@ -8,13 +8,14 @@ import {
   Pin,
   useMap,
 } from "@vis.gl/react-google-maps";
-import { Pizzeria } from "../types";
+import { Pizzeria, PizzeriaCluster } from "../types";
 
 interface PizzaMapProps {
   pizzerias: Pizzeria[];
 }
 
 const BERLIN_CENTER = { lat: 52.52, lng: 13.405 };
+const API_URL = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000";
 
 function MapContent({
   pizzerias,
@@ -27,6 +28,36 @@ function MapContent({
 }) {
   const map = useMap();
   const pizzeriasWithLocation = pizzerias.filter((p) => p.location !== null);
+  const pizzeriasById: Record<number, Pizzeria> = Object.fromEntries(
+    pizzerias.map((p) => [p.id, p])
+  );
+  const [clusters, setClusters] = useState<PizzeriaCluster[]>([]);
+
+  // Ask the API for clusters of the visible area whenever the map settles,
+  // instead of rendering one marker per pizzeria.
+  useEffect(() => {
+    if (!map) return;
+
+    let request = 0;
+    const listener = map.addListener("idle", async () => {
+      const bounds = map.getBounds();
+      const zoom = map.getZoom();
+      if (!bounds || zoom === undefined) return;
+
+      const sw = bounds.getSouthWest();
+      const ne = bounds.getNorthEast();
+      const params = new URLSearchParams({
+        bbox: [sw.lng(), sw.lat(), ne.lng(), ne.lat()].join(","),
+        zoom: String(Math.round(zoom)),
+      });
+      const current = ++request;
+      const res = await fetch(`${API_URL}/pizzerias/clusters?${params}`);
+      if (res.ok && current === request) {
+        setClusters(await res.json());
+      }
+    });
+    return () => listener.remove();
+  }, [map]);
 
   // Fit bounds to show all markers on initial load
   useEffect(() => {
@@ -52,12 +83,34 @@ function MapContent({
 
   return (
     <>
-      {pizzeriasWithLocation.map((pizzeria) => {
+      {clusters.map((cluster) => {
+        const pizzeria =
+          cluster.id !== null ? pizzeriasById[cluster.id] : undefined;
+        const position = { lat: cluster.lat, lng: cluster.lng };
+
+        if (!pizzeria) {
+          return (
+            <AdvancedMarker
+              key={`${cluster.lat},${cluster.lng}`}
+              position={position}
+              title={`${cluster.count} pizzerias`}
+              onClick={() => {
+                map?.panTo(position);
+                map?.setZoom((map.getZoom() ?? 12) + 2);
+              }}
+            >
+              <div className="flex h-8 w-8 items-center justify-center rounded-full border-2 border-red-700 bg-red-500 text-xs font-bold text-white">
+                {cluster.count}
+              </div>
+            </AdvancedMarker>
+          );
+        }
+
         const isSelected = pizzeria.id === selectedId;
         return (
           <AdvancedMarker
             key={pizzeria.id}
-            position={pizzeria.location!}
+            position={position}
             title={pizzeria.name}
             onClick={() => onSelect(pizzeria)}
           >
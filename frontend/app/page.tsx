@@ -1,17 +1,47 @@
 import PizzaMap from "./components/PizzaMap";
-import { Pizzeria } from "./types";
+import { Pizzeria, PizzeriaChanges } from "./types";
+
+// Server-side copy of the pizzeria list, kept current by polling the
+// changes feed instead of downloading every pizzeria on each render.
+const pizzeriasById = new Map<number, Pizzeria>();
+let changesCursor: string | null = null;
 
 async function getPizzerias(): Promise<Pizzeria[]> {
   const apiUrl = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000";
-  const res = await fetch(`${apiUrl}/pizzerias`, {
-    cache: "no-store",
-  });
+  let hasMore = true;
+
+  while (hasMore) {
+    const params = new URLSearchParams({ limit: "1000" });
+    if (changesCursor) {
+      params.set("since", changesCursor);
+    }
+    const res = await fetch(`${apiUrl}/pizzerias/changes?${params}`, {
+      cache: "no-store",
+    });
+
+    // 410: the cursor is older than the kept tombstones, so deletes may have
+    // been missed. Drop everything and load the full list again.
+    if (res.status === 410 && changesCursor) {
+      changesCursor = null;
+      pizzeriasById.clear();
+      continue;
+    }
+    if (!res.ok) {
+      break;
+    }
 
-  if (!res.ok) {
-    return [];
+    const changes: PizzeriaChanges = await res.json();
+    for (const id of changes.deleted) {
+      pizzeriasById.delete(id);
+    }
+    for (const pizzeria of changes.changed) {
+      pizzeriasById.set(pizzeria.id, pizzeria);
+    }
+    changesCursor = changes.cursor;
+    hasMore = changes.has_more;
   }
 
-  return res.json();
+  return Array.from(pizzeriasById.values()).sort((a, b) => a.id - b.id);
 }
 
 export default async function Home() {
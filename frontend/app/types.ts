@@ -15,3 +15,17 @@ export interface Pizzeria {
   created_at: string;
   updated_at: string;
 }
+
+export interface PizzeriaChanges {
+  changed: Pizzeria[];
+  deleted: number[];
+  cursor: string;
+  has_more: boolean;
+}
+
+export interface PizzeriaCluster {
+  lat: number;
+  lng: number;
+  count: number;
+  id: number | null;
+}